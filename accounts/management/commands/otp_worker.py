@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from accounts import otp_queue
+from accounts.send_otp import get_provider
+
+
+class Command(BaseCommand):
+    help = "worker صف ارسال کدهای یکبار مصرف؛ پیام‌ها را دسته‌ای به ارائه‌دهنده پیامک می‌فرستد."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OTP_QUEUE_BATCH_SIZE)
+        parser.add_argument('--timeout', type=int, default=5, help="مدت انتظار برای پیام جدید به ثانیه")
+        parser.add_argument('--once', action='store_true', help="پس از خالی شدن صف خارج می‌شود")
+
+    def handle(self, *args, **options):
+        provider = get_provider()
+        timeout = 1 if options['once'] else options['timeout']
+        sent = 0
+        try:
+            while True:
+                batch_sent = otp_queue.process_batch(provider, options['batch_size'], timeout)
+                sent += batch_sent
+                if options['once'] and not otp_queue.redis_client.llen(otp_queue.QUEUE_KEY) and not batch_sent:
+                    break
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"{sent} پیامک ارسال شد."))
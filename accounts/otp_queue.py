@@ -0,0 +1,186 @@
+"""
+صف ارسال کدهای یکبار مصرف (OTP).
+
+ویو فقط پیام را در صف Redis قرار می‌دهد و بلافاصله پاسخ می‌دهد. worker
+(manage.py otp_worker) پیام‌ها را دسته‌ای از صف برمی‌دارد و با یک فراخوانی به
+ارائه‌دهنده پیامک می‌فرستد. وضعیت هر پیام در یک hash نگه‌داری می‌شود و پیام‌های ناموفق
+با فاصله افزایشی دوباره در صف قرار می‌گیرند، تا وقتی که کد منقضی شود یا تعداد تلاش‌ها تمام شود.
+
+برداشتن از صف با LMOVE به لیست در حال پردازش است و پیام فقط پس از ثبت نتیجه از آن حذف
+می‌شود؛ پیام‌های worker از کار افتاده پس از PROCESSING_TIMEOUT به صف برمی‌گردند. کد پس از
+ارسال، شکست نهایی یا انقضا از hash وضعیت پاک می‌شود.
+"""
+import logging
+import secrets
+import time
+
+import redis
+from django.conf import settings
+
+from core.redis_pool import redis_client
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "otp-queue:pending"
+RETRY_KEY = "otp-queue:retry"
+PROCESSING_KEY = "otp-queue:processing"
+PROCESSING_TIMEOUT = 60  # ثانیه
+STATUS_TTL = 60 * 60
+RETRY_BACKOFF = 1  # ثانیه، برای تلاش اول؛ در هر تلاش دو برابر می‌شود
+RETRY_BACKOFF_MAX = 30
+
+
+def message_key(message_id):
+    return f"otp-queue:message:{message_id}"
+
+
+def retry_delay(attempts):
+    return min(RETRY_BACKOFF * 2 ** (attempts - 1), RETRY_BACKOFF_MAX)
+
+
+def enqueue_otp(code, phone):
+    """پیام کد را در صف ارسال قرار می‌دهد و شناسه پیام را برمی‌گرداند."""
+    message_id = secrets.token_hex(8)
+    pipe = redis_client.pipeline()
+    pipe.hset(message_key(message_id), mapping={
+        'phone': phone,
+        'code': code,
+        'status': 'queued',
+        'attempts': 0,
+        'created_at': time.time(),
+    })
+    pipe.expire(message_key(message_id), STATUS_TTL)
+    pipe.lpush(QUEUE_KEY, message_id)
+    pipe.execute()
+    return message_id
+
+
+def delivery_status(message_id):
+    data = redis_client.hgetall(message_key(message_id))
+    return {key.decode(): value.decode() for key, value in data.items() if key != b'code'}
+
+
+def promote_due_retries(now=None):
+    """پیام‌هایی که زمان تلاش دوباره آن‌ها رسیده را به صف اصلی برمی‌گرداند."""
+    now = time.time() if now is None else now
+    promoted = 0
+    for message_id in redis_client.zrangebyscore(RETRY_KEY, '-inf', now):
+        # فقط workerی که پیام را از مجموعه حذف کند آن را به صف برمی‌گرداند
+        if redis_client.zrem(RETRY_KEY, message_id):
+            redis_client.lpush(QUEUE_KEY, message_id)
+            promoted += 1
+    return promoted
+
+
+def requeue_stale(now=None):
+    """پیام‌هایی که worker برداشته ولی پس از PROCESSING_TIMEOUT نتیجه‌شان ثبت نشده را به صف برمی‌گرداند."""
+    now = time.time() if now is None else now
+    message_ids = redis_client.lrange(PROCESSING_KEY, 0, -1)
+    if not message_ids:
+        return 0
+
+    pipe = redis_client.pipeline(transaction=False)
+    for message_id in message_ids:
+        pipe.hmget(message_key(message_id.decode()), 'claimed_at', 'status')
+    rows = pipe.execute()
+
+    requeued = 0
+    for message_id, (claimed_at, status) in zip(message_ids, rows):
+        if status is None:
+            # hash وضعیت منقضی شده است؛ پیامی برای ارسال نمانده
+            redis_client.lrem(PROCESSING_KEY, 1, message_id)
+        elif claimed_at is None:
+            # worker هنوز زمان برداشتن را ثبت نکرده؛ از همین حالا سنجیده می‌شود
+            redis_client.hsetnx(message_key(message_id.decode()), 'claimed_at', now)
+        elif now - float(claimed_at) >= PROCESSING_TIMEOUT:
+            # فقط workerی که پیام را از لیست حذف کند آن را به صف برمی‌گرداند
+            if redis_client.lrem(PROCESSING_KEY, 1, message_id):
+                redis_client.lpush(QUEUE_KEY, message_id)
+                requeued += 1
+    return requeued
+
+
+def take_batch(batch_size, timeout):
+    first = redis_client.blmove(QUEUE_KEY, PROCESSING_KEY, timeout, 'RIGHT', 'LEFT')
+    if first is None:
+        return []
+    message_ids = [first]
+    if batch_size > 1:
+        pipe = redis_client.pipeline(transaction=False)
+        for _ in range(batch_size - 1):
+            pipe.lmove(QUEUE_KEY, PROCESSING_KEY, 'RIGHT', 'LEFT')
+        message_ids += [message_id for message_id in pipe.execute() if message_id is not None]
+    return [message_id.decode() for message_id in message_ids]
+
+
+def finish(pipe, message_id, **fields):
+    """نتیجه نهایی پیام را ثبت، کد را از hash پاک و پیام را از لیست در حال پردازش حذف می‌کند."""
+    key = message_key(message_id)
+    pipe.hset(key, mapping=fields)
+    pipe.hdel(key, 'code', 'claimed_at')
+    pipe.lrem(PROCESSING_KEY, 1, message_id)
+
+
+def process_batch(provider, batch_size=None, timeout=1):
+    """یک دسته از صف را ارسال می‌کند و تعداد پیام‌های ارسال‌شده را برمی‌گرداند."""
+    promote_due_retries()
+    requeue_stale()
+    message_ids = take_batch(batch_size or settings.OTP_QUEUE_BATCH_SIZE, timeout)
+    if not message_ids:
+        return 0
+
+    now = time.time()
+    pipe = redis_client.pipeline(transaction=False)
+    for message_id in message_ids:
+        pipe.hgetall(message_key(message_id))
+        pipe.hset(message_key(message_id), 'claimed_at', now)
+    rows = pipe.execute()[::2]
+
+    messages, attempts, created = [], {}, {}
+    pipe = redis_client.pipeline(transaction=False)
+    for message_id, data in zip(message_ids, rows):
+        if not data:
+            # hash وضعیت منقضی شده بود و claimed_at بالا آن را بدون TTL دوباره ساخته است
+            pipe.delete(message_key(message_id))
+            pipe.lrem(PROCESSING_KEY, 1, message_id)
+            continue
+        created[message_id] = float(data[b'created_at'])
+        if now - created[message_id] >= settings.OTP_CODE_TTL:
+            finish(pipe, message_id, status='expired')
+            continue
+        attempts[message_id] = int(data[b'attempts']) + 1
+        messages.append({
+            'id': message_id,
+            'phone': data[b'phone'].decode(),
+            'text': f"کد تایید شما: {data[b'code'].decode()}",
+        })
+
+    if messages:
+        try:
+            results = provider.send_batch(messages)
+        except Exception as e:
+            # قطعی ارائه‌دهنده همه پیام‌های دسته را به صف تلاش دوباره می‌فرستد
+            logger.warning("SMS provider failed for a batch of %s messages", len(messages), exc_info=True)
+            results = {message['id']: str(e) or e.__class__.__name__ for message in messages}
+
+    sent = 0
+    for message in messages:
+        message_id = message['id']
+        error = results.get(message_id, 'no result from provider')
+        if error is None:
+            finish(pipe, message_id, status='sent', attempts=attempts[message_id], sent_at=now)
+            sent += 1
+            continue
+
+        retry_at = now + retry_delay(attempts[message_id])
+        # تلاشی که بعد از انقضای کد انجام شود بی‌فایده است
+        if attempts[message_id] >= settings.OTP_MAX_ATTEMPTS or retry_at - created[message_id] >= settings.OTP_CODE_TTL:
+            finish(pipe, message_id, status='failed', attempts=attempts[message_id], last_error=error)
+        else:
+            key = message_key(message_id)
+            pipe.hset(key, mapping={'status': 'retrying', 'attempts': attempts[message_id], 'last_error': error})
+            pipe.hdel(key, 'claimed_at')
+            pipe.zadd(RETRY_KEY, {message_id: retry_at})
+            pipe.lrem(PROCESSING_KEY, 1, message_id)
+    pipe.execute()
+    return sent
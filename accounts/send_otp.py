@@ -1,2 +1,57 @@
-def send_otp(code, phone):
-    print(f"Sending OTP {code} to {phone}")
+"""
+ارائه‌دهنده‌های ارسال پیامک.
+
+هر ارائه‌دهنده یک متد send_batch دارد که لیستی از پیام‌ها ({'id', 'phone', 'text'}) را
+می‌گیرد و برای هر شناسه پیام، متن خطا یا None (ارسال موفق) برمی‌گرداند. ارائه‌دهنده فعال
+با SMS_PROVIDER و SMS_PROVIDER_OPTIONS در تنظیمات انتخاب می‌شود.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class ConsoleSmsProvider:
+    """پیام‌ها را فقط چاپ می‌کند؛ برای محیط توسعه."""
+
+    def send_batch(self, messages):
+        for message in messages:
+            print(f"Sending SMS to {message['phone']}: {message['text']}")
+        return {message['id']: None for message in messages}
+
+
+class FakeSmsProvider:
+    """
+    جایگزین ارائه‌دهنده واقعی برای تست‌ها و تست بار: با تاخیر و نرخ خطای قابل تنظیم
+    پاسخ می‌دهد و پیام‌های ارسال‌شده را در outbox نگه می‌دارد.
+    """
+    outbox = []
+    _lock = threading.Lock()
+
+    def __init__(self, latency=0.0, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    def send_batch(self, messages):
+        if self.latency:
+            time.sleep(self.latency)
+        results = {}
+        for message in messages:
+            if random.random() < self.failure_rate:
+                results[message['id']] = 'provider unavailable'
+            else:
+                with self._lock:
+                    self.outbox.append(message)
+                results[message['id']] = None
+        return results
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls.outbox.clear()
+
+
+def get_provider():
+    return import_string(settings.SMS_PROVIDER)(**settings.SMS_PROVIDER_OPTIONS)
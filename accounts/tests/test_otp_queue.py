@@ -0,0 +1,145 @@
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from accounts import otp_queue
+from accounts.send_otp import FakeSmsProvider
+
+
+def clear_otp_queue():
+    for key in otp_queue.redis_client.scan_iter('otp-queue:*'):
+        otp_queue.redis_client.delete(key)
+
+
+class FailingSmsProvider:
+    def send_batch(self, messages):
+        raise ConnectionError("provider down")
+
+
+class CrashingSmsProvider:
+    def send_batch(self, messages):
+        # از کار افتادن worker در میانه ارسال
+        raise SystemExit
+
+
+@override_settings(OTP_CODE_TTL=120, OTP_MAX_ATTEMPTS=3)
+class OtpQueueTest(SimpleTestCase):
+    def setUp(self):
+        clear_otp_queue()
+        FakeSmsProvider.clear()
+        self.provider = FakeSmsProvider()
+
+    def test_enqueue_returns_immediately_with_status(self):
+        message_id = otp_queue.enqueue_otp(1234, '09123456789')
+        status = otp_queue.delivery_status(message_id)
+        self.assertEqual(status['status'], 'queued')
+        self.assertNotIn('code', status)
+        self.assertEqual(FakeSmsProvider.outbox, [])
+
+    def test_batched_send(self):
+        message_ids = [otp_queue.enqueue_otp(1000 + i, f'0912000000{i}') for i in range(5)]
+
+        with patch.object(self.provider, 'send_batch', wraps=self.provider.send_batch) as send_batch:
+            self.assertEqual(otp_queue.process_batch(self.provider, batch_size=10), 5)
+        send_batch.assert_called_once()
+
+        self.assertEqual([message['phone'] for message in FakeSmsProvider.outbox],
+                         [f'0912000000{i}' for i in range(5)])
+        self.assertIn('1000', FakeSmsProvider.outbox[0]['text'])
+        for message_id in message_ids:
+            self.assertEqual(otp_queue.delivery_status(message_id)['status'], 'sent')
+            self.assertIsNone(otp_queue.redis_client.hget(otp_queue.message_key(message_id), 'code'))
+        self.assertEqual(otp_queue.redis_client.llen(otp_queue.PROCESSING_KEY), 0)
+
+    def test_batch_size_respected(self):
+        for i in range(5):
+            otp_queue.enqueue_otp(1000 + i, f'0912000000{i}')
+        self.assertEqual(otp_queue.process_batch(self.provider, batch_size=2), 2)
+        self.assertEqual(otp_queue.redis_client.llen(otp_queue.QUEUE_KEY), 3)
+
+    def test_failure_retried_with_backoff(self):
+        message_id = otp_queue.enqueue_otp(1234, '09123456789')
+        otp_queue.process_batch(FailingSmsProvider())
+
+        status = otp_queue.delivery_status(message_id)
+        self.assertEqual(status['status'], 'retrying')
+        self.assertEqual(status['attempts'], '1')
+        self.assertEqual(status['last_error'], 'provider down')
+        retry_at = otp_queue.redis_client.zscore(otp_queue.RETRY_KEY, message_id)
+        self.assertAlmostEqual(retry_at - time.time(), otp_queue.retry_delay(1), delta=1)
+
+        # پیش از رسیدن زمان تلاش دوباره چیزی ارسال نمی‌شود
+        self.assertEqual(otp_queue.process_batch(self.provider), 0)
+
+        self.assertEqual(otp_queue.promote_due_retries(now=retry_at), 1)
+        self.assertEqual(otp_queue.process_batch(self.provider), 1)
+        status = otp_queue.delivery_status(message_id)
+        self.assertEqual(status['status'], 'sent')
+        self.assertEqual(status['attempts'], '2')
+
+    def test_gives_up_after_max_attempts(self):
+        message_id = otp_queue.enqueue_otp(1234, '09123456789')
+        for _ in range(3):
+            otp_queue.promote_due_retries(now=time.time() + 60)
+            otp_queue.process_batch(FailingSmsProvider())
+
+        self.assertEqual(otp_queue.delivery_status(message_id)['status'], 'failed')
+        self.assertEqual(otp_queue.redis_client.zcard(otp_queue.RETRY_KEY), 0)
+        self.assertIsNone(otp_queue.redis_client.hget(otp_queue.message_key(message_id), 'code'))
+        self.assertEqual(otp_queue.redis_client.llen(otp_queue.PROCESSING_KEY), 0)
+
+    def test_expired_code_not_sent(self):
+        message_id = otp_queue.enqueue_otp(1234, '09123456789')
+        with patch('accounts.otp_queue.time.time', return_value=time.time() + 121):
+            otp_queue.process_batch(self.provider)
+
+        self.assertEqual(otp_queue.delivery_status(message_id)['status'], 'expired')
+        self.assertEqual(FakeSmsProvider.outbox, [])
+        self.assertIsNone(otp_queue.redis_client.hget(otp_queue.message_key(message_id), 'code'))
+
+    def test_retry_keeps_code_until_sent(self):
+        message_id = otp_queue.enqueue_otp(1234, '09123456789')
+        otp_queue.process_batch(FailingSmsProvider())
+
+        self.assertEqual(otp_queue.redis_client.hget(otp_queue.message_key(message_id), 'code'), b'1234')
+        self.assertEqual(otp_queue.redis_client.llen(otp_queue.PROCESSING_KEY), 0)
+
+    def test_messages_of_crashed_worker_are_requeued(self):
+        message_ids = [otp_queue.enqueue_otp(1000 + i, f'0912000000{i}') for i in range(2)]
+        with self.assertRaises(SystemExit):
+            otp_queue.process_batch(CrashingSmsProvider(), batch_size=10)
+
+        self.assertEqual(otp_queue.redis_client.llen(otp_queue.QUEUE_KEY), 0)
+        self.assertEqual(otp_queue.redis_client.llen(otp_queue.PROCESSING_KEY), 2)
+        # پیش از PROCESSING_TIMEOUT ممکن است worker هنوز در حال ارسال باشد
+        self.assertEqual(otp_queue.requeue_stale(), 0)
+        self.assertEqual(otp_queue.requeue_stale(now=time.time() + otp_queue.PROCESSING_TIMEOUT), 2)
+
+        self.assertEqual(otp_queue.process_batch(self.provider, batch_size=10), 2)
+        for message_id in message_ids:
+            self.assertEqual(otp_queue.delivery_status(message_id)['status'], 'sent')
+        self.assertEqual(otp_queue.redis_client.llen(otp_queue.PROCESSING_KEY), 0)
+
+    def test_unclaimed_message_requeued_after_timeout(self):
+        # worker پس از LMOVE و پیش از ثبت claimed_at از کار افتاده است
+        otp_queue.enqueue_otp(1234, '09123456789')
+        otp_queue.take_batch(1, timeout=1)
+
+        now = time.time()
+        self.assertEqual(otp_queue.requeue_stale(now=now), 0)
+        self.assertEqual(otp_queue.requeue_stale(now=now + otp_queue.PROCESSING_TIMEOUT), 1)
+        self.assertEqual(otp_queue.redis_client.llen(otp_queue.QUEUE_KEY), 1)
+
+    @override_settings(SMS_PROVIDER='accounts.send_otp.FakeSmsProvider')
+    def test_worker_command(self):
+        for i in range(3):
+            otp_queue.enqueue_otp(1000 + i, f'0912000000{i}')
+
+        out = StringIO()
+        call_command('otp_worker', '--once', '--batch-size', '2', stdout=out)
+
+        self.assertEqual(len(FakeSmsProvider.outbox), 3)
+        self.assertIn('3', out.getvalue())
@@ -8,6 +8,7 @@ import redis
 from accounts.views import SignInSignUpView, OtpVerifyView
 from accounts.forms import SignInSignUpForm, OtpVerifyForm, UserProfileForm
 from accounts.models import User
+from core import ratelimit
 from reservations.models import Booking
 from hotels.models import Room
 from datetime import date
@@ -17,6 +18,7 @@ class TestSignInSignUpView(TestCase):
     def setUp(self):
         self.client = Client()
         self.url = reverse('accounts:signin-signup')
+        ratelimit.reset()
 
     def test_get_request(self):
         response = self.client.get(self.url)
@@ -24,9 +26,9 @@ class TestSignInSignUpView(TestCase):
         self.assertTemplateUsed(response, 'accounts/singIn_singUp.html')
         self.assertIsInstance(response.context['form'], SignInSignUpForm)
 
-    @patch('accounts.views.send_otp')
+    @patch('accounts.views.enqueue_otp')
     @patch('accounts.views.redis_client')
-    def test_post_valid_form(self, mock_redis, mock_send_otp):
+    def test_post_valid_form(self, mock_redis, mock_enqueue_otp):
         mock_redis.setex.return_value = True
         data = {'phone': '09123456789', 'email': 'test@example.com'}
         response = self.client.post(self.url, data)
@@ -35,13 +37,13 @@ class TestSignInSignUpView(TestCase):
         self.assertIn('otp_phone', self.client.session)
         self.assertEqual(self.client.session['otp_phone'], '09123456789')
         mock_redis.setex.assert_called_once()
-        mock_send_otp.assert_called_once()
+        mock_enqueue_otp.assert_called_once()
         messages = list(get_messages(response.wsgi_request))
         self.assertEqual(str(messages[0]), 'کد تایید ارسال شد')
 
-    @patch('accounts.views.send_otp')
+    @patch('accounts.views.enqueue_otp')
     @patch('accounts.views.redis_client')
-    def test_post_valid_form_redis_error(self, mock_redis, mock_send_otp):
+    def test_post_valid_form_redis_error(self, mock_redis, mock_enqueue_otp):
         mock_redis.setex.side_effect = Exception('Redis error')
         data = {'phone': '09123456789', 'email': 'test@example.com'}
         response = self.client.post(self.url, data)
@@ -57,11 +59,57 @@ class TestSignInSignUpView(TestCase):
         messages = list(get_messages(response.wsgi_request))
         self.assertEqual(str(messages[0]), 'شماره تلفن نامعتبر است')
 
+    @patch('accounts.views.enqueue_otp')
+    @patch('accounts.views.redis_client')
+    def test_post_rate_limited_per_phone(self, mock_redis, mock_enqueue_otp):
+        capacity, period = settings.RATE_LIMITS['otp-request:phone']
+        for _ in range(capacity):
+            response = self.client.post(self.url, {'phone': '09123456789', 'email': 'test@example.com'})
+            self.assertEqual(response.status_code, 302)
+
+        response = self.client.post(self.url, {'phone': '09123456789', 'email': 'test@example.com'})
+        self.assertEqual(response.status_code, 429)
+        self.assertTemplateUsed(response, 'accounts/singIn_singUp.html')
+        self.assertTrue(0 < int(response['Retry-After']) <= period / capacity)
+        self.assertEqual(mock_enqueue_otp.call_count, capacity)
+
+        # شماره دیگر از همان IP همچنان مجاز است
+        response = self.client.post(self.url, {'phone': '09123456780', 'email': 'test@example.com'})
+        self.assertEqual(response.status_code, 302)
+
+    @patch('accounts.views.enqueue_otp')
+    @patch('accounts.views.redis_client')
+    def test_post_rate_limited_per_ip(self, mock_redis, mock_enqueue_otp):
+        limits = {**settings.RATE_LIMITS, 'otp-request:ip': (2, 60)}
+        with self.settings(RATE_LIMITS=limits):
+            self.client.post(self.url, {'phone': '09123456781', 'email': 'test@example.com'}, REMOTE_ADDR='10.0.0.1')
+            self.client.post(self.url, {'phone': '09123456782', 'email': 'test@example.com'}, REMOTE_ADDR='10.0.0.1')
+            response = self.client.post(self.url, {'phone': '09123456783', 'email': 'test@example.com'}, REMOTE_ADDR='10.0.0.1')
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '30')
+            response = self.client.post(self.url, {'phone': '09123456783', 'email': 'test@example.com'}, REMOTE_ADDR='10.0.0.2')
+            self.assertEqual(response.status_code, 302)
+
+    @patch('accounts.views.enqueue_otp')
+    @patch('accounts.views.redis_client')
+    def test_post_rate_limited_per_forwarded_ip_behind_proxy(self, mock_redis, mock_enqueue_otp):
+        limits = {**settings.RATE_LIMITS, 'otp-request:ip': (1, 60)}
+        with self.settings(RATE_LIMITS=limits, RATELIMIT_TRUSTED_PROXIES=1):
+            # همه درخواست‌ها از یک پروکسی می‌آیند ولی سطل هر کاربر جداست
+            for index, ip in enumerate(('1.1.1.1', '2.2.2.2')):
+                response = self.client.post(self.url, {'phone': f'0912345678{index}', 'email': 'test@example.com'},
+                                            REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=ip)
+                self.assertEqual(response.status_code, 302)
+            response = self.client.post(self.url, {'phone': '09123456789', 'email': 'test@example.com'},
+                                        REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='1.1.1.1')
+            self.assertEqual(response.status_code, 429)
+
 
 class TestOtpVerifyView(TestCase):
     def setUp(self):
         self.client = Client()
         self.url = reverse('accounts:verify_otp')
+        ratelimit.reset()
 
     def test_get_no_session_redirect(self):
         response = self.client.get(self.url)
@@ -164,6 +212,27 @@ class TestOtpVerifyView(TestCase):
         messages = list(get_messages(response.wsgi_request))
         self.assertEqual(str(messages[0]), 'کد تایید نامعتبر است')
 
+    @patch('accounts.views.redis_client')
+    def test_post_rate_limited_per_phone(self, mock_redis):
+        mock_redis.get.return_value = b'5678'
+        session = self.client.session
+        session['otp_token'] = 'test_token'
+        session['otp_phone'] = '09123456789'
+        session.save()
+        capacity, period = settings.RATE_LIMITS['otp-verify:phone']
+        for _ in range(capacity):
+            response = self.client.post(self.url, {'code': '1234'})
+            self.assertEqual(response.status_code, 200)
+
+        # حتی کد درست پس از اتمام سهمیه بررسی نمی‌شود
+        mock_redis.get.return_value = b'1234'
+        response = self.client.post(self.url, {'code': '1234'})
+        self.assertEqual(response.status_code, 429)
+        self.assertTemplateUsed(response, 'accounts/otp_verify.html')
+        self.assertTrue(0 < int(response['Retry-After']) <= period / capacity)
+        self.assertEqual(mock_redis.get.call_count, capacity)
+        self.assertFalse(User.objects.filter(phone='09123456789').exists())
+
 
 class TestLogOutView(TestCase):
     def setUp(self):
@@ -4,14 +4,20 @@ from django.contrib import messages
 from accounts.forms import SignInSignUpForm, OtpVerifyForm, UserProfileForm
 from accounts.models import User
 import secrets
-import redis
-from decouple import config
-from accounts.send_otp import send_otp
+from core.redis_pool import redis_client
+from accounts.otp_queue import enqueue_otp
+from core import ratelimit
+from django.conf import settings
 from django.contrib.auth import login, logout
 from reservations.models import Booking
 from django.contrib.auth.mixins import LoginRequiredMixin
 
-redis_client = redis.Redis.from_url(config('REDIS_URL', default='redis://localhost:6379/0'))
+
+def too_many_requests(request, template, form, decision):
+    messages.error(request, f"تعداد درخواست‌ها بیش از حد مجاز است، لطفا {decision.retry_after} ثانیه دیگر تلاش کنید")
+    response = render(request, template, {"form": form}, status=429)
+    response["Retry-After"] = str(decision.retry_after)
+    return response
 
 
 class SignInSignUpView(View):
@@ -23,18 +29,25 @@ class SignInSignUpView(View):
         form = SignInSignUpForm(request.POST)
         if form.is_valid():
             phone = form.cleaned_data["phone"]
+            limited = ratelimit.check([
+                ("otp-request:ip", ratelimit.client_ip(request)),
+                ("otp-request:phone", phone),
+            ])
+            if limited:
+                return too_many_requests(request, "accounts/singIn_singUp.html", form, limited)
             try:
                 code = secrets.randbelow(9000) + 1000
                 token = secrets.token_urlsafe(11)
 
                 otp_key = f"otp:{phone}:{token}"
 
-                redis_client.setex(otp_key, 120, code)
+                redis_client.setex(otp_key, settings.OTP_CODE_TTL, code)
 
                 request.session["otp_token"] = token
                 request.session["otp_phone"] = phone
 
-                send_otp(code, phone)
+                # ارسال پیامک در worker انجام می‌شود و درخواست منتظر ارائه‌دهنده نمی‌ماند
+                enqueue_otp(code, phone)
                 messages.success(request, "کد تایید ارسال شد")
             except:
                 messages.error(request, "مشکلی در اتصال پیش امده است")
@@ -64,6 +77,13 @@ class OtpVerifyView(View):
                 messages.error(request, "مشکلی پیش امده است")
                 return redirect("accounts:signin-signup")
 
+            limited = ratelimit.check([
+                ("otp-verify:ip", ratelimit.client_ip(request)),
+                ("otp-verify:phone", otp_phone),
+            ])
+            if limited:
+                return too_many_requests(request, "accounts/otp_verify.html", form, limited)
+
             otp_key = f"otp:{otp_phone}:{otp_token}"
             try:
                 get_verify_code = redis_client.get(otp_key)
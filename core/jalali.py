@@ -0,0 +1,80 @@
+"""
+تبدیل و قالب‌بندی تاریخ شمسی.
+
+تبدیل تاریخ میلادی به شمسی پرهزینه‌ترین بخش نمایش تاریخ‌هاست و در لیست‌های مدیریت و
+قالب‌ها برای هر ردیف تکرار می‌شود؛ تعداد روزهای متفاوت اما کم است، پس تبدیل هر روز (و متن
+قالب‌بندی‌شده آن) با LRU کش می‌شود. ساعت در دو تقویم یکسان است و جدا قالب‌بندی می‌شود.
+"""
+from datetime import date, datetime
+from functools import lru_cache
+
+import jdatetime
+
+DATE_FORMAT = '%Y/%m/%d'
+DATETIME_FORMAT = '%Y/%m/%d %H:%M:%S'
+
+MONTH_NAMES = (
+    'فروردین', 'اردیبهشت', 'خرداد', 'تیر', 'مرداد', 'شهریور',
+    'مهر', 'آبان', 'آذر', 'دی', 'بهمن', 'اسفند',
+)
+
+
+@lru_cache(maxsize=8192)
+def to_jalali(value):
+    """تاریخ میلادی (date) را به jdatetime.date تبدیل می‌کند."""
+    return jdatetime.date.fromgregorian(date=value)
+
+
+@lru_cache(maxsize=8192)
+def _format_day(value, fmt):
+    return to_jalali(value).strftime(fmt)
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def to_jalali_many(values):
+    """
+    لیستی از تاریخ‌ها (یا datetime ها) را در یک مرور به شمسی تبدیل می‌کند؛ هر روز تکراری فقط
+    یک بار تبدیل می‌شود. ترتیب و طول خروجی با ورودی یکسان است.
+    """
+    converted = {}
+    result = []
+    for value in values:
+        day = _as_date(value)
+        if day not in converted:
+            converted[day] = to_jalali(day)
+        result.append(converted[day])
+    return result
+
+
+def format_date(value, fmt=DATE_FORMAT):
+    """date یا datetime را فقط با بخش تاریخ قالب‌بندی می‌کند؛ برای مقدار خالی رشته خالی."""
+    if not value:
+        return ''
+    if isinstance(value, jdatetime.date):
+        return value.strftime(fmt)
+    return _format_day(_as_date(value), fmt)
+
+
+def format_datetime(value, fmt=DATETIME_FORMAT):
+    """datetime را با همان ساعت ذخیره‌شده (بدون تبدیل منطقه زمانی) به شمسی قالب‌بندی می‌کند."""
+    if not value:
+        return ''
+    if not isinstance(value, datetime):
+        return format_date(value, fmt)
+    if fmt == DATE_FORMAT:
+        return _format_day(value.date(), fmt)
+    if fmt == DATETIME_FORMAT:
+        return f"{_format_day(value.date(), DATE_FORMAT)} {value.hour:02d}:{value.minute:02d}:{value.second:02d}"
+    return jdatetime.datetime.fromgregorian(datetime=value).strftime(fmt)
+
+
+def format_long(value):
+    """تاریخ را به شکل خوانا مانند «25 مرداد 1404» برمی‌گرداند."""
+    if isinstance(value, date) and not isinstance(value, jdatetime.date):
+        value = to_jalali(_as_date(value))
+    if not isinstance(value, jdatetime.date):
+        return ''
+    return f"{value.day:02d} {MONTH_NAMES[value.month - 1]} {value.year}"
@@ -0,0 +1,113 @@
+"""
+محدودیت نرخ درخواست با الگوریتم token bucket در Redis.
+
+هر بررسی یک اجرای اسکریپت Lua با هزینه O(1) است: موجودی سطل بر اساس زمان سرور Redis
+شارژ می‌شود، در صورت کافی بودن یک توکن کم می‌شود و شمارنده مجاز/محدودشده دامنه افزایش
+می‌یابد. محدودیت‌ها در RATE_LIMITS به شکل {دامنه: (ظرفیت، دوره به ثانیه)} تعریف می‌شوند؛
+یعنی حداکثر «ظرفیت» درخواست پشت سر هم و شارژ کامل سطل در طول «دوره».
+"""
+import logging
+import math
+from collections import namedtuple
+
+import redis
+from django.conf import settings
+
+from core.redis_pool import redis_client
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_KEY = "ratelimit:counters"
+
+Decision = namedtuple('Decision', ['allowed', 'retry_after', 'remaining'])
+
+# KEYS: کلید سطل، کلید شمارنده‌ها
+# ARGV: ظرفیت، دوره به میلی‌ثانیه، دامنه
+TOKEN_BUCKET_SCRIPT = redis_client.register_script("""
+local capacity = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local rate = capacity / period
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+    redis.call('HINCRBY', KEYS[2], ARGV[3] .. ':allowed', 1)
+else
+    retry_after = math.ceil((1 - tokens) / rate)
+    redis.call('HINCRBY', KEYS[2], ARGV[3] .. ':limited', 1)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], period)
+return {allowed, retry_after, math.floor(tokens)}
+""")
+
+
+def bucket_key(scope, identifier):
+    return f"ratelimit:{scope}:{identifier}"
+
+
+def hit(scope, identifier):
+    """یک توکن از سطل دامنه برای شناسه داده شده مصرف می‌کند. retry_after به ثانیه است."""
+    capacity, period = settings.RATE_LIMITS[scope]
+    try:
+        allowed, retry_after_ms, remaining = TOKEN_BUCKET_SCRIPT(
+            keys=[bucket_key(scope, identifier), COUNTERS_KEY],
+            args=[capacity, period * 1000, scope],
+        )
+    except redis.RedisError:
+        # در نبود Redis ورود کاربران متوقف نمی‌شود
+        logger.warning("Rate limit check failed for %s", scope, exc_info=True)
+        return Decision(True, 0, capacity)
+    return Decision(bool(allowed), math.ceil(retry_after_ms / 1000), remaining)
+
+
+def check(checks):
+    """
+    چند بررسی (دامنه، شناسه) را به ترتیب انجام می‌دهد و اولین نتیجه محدودشده یا
+    در صورت مجاز بودن همه، None برمی‌گرداند.
+    """
+    for scope, identifier in checks:
+        decision = hit(scope, identifier)
+        if not decision.allowed:
+            return decision
+    return None
+
+
+def counters():
+    """شمارنده‌های تجمعی به شکل {(دامنه، نتیجه): تعداد}."""
+    result = {}
+    for field, value in redis_client.hgetall(COUNTERS_KEY).items():
+        scope, _, outcome = field.decode().rpartition(':')
+        result[(scope, outcome)] = int(value)
+    return result
+
+
+def client_ip(request):
+    """
+    آدرس IP کاربر. پشت RATELIMIT_TRUSTED_PROXIES پروکسی معکوس، هر پروکسی آدرس طرف مقابل خود
+    را به انتهای X-Forwarded-For اضافه می‌کند؛ پس آدرس کاربر از انتهای هدر شمرده می‌شود و
+    مقادیر ابتدای هدر که خود کاربر می‌تواند بفرستد نادیده گرفته می‌شوند.
+    """
+    proxies = settings.RATELIMIT_TRUSTED_PROXIES
+    if proxies:
+        forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+        if forwarded:
+            return forwarded[-min(proxies, len(forwarded))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def reset():
+    """حذف همه سطل‌ها و شمارنده‌ها؛ برای تست‌ها."""
+    keys = list(redis_client.scan_iter(match="ratelimit:*", count=500))
+    if keys:
+        redis_client.delete(*keys)
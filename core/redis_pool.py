@@ -0,0 +1,88 @@
+"""
+لایه مشترک دسترسی به Redis.
+
+همه بخش‌های پروژه (کد یکبار مصرف، کش و session، نگه‌داشت رزروها و صف‌ها) از یک
+connection pool در هر پروسه استفاده می‌کنند که از روی REDIS_URL و در اولین استفاده
+ساخته می‌شود. آمار اتصال‌های pool با pool_metrics در دسترس است.
+"""
+import threading
+
+import redis
+from django.conf import settings
+from django.core.cache.backends.redis import RedisCache, RedisCacheClient
+from django.utils.functional import SimpleLazyObject
+
+from core.timing import timed_connection_class
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class InstrumentedConnectionPool(redis.ConnectionPool):
+    """
+    ConnectionPool با شمارش تعداد دریافت اتصال و دفعاتی که سقف اتصال‌ها پر بوده است. اتصال‌ها
+    رفت و برگشت‌های خود را برای Server-Timing ثبت می‌کنند (core.timing).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connection_class = timed_connection_class(self.connection_class)
+        self.checkouts = 0
+        self.exhausted = 0
+
+    def get_connection(self, *args, **kwargs):
+        self.checkouts += 1
+        try:
+            return super().get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            if self._created_connections >= self.max_connections:
+                self.exhausted += 1
+            raise
+
+    def metrics(self):
+        return {
+            'max_connections': self.max_connections,
+            'created': self._created_connections,
+            'in_use': len(self._in_use_connections),
+            'idle': len(self._available_connections),
+            'checkouts': self.checkouts,
+            'exhausted': self.exhausted,
+        }
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = InstrumentedConnectionPool.from_url(
+                    settings.REDIS_URL,
+                    max_connections=settings.REDIS_MAX_CONNECTIONS,
+                    health_check_interval=30,
+                )
+    return _pool
+
+
+def pool_metrics():
+    pool = get_pool()
+    kwargs = pool.connection_kwargs
+    # بدون نام کاربری و رمز عبور REDIS_URL
+    location = kwargs.get('path') or f"{kwargs.get('host')}:{kwargs.get('port')}/{kwargs.get('db', 0)}"
+    return {'location': location, 'pid': pool.pid, **pool.metrics()}
+
+
+# کلاینت مشترک؛ ساخت pool تا اولین استفاده به تعویق می‌افتد
+redis_client = SimpleLazyObject(lambda: redis.Redis(connection_pool=get_pool()))
+
+
+class SharedPoolRedisCacheClient(RedisCacheClient):
+    def _get_connection_pool(self, write):
+        return get_pool()
+
+
+class SharedPoolRedisCache(RedisCache):
+    """backend کش Redis که به جای pool جداگانه از pool مشترک پروژه استفاده می‌کند."""
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self._class = SharedPoolRedisCacheClient
@@ -0,0 +1,147 @@
+"""
+موتور session پروژه بر پایه backend کش Django.
+
+- session فقط وقتی تغییر کرده باشد ذخیره می‌شود (SESSION_SAVE_EVERY_REQUEST خاموش است).
+- انقضای لغزان حفظ می‌شود، اما به جای نوشتن در هر درخواست، حداکثر یک بار در هر
+  SESSION_REFRESH_WINDOW ثانیه session دوباره ذخیره و کوکی آن تمدید می‌شود.
+- برای درخواست‌های فقط‌خواندنی (GET، HEAD، OPTIONS) که هنوز session ندارند، session ساخته نمی‌شود.
+- داده session به شکل فشرده ذخیره می‌شود: کلیدهای پرتکرار با نام کوتاه، reservation_data به صورت
+  لیست ترتیبی طبق schema با pickle و در اندازه‌های بزرگ‌تر zlib. sessionهای قدیمی که
+  به شکل dict ذخیره شده‌اند همچنان خوانده می‌شوند و در اولین ذخیره به قالب جدید تبدیل می‌شوند.
+"""
+import logging
+import pickle
+import time
+import zlib
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError, UpdateError
+from django.contrib.sessions.backends.cache import SessionStore as CacheSessionStore
+from django.contrib.sessions.middleware import SessionMiddleware as DjangoSessionMiddleware
+
+logger = logging.getLogger(__name__)
+
+REFRESHED_AT_KEY = '_session_refreshed_at'
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# بایت اول داده ذخیره‌شده قالب آن را مشخص می‌کند
+FORMAT_PICKLE = b'\x01'
+FORMAT_ZLIB = b'\x02'
+COMPRESS_MIN_SIZE = 256
+
+# همان ترتیب reservation_data در SendRequestView و فیلدهای GuestForm
+RESERVATION_FIELDS = ('room_slug', 'check_in', 'check_out', 'capacity', 'total_price', 'nights')
+GUEST_FIELDS = ('full_name', 'national_id', 'phone_number', 'gender')
+
+KEY_ALIASES = {
+    '_auth_user_id': 'u',
+    '_auth_user_backend': 'b',
+    '_auth_user_hash': 'h',
+    REFRESHED_AT_KEY: 't',
+    'authority': 'a',
+    'otp_token': 'o',
+    'otp_phone': 'p',
+    'reservation_data': 'r',
+}
+KEY_NAMES = {alias: key for key, alias in KEY_ALIASES.items()}
+
+
+def pack_reservation(data):
+    """reservation_data را به لیست ترتیبی تبدیل می‌کند؛ اگر با schema نخواند None برمی‌گرداند."""
+    if not isinstance(data, dict) or set(data) != {*RESERVATION_FIELDS, 'guests'}:
+        return None
+    guests = data['guests']
+    if not isinstance(guests, list) or any(not isinstance(guest, dict) or set(guest) != set(GUEST_FIELDS)
+                                           for guest in guests):
+        return None
+    return [data[field] for field in RESERVATION_FIELDS] + [[[guest[field] for field in GUEST_FIELDS]
+                                                             for guest in guests]]
+
+
+def unpack_reservation(row):
+    data = dict(zip(RESERVATION_FIELDS, row))
+    data['guests'] = [dict(zip(GUEST_FIELDS, guest)) for guest in row[len(RESERVATION_FIELDS)]]
+    return data
+
+
+PACKERS = {'reservation_data': (pack_reservation, unpack_reservation)}
+
+
+def encode(session_dict):
+    # [کلیدهای شناخته‌شده با نام کوتاه، بقیه کلیدها با نام اصلی]
+    known, other = {}, {}
+    for key, value in session_dict.items():
+        if key in PACKERS:
+            packed = PACKERS[key][0](value)
+            if packed is None:
+                other[key] = value
+            else:
+                known[KEY_ALIASES[key]] = packed
+        elif key in KEY_ALIASES:
+            known[KEY_ALIASES[key]] = value
+        else:
+            other[key] = value
+
+    # داده session مانند قبل فقط توسط خود سایت در Redis نوشته می‌شود؛ backend کش هم از pickle استفاده می‌کند
+    payload = pickle.dumps([known, other] if other else [known], pickle.HIGHEST_PROTOCOL)
+    if len(payload) >= COMPRESS_MIN_SIZE:
+        return FORMAT_ZLIB + zlib.compress(payload)
+    return FORMAT_PICKLE + payload
+
+
+def decode(data):
+    if isinstance(data, dict):
+        # session ذخیره‌شده با backend پیش‌فرض کش
+        return data
+    if data[:1] == FORMAT_ZLIB:
+        payload = zlib.decompress(data[1:])
+    elif data[:1] == FORMAT_PICKLE:
+        payload = data[1:]
+    else:
+        raise ValueError("Unknown session format")
+
+    known, *other = pickle.loads(payload)
+    session_dict = other[0] if other else {}
+    for alias, value in known.items():
+        key = KEY_NAMES[alias]
+        session_dict[key] = PACKERS[key][1](value) if key in PACKERS else value
+    return session_dict
+
+
+class SessionStore(CacheSessionStore):
+    def load(self):
+        try:
+            data = decode(super().load())
+        except (ValueError, KeyError, IndexError, TypeError, zlib.error, pickle.UnpicklingError):
+            logger.warning("Discarding undecodable session", exc_info=True)
+            self._session_key = None
+            data = {}
+        if data and time.time() - data.get(REFRESHED_AT_KEY, 0) >= settings.SESSION_REFRESH_WINDOW:
+            # با علامت‌گذاری به عنوان تغییر یافته، middleware در پایان درخواست آن را ذخیره و کوکی را تمدید می‌کند
+            data[REFRESHED_AT_KEY] = int(time.time())
+            self.modified = True
+        return data
+
+    def save(self, must_create=False):
+        # همان روند backend کش، با ذخیره داده فشرده به جای dict
+        if self.session_key is None:
+            return self.create()
+        session_dict = self._get_session(no_load=must_create)
+        session_dict[REFRESHED_AT_KEY] = int(time.time())
+        if must_create:
+            func = self._cache.add
+        elif self._cache.get(self.cache_key) is not None:
+            func = self._cache.set
+        else:
+            raise UpdateError
+        result = func(self.cache_key, encode(session_dict), self.get_expiry_age())
+        if must_create and not result:
+            raise CreateError
+
+
+class SessionMiddleware(DjangoSessionMiddleware):
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        if session is not None and session.session_key is None and request.method in READ_ONLY_METHODS:
+            session.modified = False
+        return super().process_response(request, response)
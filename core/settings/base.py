@@ -35,8 +35,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.sessions.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -49,7 +50,7 @@ ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.timing.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / "templates"],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -103,7 +104,51 @@ MERCHANT = "9bb72628-0d73-4134-bcef-f8946dcc3e5f"
 
 SANDBOX = True
 
+# درگاه پرداخت؛ برای تست بار بدون اینترنت می‌توان آن را به سرور جایگزین (manage.py fake_zarinpal) اشاره داد
+ZARINPAL_BASE_URL = config(
+    'ZARINPAL_BASE_URL',
+    default='https://sandbox.zarinpal.com' if SANDBOX else 'https://payment.zarinpal.com',
+)
+ZARINPAL_TIMEOUT = (3.05, 10)  # (اتصال، خواندن) به ثانیه
+ZARINPAL_VERIFY_RETRIES = 2
+ZARINPAL_POOL_SIZE = 10
+ZARINPAL_CIRCUIT_FAILURES = 5
+ZARINPAL_CIRCUIT_RESET = 30  # ثانیه
+
 REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
+# سقف اتصال‌های pool مشترک Redis در هر پروسه (core.redis_pool)
+REDIS_MAX_CONNECTIONS = config('REDIS_MAX_CONNECTIONS', default=100, cast=int)
+# تست‌ها Redis را پاک می‌کنند و روی پایگاه داده جداگانه اجرا می‌شوند (core.test_runner)
+TEST_REDIS_URL = config('TEST_REDIS_URL', default='redis://localhost:6379/15')
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# کد یکبار مصرف و صف ارسال پیامک (manage.py otp_worker)
+OTP_CODE_TTL = 120
+OTP_QUEUE_BATCH_SIZE = 50
+OTP_MAX_ATTEMPTS = 5
+SMS_PROVIDER = config('SMS_PROVIDER', default='accounts.send_otp.ConsoleSmsProvider')
+SMS_PROVIDER_OPTIONS = {}
+
+# محدودیت نرخ درخواست کد و تایید آن (core.ratelimit): {دامنه: (ظرفیت، دوره به ثانیه)}
+RATE_LIMITS = {
+    'otp-request:phone': (3, 10 * 60),
+    'otp-request:ip': (20, 60 * 60),
+    'otp-verify:phone': (5, 10 * 60),
+    'otp-verify:ip': (30, 60 * 60),
+}
+# تعداد پروکسی‌های معکوس مورد اعتماد جلوی سایت؛ با 0 آدرس کاربر فقط از REMOTE_ADDR خوانده می‌شود
+RATELIMIT_TRUSTED_PROXIES = config('RATELIMIT_TRUSTED_PROXIES', default=0, cast=int)
+# توکن دسترسی سرور جمع‌آوری متریک‌ها (Authorization: Bearer ...)؛ خالی یعنی فقط کارکنان
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# مدت نگه‌داشتن شب‌های اتاق در فاصله ارسال به درگاه پرداخت تا بازگشت از آن (ثانیه)
+RESERVATION_HOLD_TIMEOUT = 60 * 15
+# رزرو در انتظاری که پس از این مدت (ثانیه) تایید نشده باشد با manage.py expire_bookings منقضی می‌شود
+PENDING_BOOKING_TIMEOUT = 60 * 30
+# تعداد ردیف‌های خوانده شده از پایگاه داده در هر مرحله خروجی CSV (reservations.exports)
+EXPORT_CHUNK_SIZE = 2000
+# تعداد نظرات نمایش داده شده در هر صفحه جزئیات اتاق
+ROOM_REVIEWS_PAGE_SIZE = 10
 
 STATIC_URL = '/public/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'public', 'static')
@@ -112,6 +157,24 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/public/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'public', 'media')
 
+# نسخه‌های عکس‌ها هنگام ذخیره ساخته نمی‌شوند؛ worker صف (manage.py process_images) آن‌ها را می‌سازد و پس از آن
+# بدون بررسی وجود فایل آدرس‌دهی می‌شوند. عکس‌های موجود با migrate در صف قرار می‌گیرند
+IMAGEKIT_DEFAULT_CACHEFILE_STRATEGY = 'hotels.images.RenditionStrategy'
+
+# هدر Server-Timing و لاگ زمان کوئری‌ها، Redis، رندر قالب و HTTP بیرونی هر درخواست (core.timing)
+SERVER_TIMING = config('SERVER_TIMING', default=False, cast=bool)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.timing': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -159,11 +222,13 @@ JALALI_SETTINGS = {
 
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.redis.RedisCache",
-        "LOCATION": "redis://127.0.0.1:6379",
+        "BACKEND": "core.redis_pool.SharedPoolRedisCache",
+        "LOCATION": REDIS_URL,
     }
 }
 
-SESSION_ENGINE = "django.contrib.sessions.backends.cache"
-SESSION_SAVE_EVERY_REQUEST = True
+SESSION_ENGINE = "core.sessions"
+SESSION_SAVE_EVERY_REQUEST = False
 SESSION_COOKIE_AGE = 86400
+# انقضای session حداکثر یک بار در این بازه (ثانیه) تمدید می‌شود
+SESSION_REFRESH_WINDOW = 60 * 60
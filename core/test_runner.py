@@ -0,0 +1,51 @@
+"""
+اجرای تست‌ها روی Redis و پایگاه داده SQLite جداگانه.
+
+کش، session، کدهای یکبار مصرف، نگه‌داشت رزروها، صف‌ها و محدودیت نرخ همه روی REDIS_URL
+هستند و تست‌ها آن را پاک می‌کنند (cache.clear یعنی FLUSHDB)؛ پس تست‌ها به TEST_REDIS_URL
+منتقل می‌شوند که نباید با REDIS_URL یکی باشد.
+
+پایگاه داده تست SQLite به جای حافظه روی فایل test_db.sqlite3 ساخته می‌شود و تراکنش‌ها با
+IMMEDIATE قفل نوشتن را از ابتدا می‌گیرند، تا تست‌های همزمانی (ParallelVerifyTest) قفل‌گذاری
+واقعی را ببینند. این تنظیمات فقط در تست‌ها اعمال می‌شوند.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from core import redis_pool
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        if settings.TEST_REDIS_URL == settings.REDIS_URL:
+            raise ImproperlyConfigured("TEST_REDIS_URL باید به پایگاه داده‌ای غیر از REDIS_URL اشاره کند.")
+        caches = {alias: dict(config) for alias, config in settings.CACHES.items()}
+        caches['default']['LOCATION'] = settings.TEST_REDIS_URL
+        self._redis_override = override_settings(REDIS_URL=settings.TEST_REDIS_URL, CACHES=caches)
+        self._redis_override.enable()
+        # pool تا اولین استفاده ساخته نمی‌شود؛ اگر ساخته شده باشد به آدرس قبلی وصل است
+        redis_pool._pool = None
+        redis_pool.redis_client.flushdb()
+
+    def teardown_test_environment(self, **kwargs):
+        redis_pool.redis_client.flushdb()
+        self._redis_override.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def setup_databases(self, **kwargs):
+        for alias in connections:
+            connection = connections[alias]
+            if connection.vendor != 'sqlite':
+                continue
+            if not connection.settings_dict['TEST']['NAME']:
+                test_name = 'test_db.sqlite3' if alias == 'default' else f'test_{alias}.sqlite3'
+                connection.settings_dict['TEST']['NAME'] = settings.BASE_DIR / test_name
+            connection.settings_dict['OPTIONS'].setdefault('transaction_mode', 'IMMEDIATE')
+            connection.settings_dict['OPTIONS'].setdefault('timeout', 20)
+            # تنظیمات فقط هنگام اتصال خوانده می‌شوند
+            connection.close()
+        return super().setup_databases(**kwargs)
@@ -0,0 +1,53 @@
+from datetime import date, datetime, timedelta
+
+import jdatetime
+from django.template import Context, Template
+from django.test import SimpleTestCase
+
+from core import jalali
+
+
+class JalaliTest(SimpleTestCase):
+    def setUp(self):
+        jalali.to_jalali.cache_clear()
+
+    def test_format_matches_jdatetime(self):
+        start = datetime(2024, 3, 1, 7, 5, 9)
+        for offset in range(0, 800, 7):
+            value = start + timedelta(days=offset, minutes=offset)
+            expected = jdatetime.datetime.fromgregorian(datetime=value)
+            self.assertEqual(jalali.format_datetime(value), expected.strftime('%Y/%m/%d %H:%M:%S'))
+            self.assertEqual(jalali.format_date(value), expected.strftime('%Y/%m/%d'))
+            self.assertEqual(jalali.format_date(value.date()), expected.strftime('%Y/%m/%d'))
+            self.assertEqual(jalali.format_datetime(value, '%Y-%m-%d %H:%M'), expected.strftime('%Y-%m-%d %H:%M'))
+
+    def test_empty_values(self):
+        self.assertEqual(jalali.format_date(None), '')
+        self.assertEqual(jalali.format_datetime(None), '')
+        self.assertEqual(jalali.format_long(None), '')
+
+    def test_format_long_month_names(self):
+        for month in range(1, 13):
+            value = jdatetime.date(1404, month, 5)
+            self.assertEqual(jalali.format_long(value), f"05 {jalali.MONTH_NAMES[month - 1]} 1404")
+        self.assertEqual(jalali.format_long(date(2025, 8, 16)), '25 مرداد 1404')
+
+    def test_conversion_is_memoized(self):
+        value = date(2025, 3, 21)
+        for _ in range(5):
+            jalali.format_date(datetime(2025, 3, 21, 10, 0))
+            jalali.to_jalali(value)
+        self.assertEqual(jalali.to_jalali.cache_info().misses, 1)
+
+    def test_to_jalali_many(self):
+        values = [date(2025, 3, 21), datetime(2025, 3, 22, 8, 0), date(2025, 3, 21)]
+        converted = jalali.to_jalali_many(values)
+        self.assertEqual(converted, [jdatetime.date(1404, 1, 1), jdatetime.date(1404, 1, 2), jdatetime.date(1404, 1, 1)])
+        self.assertEqual(jalali.to_jalali.cache_info().misses, 2)
+
+    def test_template_tags(self):
+        template = Template(
+            "{% load custom_filter %}{{ value|to_jalali }}|{{ value|to_jalali:'%Y/%m/%d' }}|{% format_jalali_date day %}"
+        )
+        rendered = template.render(Context({'value': datetime(2025, 3, 21, 14, 3, 0), 'day': jdatetime.date(1404, 5, 25)}))
+        self.assertEqual(rendered, '1404/01/01 14:03:00|1404/01/01|25 مرداد 1404')
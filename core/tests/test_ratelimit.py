@@ -0,0 +1,111 @@
+from unittest.mock import patch
+
+import redis
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from core import ratelimit
+from core.redis_pool import redis_client
+
+
+@override_settings(RATE_LIMITS={'test:phone': (3, 60)})
+class TokenBucketTest(TestCase):
+    def setUp(self):
+        ratelimit.reset()
+
+    def test_burst_up_to_capacity_then_limited(self):
+        decisions = [ratelimit.hit('test:phone', '09120000001') for _ in range(4)]
+        self.assertEqual([d.allowed for d in decisions], [True, True, True, False])
+        self.assertEqual([d.remaining for d in decisions[:3]], [2, 1, 0])
+        # یک توکن هر ۲۰ ثانیه شارژ می‌شود
+        self.assertTrue(0 < decisions[3].retry_after <= 20)
+
+    def test_identifiers_have_separate_buckets(self):
+        for _ in range(3):
+            ratelimit.hit('test:phone', '09120000001')
+        self.assertFalse(ratelimit.hit('test:phone', '09120000001').allowed)
+        self.assertTrue(ratelimit.hit('test:phone', '09120000002').allowed)
+
+    def test_tokens_refill_over_time(self):
+        for _ in range(3):
+            ratelimit.hit('test:phone', '09120000001')
+        key = ratelimit.bucket_key('test:phone', '09120000001')
+        # جلو بردن زمان با عقب بردن زمان آخرین به‌روزرسانی سطل به اندازه ۴۰ ثانیه
+        redis_client.hincrby(key, 'ts', -40 * 1000)
+        decisions = [ratelimit.hit('test:phone', '09120000001') for _ in range(3)]
+        self.assertEqual([d.allowed for d in decisions], [True, True, False])
+
+    def test_bucket_expires_with_period(self):
+        ratelimit.hit('test:phone', '09120000001')
+        ttl = redis_client.pttl(ratelimit.bucket_key('test:phone', '09120000001'))
+        self.assertTrue(0 < ttl <= 60 * 1000)
+
+    def test_counters(self):
+        for _ in range(4):
+            ratelimit.hit('test:phone', '09120000001')
+        self.assertEqual(ratelimit.counters(), {('test:phone', 'allowed'): 3, ('test:phone', 'limited'): 1})
+
+    def test_fails_open_without_redis(self):
+        with patch.object(ratelimit, 'TOKEN_BUCKET_SCRIPT', side_effect=redis.ConnectionError):
+            decision = ratelimit.hit('test:phone', '09120000001')
+        self.assertTrue(decision.allowed)
+
+    def test_check_returns_first_limited(self):
+        for _ in range(3):
+            ratelimit.hit('test:phone', '09120000001')
+        self.assertIsNone(ratelimit.check([('test:phone', '09120000002')]))
+        limited = ratelimit.check([('test:phone', '09120000002'), ('test:phone', '09120000001')])
+        self.assertFalse(limited.allowed)
+
+
+class ClientIpTest(SimpleTestCase):
+    def request(self, forwarded=None):
+        extra = {'REMOTE_ADDR': '10.0.0.1'}
+        if forwarded is not None:
+            extra['HTTP_X_FORWARDED_FOR'] = forwarded
+        return RequestFactory().get('/', **extra)
+
+    def test_remote_addr_without_trusted_proxies(self):
+        self.assertEqual(ratelimit.client_ip(self.request('1.2.3.4')), '10.0.0.1')
+
+    @override_settings(RATELIMIT_TRUSTED_PROXIES=1)
+    def test_forwarded_for_behind_one_proxy(self):
+        self.assertEqual(ratelimit.client_ip(self.request('1.2.3.4')), '1.2.3.4')
+        # مقدار جعلی ابتدای هدر که کاربر خودش فرستاده نادیده گرفته می‌شود
+        self.assertEqual(ratelimit.client_ip(self.request('9.9.9.9, 1.2.3.4')), '1.2.3.4')
+        self.assertEqual(ratelimit.client_ip(self.request()), '10.0.0.1')
+
+    @override_settings(RATELIMIT_TRUSTED_PROXIES=2)
+    def test_forwarded_for_behind_two_proxies(self):
+        self.assertEqual(ratelimit.client_ip(self.request('9.9.9.9, 1.2.3.4, 172.16.0.2')), '1.2.3.4')
+        self.assertEqual(ratelimit.client_ip(self.request('1.2.3.4')), '1.2.3.4')
+
+
+class RateLimitMetricsViewTest(TestCase):
+    def setUp(self):
+        ratelimit.reset()
+        self.url = reverse('ratelimit_metrics')
+
+    def test_prometheus_format_for_staff(self):
+        ratelimit.hit('otp-request:phone', '09120000001')
+        User.objects.create_superuser(phone='09120000001', password='testpass123')
+        self.client.login(phone='09120000001', password='testpass123')
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('# TYPE ratelimit_requests_total counter', body)
+        self.assertIn('ratelimit_requests_total{scope="otp-request:phone",result="allowed"} 1', body)
+        self.assertIn('ratelimit_requests_total{scope="otp-verify:ip",result="limited"} 0', body)
+
+    def test_forbidden_for_anonymous_and_regular_users(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        User.objects.create_user(phone='09120000002', password='testpass123')
+        self.client.login(phone='09120000002', password='testpass123')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_bearer_token(self):
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer scrape-token').status_code, 200)
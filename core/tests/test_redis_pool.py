@@ -0,0 +1,48 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from accounts import otp_queue
+from accounts.models import User
+from core.redis_pool import get_pool, pool_metrics, redis_client
+from core.sessions import SessionStore
+from hotels import images
+from reservations import holds
+
+
+class SharedRedisPoolTest(TestCase):
+    def test_single_pool_shared_by_all_clients(self):
+        pool = get_pool()
+        self.assertIs(redis_client.connection_pool, pool)
+        for module in (holds, images, otp_queue):
+            self.assertIs(module.redis_client.connection_pool, pool)
+        self.assertIs(cache._cache.get_client(write=True).connection_pool, pool)
+        self.assertIs(SessionStore()._cache._cache.get_client().connection_pool, pool)
+
+    def test_connections_reused(self):
+        redis_client.ping()
+        before = pool_metrics()
+        cache.set('redis-pool-test', 1)
+        cache.get('redis-pool-test')
+        redis_client.get('redis-pool-test')
+        after = pool_metrics()
+
+        self.assertEqual(after['checkouts'] - before['checkouts'], 3)
+        self.assertEqual(after['created'], before['created'])
+        self.assertEqual(after['in_use'], 0)
+
+    def test_metrics_view_staff_only(self):
+        url = reverse('redis_pool_metrics')
+        User.objects.create_user(phone='09120000002', password='testpass123')
+        User.objects.create_superuser(phone='09120000001', password='testpass123')
+
+        self.client.login(phone='09120000002', password='testpass123')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.login(phone='09120000001', password='testpass123')
+        data = json.loads(self.client.get(url).content)
+        self.assertIn('created', data)
+        self.assertEqual(data['max_connections'], get_pool().max_connections)
+        self.assertNotIn('@', data['location'])
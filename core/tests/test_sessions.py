@@ -0,0 +1,145 @@
+import pickle
+import time
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.sessions.backends.cache import SessionStore as CacheSessionStore
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory
+from django.urls import reverse
+
+from accounts.models import User
+from core.sessions import SessionMiddleware, SessionStore, REFRESHED_AT_KEY, encode, decode
+
+
+class SessionMiddlewareTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def process(self, request, view):
+        return SessionMiddleware(view)(request)
+
+    def write_session(self, request):
+        request.session['key'] = 'value'
+        return HttpResponse()
+
+    def test_anonymous_read_only_request_creates_no_session(self):
+        response = self.process(self.factory.get('/'), self.write_session)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_anonymous_write_request_creates_session(self):
+        response = self.process(self.factory.post('/'), self.write_session)
+        session_key = response.cookies[settings.SESSION_COOKIE_NAME].value
+        self.assertEqual(SessionStore(session_key)['key'], 'value')
+
+    def test_existing_session_saved_only_when_modified(self):
+        session = SessionStore()
+        session['key'] = 'value'
+        session.create()
+
+        request = self.factory.get('/')
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = session.session_key
+        response = self.process(request, lambda request: HttpResponse(request.session['key']))
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+        request = self.factory.get('/')
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = session.session_key
+        response = self.process(request, self.write_session)
+        self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+
+class SessionRefreshTest(TestCase):
+    def setUp(self):
+        User.objects.create_user(phone='09123456789', password='testpass123')
+        self.client.login(phone='09123456789', password='testpass123')
+        self.url = reverse('hotels:home')
+
+    def test_no_write_within_refresh_window(self):
+        response = self.client.get(self.url)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_expiry_refreshed_after_window(self):
+        later = time.time() + settings.SESSION_REFRESH_WINDOW + 1
+        with patch('core.sessions.time.time', return_value=later):
+            response = self.client.get(self.url)
+            # پس از تمدید، درخواست بعدی در همان بازه دوباره ذخیره نمی‌شود
+            second_response = self.client.get(self.url)
+
+        cookie = response.cookies[settings.SESSION_COOKIE_NAME]
+        self.assertEqual(cookie['max-age'], settings.SESSION_COOKIE_AGE)
+        self.assertEqual(SessionStore(cookie.value)[REFRESHED_AT_KEY], int(later))
+        self.assertTrue(response.wsgi_request.user.is_authenticated)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, second_response.cookies)
+
+
+class CompactSessionSerializerTest(TestCase):
+    def reservation_data(self, guests=6):
+        return {
+            'room_slug': 'سوئیت-رویال',
+            'check_in': '1404-08-01',
+            'check_out': '1404-08-05',
+            'capacity': guests,
+            'total_price': 12000000,
+            'guests': [
+                {'full_name': 'علی احمدی', 'national_id': '0012345678', 'phone_number': '09123456789', 'gender': 'M'}
+                for _ in range(guests)
+            ],
+            'nights': 4,
+        }
+
+    def session_data(self):
+        return {
+            '_auth_user_id': '12',
+            '_auth_user_backend': 'django.contrib.auth.backends.ModelBackend',
+            '_auth_user_hash': 'a' * 64,
+            'authority': 'A0000000000000000000000000000123456',
+            'reservation_data': self.reservation_data(),
+        }
+
+    def test_round_trip(self):
+        data = self.session_data()
+        data['extra'] = {'nested': [1, 2]}
+        self.assertEqual(decode(encode(data)), data)
+
+    def test_payload_not_matching_schema_kept_as_is(self):
+        data = {'reservation_data': {'room_slug': 'room', 'guests': []}}
+        self.assertEqual(decode(encode(data)), data)
+
+    def test_smaller_than_default_cache_format(self):
+        data = self.session_data()
+        self.assertLess(len(encode(data)), len(pickle.dumps(data, pickle.HIGHEST_PROTOCOL)) / 2)
+
+    def test_store_round_trip(self):
+        session = SessionStore()
+        session.update(self.session_data())
+        session.create()
+
+        self.assertIsInstance(cache.get(session.cache_key), bytes)
+        loaded = SessionStore(session.session_key)
+        self.assertEqual(loaded['reservation_data'], self.reservation_data())
+        self.assertEqual(loaded['_auth_user_id'], '12')
+
+    def test_reads_sessions_stored_by_default_backend(self):
+        session = CacheSessionStore()
+        session.update(self.session_data())
+        session.create()
+
+        loaded = SessionStore(session.session_key)
+        self.assertEqual(loaded['reservation_data'], self.reservation_data())
+
+        # در اولین ذخیره به قالب فشرده تبدیل می‌شود
+        loaded['authority'] = 'changed'
+        loaded.save()
+        self.assertIsInstance(cache.get(loaded.cache_key), bytes)
+        self.assertEqual(SessionStore(session.session_key)['authority'], 'changed')
+
+    def test_undecodable_session_discarded(self):
+        session = SessionStore()
+        session['key'] = 'value'
+        session.create()
+        cache.set(session.cache_key, b'\x09garbage')
+
+        loaded = SessionStore(session.session_key)
+        self.assertNotIn('key', loaded)
+        self.assertIsNone(loaded.session_key)
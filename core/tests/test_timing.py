@@ -0,0 +1,102 @@
+import re
+import threading
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import timing
+from core.redis_pool import redis_client
+from hotels.models import Room
+from reservations.gateway import ZarinpalClient
+from reservations.management.commands.fake_zarinpal import make_server
+
+
+def parse_header(value):
+    metrics = {}
+    for part in value.split(', '):
+        name = part.split(';')[0]
+        count = re.search(r'desc="(\d+)', part)
+        metrics[name] = {
+            'count': int(count.group(1)) if count else None,
+            'dur': float(re.search(r'dur=([\d.]+)', part).group(1)),
+        }
+    return metrics
+
+
+class TimingsContextTest(TestCase):
+    def setUp(self):
+        self.timings = timing.Timings()
+        token = timing._current.set(self.timings)
+        self.addCleanup(timing._current.reset, token)
+
+    def test_redis_round_trips(self):
+        redis_client.set('timing-test', 1)
+        pipe = redis_client.pipeline()
+        pipe.incr('timing-test')
+        pipe.expire('timing-test', 10)
+        pipe.get('timing-test')
+        pipe.execute()
+        # pipeline با سه فرمان یک رفت و برگشت است
+        self.assertEqual(self.timings.counts['cache'], 2)
+        self.assertGreater(self.timings.durations['cache'], 0)
+        redis_client.delete('timing-test')
+
+    def test_outbound_http(self):
+        server = make_server()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        host, port = server.server_address[:2]
+        client = ZarinpalClient(f'http://{host}:{port}', 'merchant')
+        self.addCleanup(client.session.close)
+
+        client.request_payment(amount=5000, description='test', callback_url='http://site.test/verify/')
+
+        self.assertEqual(self.timings.counts['http'], 1)
+        self.assertGreater(self.timings.durations['http'], 0)
+
+    def test_nothing_recorded_outside_request(self):
+        timing._current.set(None)
+        redis_client.get('timing-test')
+        timing.record('db', 1.0)
+        self.assertEqual(self.timings.counts, dict.fromkeys(timing.METRICS, 0))
+
+
+class ServerTimingMiddlewareTest(TestCase):
+    def setUp(self):
+        Room.objects.create(title='اتاق یک', price=1000, size=20, capacity=2, description='test')
+
+    @override_settings(SERVER_TIMING=True)
+    def test_header_reports_each_layer(self):
+        with CaptureQueriesContext(connection) as queries, self.assertLogs('core.timing', 'INFO'):
+            response = self.client.get(reverse('hotels:rooms_list'))
+
+        metrics = parse_header(response['Server-Timing'])
+        self.assertEqual(set(metrics), {'db', 'cache', 'tpl', 'http', 'total'})
+        self.assertEqual(metrics['db']['count'], len(queries))
+        self.assertEqual(metrics['tpl']['count'], 1)
+        self.assertEqual(metrics['http']['count'], 0)
+        self.assertGreaterEqual(metrics['total']['dur'], metrics['db']['dur'])
+
+    @override_settings(SERVER_TIMING=True)
+    def test_cache_round_trips_are_counted(self):
+        with self.assertLogs('core.timing', 'INFO'):
+            response = self.client.get(reverse('hotels:home'))
+        self.assertGreaterEqual(parse_header(response['Server-Timing'])['cache']['count'], 1)
+
+    @override_settings(SERVER_TIMING=True)
+    def test_structured_log_line(self):
+        with self.assertLogs('core.timing', 'INFO') as logs:
+            self.client.get(reverse('hotels:rooms_list'))
+
+        record = logs.records[0]
+        self.assertEqual(record.server_timing['path'], reverse('hotels:rooms_list'))
+        self.assertEqual(record.server_timing['status'], 200)
+        self.assertIn('db_count=', record.getMessage())
+        self.assertIn('tpl_ms=', record.getMessage())
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('hotels:rooms_list'))
+        self.assertNotIn('Server-Timing', response)
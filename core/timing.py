@@ -0,0 +1,183 @@
+"""
+زمان‌سنجی بخش‌های هر درخواست برای هدر Server-Timing و لاگ.
+
+با SERVER_TIMING روشن، ServerTimingMiddleware برای هر درخواست تعداد و مدت کوئری‌های پایگاه
+داده (connection.execute_wrapper)، رفت و برگشت‌های Redis (کش، session، نگه‌داشت‌ها و محدودیت
+نرخ؛ از connection pool مشترک)، رندر قالب‌ها و درخواست‌های HTTP بیرونی (درگاه پرداخت) را جمع
+می‌زند. ثبت در ContextVar انجام می‌شود و بیرون از درخواست (worker ها و دستورات مدیریتی) یا با
+تنظیم خاموش، هر اندازه‌گیری فقط یک خواندن ContextVar هزینه دارد.
+"""
+import logging
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# نام معیار در هدر و واحد شمارش آن
+METRICS = {
+    'db': 'queries',
+    'cache': 'round-trips',
+    'tpl': 'renders',
+    'http': 'requests',
+}
+
+_current = ContextVar('server_timing', default=None)
+
+
+class Timings:
+    """تعداد و مجموع مدت (ثانیه) هر معیار در یک درخواست."""
+
+    def __init__(self):
+        self.counts = dict.fromkeys(METRICS, 0)
+        self.durations = dict.fromkeys(METRICS, 0.0)
+        self.rendering = False
+
+    def add(self, metric, duration, count=1):
+        self.counts[metric] += count
+        self.durations[metric] += duration
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('db', time.perf_counter() - started)
+
+    def as_dict(self, total):
+        data = {'total_ms': round(total * 1000, 2)}
+        for metric in METRICS:
+            data[f'{metric}_count'] = self.counts[metric]
+            data[f'{metric}_ms'] = round(self.durations[metric] * 1000, 2)
+        return data
+
+    def header(self, total):
+        parts = [
+            f'{metric};desc="{self.counts[metric]} {unit}";dur={self.durations[metric] * 1000:.2f}'
+            for metric, unit in METRICS.items()
+        ]
+        parts.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(parts)
+
+
+def record(metric, duration, count=1):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(metric, duration, count)
+
+
+class ServerTimingMiddleware:
+    """
+    هدر Server-Timing و یک سطر لاگ key=value برای هر درخواست. باید اولین middleware باشد تا
+    کار middleware های بعدی (مثلا خواندن session از Redis) هم شمرده شود. برای پاسخ‌های جریانی
+    فقط کار انجام شده تا برگشتن view اندازه‌گیری می‌شود.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = Timings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - started
+
+        response['Server-Timing'] = timings.header(total)
+        data = {'method': request.method, 'path': request.path, 'status': response.status_code,
+                **timings.as_dict(total)}
+        logger.info(
+            'request_timing %s', ' '.join(f'{key}={value}' for key, value in data.items()),
+            extra={'server_timing': data},
+        )
+        return response
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None or timings.rendering:
+            return super().render(context, request)
+        timings.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.rendering = False
+            timings.add('tpl', time.perf_counter() - started)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    backend قالب جنگو که زمان رندر قالب‌ها را ثبت می‌کند. قالب‌هایی که در میان رندر قالب دیگری
+    رندر می‌شوند (include و ویجت‌های فرم) جزو زمان قالب بیرونی هستند و جدا شمرده نمی‌شوند.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class TimedConnectionMixin:
+    """
+    هر ارسال فرمان به Redis یک رفت و برگشت شمرده می‌شود (pipeline هم یک ارسال است) و مدت
+    ارسال و خواندن پاسخ‌ها جمع زده می‌شود.
+    """
+
+    def send_packed_command(self, command, check_health=True):
+        if _current.get() is None:
+            return super().send_packed_command(command, check_health)
+        started = time.perf_counter()
+        try:
+            return super().send_packed_command(command, check_health)
+        finally:
+            record('cache', time.perf_counter() - started)
+
+    def read_response(self, *args, **kwargs):
+        if _current.get() is None:
+            return super().read_response(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().read_response(*args, **kwargs)
+        finally:
+            record('cache', time.perf_counter() - started, count=0)
+
+
+@lru_cache(maxsize=None)
+def timed_connection_class(connection_class):
+    """زیرکلاس زمان‌سنج کلاس اتصال Redis (TCP، unix socket یا SSL بسته به REDIS_URL)."""
+    return type(f'Timed{connection_class.__name__}', (TimedConnectionMixin, connection_class), {})
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter که مدت هر درخواست بیرونی (از جمله هر تلاش مجدد) را ثبت می‌کند."""
+
+    def send(self, request, *args, **kwargs):
+        if _current.get() is None:
+            return super().send(request, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().send(request, *args, **kwargs)
+        finally:
+            record('http', time.perf_counter() - started)
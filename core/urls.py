@@ -5,6 +5,7 @@ from django.conf.urls.static import static
 import debug_toolbar
 from django.views.generic import RedirectView
 from django.urls import reverse_lazy
+from core.views import RedisPoolMetricsView, RateLimitMetricsView
 
 
 urlpatterns = [
@@ -14,6 +15,8 @@ urlpatterns = [
     path("hotels/", include("hotels.urls")),
     path("reservations/", include("reservations.urls")),
     path("pages/", include("pages.urls")),
+    path("metrics/redis-pool/", RedisPoolMetricsView.as_view(), name="redis_pool_metrics"),
+    path("metrics/ratelimit/", RateLimitMetricsView.as_view(), name="ratelimit_metrics"),
     path('__debug__/', include(debug_toolbar.urls))
 
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
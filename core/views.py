@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.http import HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.views.generic import View
+from core import ratelimit
+from core.redis_pool import pool_metrics
+
+
+class RedisPoolMetricsView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """آمار اتصال‌های pool مشترک Redis در پروسه‌ای که درخواست را پاسخ می‌دهد، فقط برای کارکنان."""
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        return JsonResponse(pool_metrics())
+
+
+class RateLimitMetricsView(View):
+    """
+    شمارنده‌های محدودیت نرخ در قالب متنی Prometheus. دسترسی برای کارکنان یا با
+    توکن METRICS_TOKEN در هدر Authorization (برای سرور جمع‌آوری متریک‌ها) است.
+    """
+
+    def has_access(self, request):
+        if request.user.is_authenticated and request.user.is_staff:
+            return True
+        token = settings.METRICS_TOKEN
+        header = request.headers.get("Authorization", "")
+        return bool(token) and constant_time_compare(header, f"Bearer {token}")
+
+    def get(self, request):
+        if not self.has_access(request):
+            return HttpResponse(status=403)
+
+        counts = ratelimit.counters()
+        lines = [
+            "# HELP ratelimit_requests_total Rate limit checks by scope and result.",
+            "# TYPE ratelimit_requests_total counter",
+        ]
+        for scope in settings.RATE_LIMITS:
+            for outcome in ("allowed", "limited"):
+                lines.append(
+                    f'ratelimit_requests_total{{scope="{scope}",result="{outcome}"}} {counts.get((scope, outcome), 0)}'
+                )
+        return HttpResponse("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4")
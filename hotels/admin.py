@@ -1,12 +1,13 @@
 from django.contrib import admin
 from hotels.models import RoomImage, Room, Service, Review
-import jdatetime
+from core import jalali
 
 
 class RoomImageInline(admin.TabularInline):
     model = RoomImage
     extra = 1
-    fields = ['image', 'alt_text', 'is_primary']
+    fields = ['image', 'alt_text', 'is_primary', 'renditions_ready']
+    readonly_fields = ['renditions_ready']
 
 
 @admin.register(Room)
@@ -22,18 +23,15 @@ class RoomAdmin(admin.ModelAdmin):
     ]
 
     def created_at_jalali(self, obj):
-        if obj.created_at:
-            jalali_date = jdatetime.datetime.fromgregorian(datetime=obj.created_at)
-            return jalali_date.strftime('%Y/%m/%d %H:%M:%S')
-        return ''
+        return jalali.format_datetime(obj.created_at)
 
     created_at_jalali.short_description = 'تاریخ ایجاد'
 
 
 @admin.register(RoomImage)
 class RoomImageAdmin(admin.ModelAdmin):
-    list_display = ['room', 'alt_text', 'is_primary']
-    list_filter = ['is_primary']
+    list_display = ['room', 'alt_text', 'is_primary', 'renditions_ready']
+    list_filter = ['is_primary', 'renditions_ready']
     search_fields = ['room__title', 'alt_text']
 
 
@@ -52,9 +50,6 @@ class ReviewAdmin(admin.ModelAdmin):
     list_editable = ["is_featured"]
 
     def created_at_jalali(self, obj):
-        if obj.created_at:
-            jalali_date = jdatetime.datetime.fromgregorian(datetime=obj.created_at)
-            return jalali_date.strftime('%Y/%m/%d %H:%M:%S')
-        return ''
+        return jalali.format_datetime(obj.created_at)
 
     created_at_jalali.short_description = 'تاریخ ایجاد'
@@ -0,0 +1,18 @@
+import time
+from django.core.cache import cache
+
+HOMEPAGE_VERSION_KEY = "homepage:version"
+HOMEPAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def homepage_cache_version():
+    return cache.get_or_set(HOMEPAGE_VERSION_KEY, time.time_ns, None)
+
+
+def homepage_cache_key():
+    return f"homepage:{homepage_cache_version()}"
+
+
+def invalidate_homepage():
+    # کلید نسخه جدید، داده‌های کش‌شده قبلی را بی‌استفاده می‌کند و آن‌ها با TTL از بین می‌روند
+    cache.set(HOMEPAGE_VERSION_KEY, time.time_ns(), None)
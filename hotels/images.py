@@ -0,0 +1,166 @@
+"""
+ساخت نسخه‌های عکس اتاق‌ها (ImageSpecField) در پس‌زمینه.
+
+عکس آپلود شده بدون پردازش ذخیره می‌شود و شناسه آن پس از commit در یک صف Redis قرار
+می‌گیرد. worker (manage.py process_images) نسخه‌ها را می‌سازد و renditions_ready را
+روشن می‌کند؛ تا آن زمان قالب‌ها تصویر جایگزین نمایش می‌دهند. پس از ساخت، نسخه‌ها
+بدون بررسی وجود فایل روی دیسک آدرس‌دهی می‌شوند.
+
+worker شناسه را با BLMOVE به لیست در حال پردازش منتقل می‌کند و پس از پردازش آن را ack
+می‌کند؛ کارهای worker از کار افتاده هنگام شروع worker بعدی (requeue_stale) پس از
+PROCESSING_TIMEOUT به صف برمی‌گردند.
+"""
+import logging
+import time
+
+import redis
+from imagekit.cachefiles.strategies import Optimistic
+
+from core.redis_pool import redis_client
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "images:queue"
+PROCESSING_KEY = "images:processing"
+# زمان برداشتن هر شناسه از صف، برای تشخیص کارهای رها شده
+CLAIMS_KEY = "images:claims"
+PROCESSING_TIMEOUT = 5 * 60  # ثانیه
+METRICS_KEY = "images:metrics"
+THROUGHPUT_WINDOW = 5  # دقیقه
+
+
+class RenditionStrategy(Optimistic):
+    def on_source_saved(self, file):
+        # ساخت نسخه‌ها به جای درخواست ذخیره عکس، در worker انجام می‌شود
+        pass
+
+
+def processed_minute_key(minute):
+    return f"images:processed:{minute}"
+
+
+def enqueue(image_id):
+    """شناسه عکس را در صف ساخت نسخه‌ها قرار می‌دهد؛ در نبود Redis نسخه‌ها همان‌جا ساخته می‌شوند."""
+    try:
+        redis_client.lpush(QUEUE_KEY, image_id)
+    except redis.RedisError:
+        logger.warning("Could not queue renditions for image %s; processing inline", image_id, exc_info=True)
+        process_image(image_id)
+
+
+def enqueue_many(image_ids, chunk_size=1000):
+    """
+    شناسه چند عکس را دسته‌ای (یک LPUSH برای هر دسته) در صف قرار می‌دهد. برخلاف enqueue در
+    نبود Redis خطا می‌دهد و عکس‌ها همان‌جا پردازش نمی‌شوند. خروجی: تعداد عکس‌ها
+    """
+    image_ids = list(image_ids)
+    for start in range(0, len(image_ids), chunk_size):
+        redis_client.lpush(QUEUE_KEY, *image_ids[start:start + chunk_size])
+    return len(image_ids)
+
+
+def dequeue(timeout=5):
+    """شناسه عکس بعدی را به لیست در حال پردازش منتقل می‌کند؛ پس از پردازش باید ack شود."""
+    image_id = redis_client.blmove(QUEUE_KEY, PROCESSING_KEY, timeout, 'RIGHT', 'LEFT')
+    if image_id is None:
+        return None
+    redis_client.hset(CLAIMS_KEY, image_id, time.time())
+    return int(image_id)
+
+
+def ack(image_id):
+    """کار پردازش شده (موفق یا ناموفق) را از لیست در حال پردازش حذف می‌کند."""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.lrem(PROCESSING_KEY, 1, image_id)
+    pipe.hdel(CLAIMS_KEY, image_id)
+    pipe.execute()
+
+
+def requeue_stale(now=None):
+    """کارهایی که پس از PROCESSING_TIMEOUT هنوز ack نشده‌اند را به صف برمی‌گرداند."""
+    now = time.time() if now is None else now
+    image_ids = redis_client.lrange(PROCESSING_KEY, 0, -1)
+    if not image_ids:
+        return 0
+
+    requeued = 0
+    for image_id, claimed_at in zip(image_ids, redis_client.hmget(CLAIMS_KEY, image_ids)):
+        if claimed_at is None:
+            # worker پس از BLMOVE و پیش از ثبت زمان از کار افتاده است؛ از همین حالا سنجیده می‌شود
+            redis_client.hsetnx(CLAIMS_KEY, image_id, now)
+        elif now - float(claimed_at) >= PROCESSING_TIMEOUT:
+            # فقط workerی که شناسه را از لیست حذف کند آن را به صف برمی‌گرداند
+            if redis_client.lrem(PROCESSING_KEY, 1, image_id):
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.hdel(CLAIMS_KEY, image_id)
+                pipe.lpush(QUEUE_KEY, image_id)
+                pipe.execute()
+                requeued += 1
+    return requeued
+
+
+def process_image(image_id):
+    """نسخه‌های یک عکس را می‌سازد. اگر عکس حذف شده یا قبلا پردازش شده باشد کاری انجام نمی‌شود."""
+    from hotels.cache import invalidate_homepage
+    from hotels.models import RoomImage
+
+    image = RoomImage.objects.filter(pk=image_id).first()
+    if image is None or image.renditions_ready:
+        return False
+
+    started = time.perf_counter()
+    try:
+        for field in RoomImage.RENDITION_FIELDS:
+            getattr(image, field).generate(force=True)
+    except OSError:
+        logger.warning("Could not generate renditions for image %s", image_id, exc_info=True)
+        record_metrics(failed=True)
+        return False
+
+    # اگر در این فاصله فایل عکس عوض شده باشد، نسخه‌های جدید در نوبت بعدی صف ساخته می‌شوند
+    updated = RoomImage.objects.filter(pk=image_id, image=image.image.name).update(renditions_ready=True)
+    if updated:
+        invalidate_homepage()
+    record_metrics(elapsed_ms=(time.perf_counter() - started) * 1000)
+    return bool(updated)
+
+
+def record_metrics(elapsed_ms=0, failed=False):
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        if failed:
+            pipe.hincrby(METRICS_KEY, 'failed', 1)
+        else:
+            minute_key = processed_minute_key(int(time.time() // 60))
+            pipe.hincrby(METRICS_KEY, 'processed', 1)
+            pipe.hincrbyfloat(METRICS_KEY, 'processing_ms', elapsed_ms)
+            pipe.incr(minute_key)
+            pipe.expire(minute_key, THROUGHPUT_WINDOW * 60 * 2)
+        pipe.execute()
+    except redis.RedisError:
+        logger.warning("Could not record image queue metrics", exc_info=True)
+
+
+def metrics():
+    """عمق صف و توان پردازش worker برای نمایش در endpoint متریک‌ها."""
+    current_minute = int(time.time() // 60)
+    minute_keys = [processed_minute_key(current_minute - offset) for offset in range(THROUGHPUT_WINDOW)]
+
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.llen(QUEUE_KEY)
+    pipe.llen(PROCESSING_KEY)
+    pipe.hgetall(METRICS_KEY)
+    pipe.mget(minute_keys)
+    queue_depth, in_progress, totals, per_minute = pipe.execute()
+
+    processed = int(totals.get(b'processed', 0))
+    processing_ms = float(totals.get(b'processing_ms', 0))
+    return {
+        'queue_depth': queue_depth,
+        'in_progress': in_progress,
+        'processed': processed,
+        'failed': int(totals.get(b'failed', 0)),
+        'avg_processing_ms': round(processing_ms / processed, 1) if processed else 0,
+        'processed_last_minute': int(per_minute[0] or 0),
+        f'processed_per_minute_{THROUGHPUT_WINDOW}m': round(sum(int(count or 0) for count in per_minute) / THROUGHPUT_WINDOW, 2),
+    }
@@ -0,0 +1,71 @@
+import time
+from datetime import datetime, timedelta
+
+import jdatetime
+from django.core.management.base import BaseCommand
+
+from core import jalali
+
+
+def legacy_datetime(value):
+    return jdatetime.datetime.fromgregorian(datetime=value).strftime('%Y/%m/%d %H:%M:%S')
+
+
+def legacy_date(value):
+    return jdatetime.datetime.fromgregorian(datetime=value).strftime('%Y/%m/%d')
+
+
+def legacy_long(value):
+    return value.strftime('%d %B %Y').replace('Farvardin', 'فروردین').replace(
+        'Ordibehesht', 'اردیبهشت').replace('Khordad', 'خرداد').replace('Tir', 'تیر').replace(
+        'Mordad', 'مرداد').replace('Shahrivar', 'شهریور').replace('Mehr', 'مهر').replace(
+        'Aban', 'آبان').replace('Azar', 'آذر').replace('Dey', 'دی').replace(
+        'Bahman', 'بهمن').replace('Esfand', 'اسفند')
+
+
+class Command(BaseCommand):
+    help = (
+        "هزینه هر فراخوانی تبدیل و قالب‌بندی تاریخ شمسی را در پیاده‌سازی قبلی (تبدیل کامل در هر "
+        "فراخوانی) و core.jalali مقایسه می‌کند. تاریخ‌ها مانند یک لیست مدیریت از چند ده روز متفاوت هستند."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=100000)
+        parser.add_argument('--days', type=int, default=60, help="تعداد روزهای متفاوت در داده آزمایشی")
+
+    def measure(self, func, values):
+        started = time.perf_counter()
+        for value in values:
+            func(value)
+        return (time.perf_counter() - started) / len(values) * 1_000_000
+
+    def handle(self, *args, **options):
+        base = datetime(2025, 3, 21, 9, 30)
+        stamps = [base + timedelta(days=i % options['days'], minutes=i % 1440) for i in range(options['calls'])]
+        days = [stamp.date() for stamp in stamps]
+        jalali_days = [jdatetime.date.fromgregorian(date=day) for day in days[:options['days']]]
+        jalali_days = jalali_days * (options['calls'] // len(jalali_days))
+
+        jalali.to_jalali.cache_clear()
+        jalali._format_day.cache_clear()
+        cases = [
+            ('datetime -> %Y/%m/%d %H:%M:%S', legacy_datetime, jalali.format_datetime, stamps),
+            ('date -> %Y/%m/%d', legacy_date, jalali.format_date, days),
+            ('jalali date -> "25 مرداد 1404"', legacy_long, jalali.format_long, jalali_days),
+        ]
+        self.stdout.write(f"{'case':<36}{'before (µs)':>14}{'after (µs)':>14}{'speedup':>10}")
+        for name, before, after, values in cases:
+            before_cost = self.measure(before, values)
+            after_cost = self.measure(after, values)
+            self.stdout.write(f"{name:<36}{before_cost:>14.2f}{after_cost:>14.2f}{before_cost / after_cost:>9.1f}x")
+
+        batch = days[:1000]
+        started = time.perf_counter()
+        [jdatetime.date.fromgregorian(date=day) for day in batch]
+        before_cost = (time.perf_counter() - started) * 1000
+        jalali.to_jalali.cache_clear()
+        started = time.perf_counter()
+        jalali.to_jalali_many(batch)
+        after_cost = (time.perf_counter() - started) * 1000
+        self.stdout.write(f"{'batch of 1000 dates (ms)':<36}{before_cost:>14.2f}{after_cost:>14.2f}"
+                          f"{before_cost / after_cost:>9.1f}x")
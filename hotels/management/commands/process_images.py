@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from hotels import images
+from hotels.models import RoomImage
+
+
+class Command(BaseCommand):
+    help = "worker ساخت نسخه‌های عکس اتاق‌ها؛ شناسه عکس‌ها را از صف Redis برمی‌دارد و نسخه‌های آن‌ها را می‌سازد."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="پس از خالی شدن صف خارج می‌شود")
+        parser.add_argument('--enqueue-pending', action='store_true',
+                            help="همه عکس‌هایی که نسخه‌هایشان آماده نیست را پیش از شروع در صف قرار می‌دهد")
+        parser.add_argument('--timeout', type=int, default=5, help="مدت انتظار برای کار جدید به ثانیه")
+
+    def handle(self, *args, **options):
+        if options['enqueue_pending']:
+            queued = images.enqueue_many(RoomImage.objects.filter(renditions_ready=False).values_list('pk', flat=True))
+            self.stdout.write(f"{queued} عکس در صف قرار گرفت.")
+
+        # کارهای worker قبلی که پیش از ack از کار افتاده است
+        requeued = images.requeue_stale()
+        if requeued:
+            self.stdout.write(f"{requeued} عکس رها شده دوباره در صف قرار گرفت.")
+
+        processed = 0
+        try:
+            while True:
+                image_id = images.dequeue(timeout=1 if options['once'] else options['timeout'])
+                if image_id is None:
+                    if options['once']:
+                        break
+                    continue
+                # worker طولانی‌مدت است؛ اتصال‌های قطع یا منقضی شده پایگاه داده جایگزین می‌شوند
+                close_old_connections()
+                if images.process_image(image_id):
+                    processed += 1
+                images.ack(image_id)
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f"نسخه‌های {processed} عکس ساخته شد."))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from hotels.models import Room
+
+
+class Command(BaseCommand):
+    help = "آمار امتیاز اتاق‌ها را از روی جدول نظرات دوباره محاسبه و اختلاف‌ها را اصلاح می‌کند."
+
+    def handle(self, *args, **options):
+        annotations = Room.rating_stats_annotations()
+        fields = list(annotations)
+
+        def with_actual_stats(queryset):
+            return queryset.annotate(
+                **{f'actual_{field}': expression for field, expression in annotations.items()}
+            ).order_by('pk')
+
+        def is_drifted(room):
+            return any(getattr(room, field) != getattr(room, f'actual_{field}') for field in fields)
+
+        drifted_ids = [room.pk for room in with_actual_stats(Room.objects.all()) if is_drifted(room)]
+
+        fixed = []
+        with transaction.atomic():
+            # قفل اتاق‌ها قبل از محاسبه دوباره، تا نظرات هم‌زمان پس از اصلاح روی مقدار درست اعمال شوند
+            list(Room.objects.select_for_update().filter(pk__in=drifted_ids).values_list('pk', flat=True))
+            for room in with_actual_stats(Room.objects.filter(pk__in=drifted_ids)):
+                if is_drifted(room):
+                    for field in fields:
+                        setattr(room, field, getattr(room, f'actual_{field}'))
+                    fixed.append(room)
+            Room.objects.bulk_update(fixed, fields, batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(f"آمار امتیاز {len(fixed)} اتاق اصلاح شد."))
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:45
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_rating_stats(apps, schema_editor):
+    Room = apps.get_model('hotels', 'Room')
+    annotations = {
+        'actual_rating_count': Count('reviews'),
+        'actual_rating_sum': Coalesce(Sum('reviews__rating'), Value(0)),
+    }
+    for i in range(1, 6):
+        annotations[f'actual_rating_{i}_count'] = Count('reviews', filter=Q(reviews__rating=i))
+    fields = [name[len('actual_'):] for name in annotations]
+    rooms = list(Room.objects.annotate(**annotations))
+    for room in rooms:
+        for field in fields:
+            setattr(room, field, getattr(room, f'actual_{field}'))
+    Room.objects.bulk_update(rooms, fields, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0018_review_is_featured'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='تعداد امتیازها'),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='مجموع امتیازها'),
+        ),
+        migrations.RunPython(populate_rating_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0019_room_rating_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['room', '-created_at'], name='review_room_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roomimage',
+            index=models.Index(condition=models.Q(('is_primary', True)), fields=['room'], name='roomimage_primary_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0021_room_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='roomimage',
+            name='renditions_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='نسخه\u200cهای عکس آماده است'),
+        ),
+        migrations.AlterField(
+            model_name='roomimage',
+            name='image',
+            field=models.ImageField(upload_to='rooms/images', verbose_name='عکس'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+import logging
+
+import redis
+from django.db import migrations, transaction
+
+logger = logging.getLogger(__name__)
+
+
+def queue_existing_images(apps, schema_editor):
+    # عکس‌های موجود پیش از 0022 با renditions_ready=False مانده‌اند و تا ساخت نسخه‌ها تصویر جایگزین نمایش می‌دهند
+    from hotels import images
+
+    RoomImage = apps.get_model('hotels', 'RoomImage')
+    alias = schema_editor.connection.alias
+    image_ids = list(RoomImage.objects.using(alias).filter(renditions_ready=False).values_list('pk', flat=True))
+    if not image_ids:
+        return
+
+    def enqueue():
+        try:
+            images.enqueue_many(image_ids)
+        except redis.RedisError:
+            logger.warning(
+                "Could not queue renditions for %s existing images; run manage.py process_images --enqueue-pending",
+                len(image_ids), exc_info=True,
+            )
+
+    transaction.on_commit(enqueue, using=alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0022_roomimage_renditions_ready'),
+    ]
+
+    operations = [
+        migrations.RunPython(queue_existing_images, migrations.RunPython.noop),
+    ]
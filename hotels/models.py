@@ -1,13 +1,15 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.core.validators import MinValueValidator
-from imagekit.models import ProcessedImageField
+from imagekit.models import ImageSpecField
 from imagekit.processors import ResizeToFit
 from django.utils.text import slugify
 from django.urls import reverse
+from django.templatetags.static import static
 from accounts.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
-import jdatetime
+from core import jalali
 import django_jalali.db.models as jmodels
 
 
@@ -22,6 +24,28 @@ class Service(models.Model):
         verbose_name_plural = "سرویس ها"
 
 
+class RoomQuerySet(models.QuerySet):
+    def with_card_data(self):
+        """
+        عکس اصلی و سرویس‌های اتاق‌ها را پیش‌بارگذاری می‌کند تا ساخت کارت‌ها
+        مستقل از تعداد اتاق‌ها با تعداد ثابتی کوئری انجام شود.
+        """
+        return self.prefetch_related(
+            models.Prefetch('images', queryset=RoomImage.objects.filter(is_primary=True), to_attr='primary_images'),
+            models.Prefetch('services', queryset=Service.objects.only('name')),
+        )
+
+    def with_detail_data(self):
+        """
+        همه عکس‌ها و سرویس‌های اتاق را برای صفحه جزئیات پیش‌بارگذاری می‌کند؛ عکس اصلی از میان
+        همین عکس‌ها انتخاب می‌شود و کوئری جداگانه‌ای ندارد.
+        """
+        return self.prefetch_related(
+            models.Prefetch('images', queryset=RoomImage.objects.order_by('-is_primary', 'id'), to_attr='all_images'),
+            models.Prefetch('services', queryset=Service.objects.only('name'), to_attr='service_list'),
+        )
+
+
 class Room(models.Model):
     title = models.CharField(max_length=100, verbose_name="عنوان")
     price = models.IntegerField(validators=[MinValueValidator(0)], verbose_name="قیمت")
@@ -34,50 +58,109 @@ class Room(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # آمار امتیازها که با ایجاد، ویرایش و حذف نظرات به‌روز می‌شوند
+    rating_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="تعداد امتیازها")
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name="مجموع امتیازها")
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = RoomQuerySet.as_manager()
+
     class Meta:
         ordering = ("-created_at",)
         verbose_name = "اتاق"
         verbose_name_plural = "اتاق ها"
+        # ایندکس‌های صفحه‌بندی cursor در لیست اتاق‌ها (مرتب‌سازی + شناسه)
+        indexes = [
+            models.Index(fields=['price', 'id'], name='room_price_id_idx'),
+            models.Index(fields=['created_at', 'id'], name='room_created_id_idx'),
+        ]
+
+    RATING_FIELDS = ('rating_count', 'rating_sum', 'rating_1_count', 'rating_2_count', 'rating_3_count',
+                     'rating_4_count', 'rating_5_count')
 
     def save(self, *args, force_insert=False, force_update=False, using=None, update_fields=None):
         self.slug = slugify(self.title, allow_unicode=True)
-        super(Room, self).save()
+        if update_fields is None and not force_insert and not self._state.adding:
+            # آمار امتیازها فقط با UPDATE اتمیک update_rating_stats تغییر می‌کند؛ ذخیره کامل اتاق (مثلا در پنل
+            # مدیریت) نباید مقدار خوانده شده قبلی را روی نظرات ثبت شده در این فاصله بنویسد
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.RATING_FIELDS
+            ]
+        super(Room, self).save(force_insert=force_insert, force_update=force_update, using=using,
+                               update_fields=update_fields)
 
     def get_absolute_url(self):
         return reverse("hotels:room_detail", args=[self.slug])
 
     def get_rating(self):
-        from django.db.models import Avg
-        return self.reviews.aggregate(Avg('rating'))['rating__avg'] or 0.0
+        if not self.rating_count:
+            return 0.0
+        return self.rating_sum / self.rating_count
 
     def get_rating_breakdown(self):
-        from django.db.models import Count
-        total_reviews = self.reviews.count()
-        if total_reviews == 0:
+        if not self.rating_count:
             return {str(i): 0 for i in range(1, 6)}
-        breakdown = self.reviews.values('rating').annotate(count=Count('rating')).order_by('-rating')
-        percentages = {str(i): 0 for i in range(1, 6)}
-        for item in breakdown:
-            percentages[str(item['rating'])] = (item['count'] / total_reviews) * 100
-        return percentages
+        return {
+            str(i): (getattr(self, f'rating_{i}_count') / self.rating_count) * 100
+            for i in range(1, 6)
+        }
+
+    def update_rating_stats(self, removed=None, added=None):
+        """
+        آمار امتیاز اتاق را با یک UPDATE اتمیک تغییر می‌دهد.
+        removed امتیازی است که کنار می‌رود و added امتیازی که اضافه می‌شود.
+        """
+        changes = {}
+        for rating, sign in ((removed, -1), (added, 1)):
+            if not rating:
+                continue
+            for field, delta in (('rating_count', 1), ('rating_sum', rating), (f'rating_{rating}_count', 1)):
+                changes[field] = changes.get(field, 0) + sign * delta
+        changes = {field: delta for field, delta in changes.items() if delta}
+        if not changes:
+            return
+        Room.objects.filter(pk=self.pk).update(**{field: F(field) + delta for field, delta in changes.items()})
+        for field, delta in changes.items():
+            setattr(self, field, getattr(self, field) + delta)
+
+    @classmethod
+    def rating_stats_annotations(cls):
+        """عبارات محاسبه آمار امتیاز از روی جدول نظرات؛ برای بازسازی آمار."""
+        from django.db.models import Count, Q, Sum, Value
+        from django.db.models.functions import Coalesce
+        annotations = {
+            'rating_count': Count('reviews'),
+            'rating_sum': Coalesce(Sum('reviews__rating'), Value(0)),
+        }
+        for i in range(1, 6):
+            annotations[f'rating_{i}_count'] = Count('reviews', filter=Q(reviews__rating=i))
+        return annotations
 
     def __str__(self):
         return self.title
 
     @property
     def primary_image(self):
+        if 'primary_images' in self.__dict__:
+            return self.primary_images[0] if self.primary_images else None
+        if 'all_images' in self.__dict__:
+            return next((image for image in self.all_images if image.is_primary), None)
         return self.images.filter(is_primary=True).first()
 
     def created_at_jalali(self):
-        jalali_date = jdatetime.datetime.fromgregorian(datetime=self.created_at)
-        return jalali_date.strftime('%Y/%m/%d %H:%M:%S')
+        return jalali.format_datetime(self.created_at)
 
 
 class RoomImage(models.Model):
     room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="images", verbose_name="اتاق")
-    image = ProcessedImageField(
+    # عکس اصلی بدون پردازش ذخیره می‌شود؛ تغییر اندازه و ساخت نسخه‌ها در worker (process_images) انجام می‌شود
+    image = models.ImageField(
         upload_to='rooms/images',
-        processors=[ResizeToFit(800, 600)],
         verbose_name="عکس"
     )
     alt_text = models.CharField(
@@ -88,13 +171,86 @@ class RoomImage(models.Model):
         default=False,
         verbose_name="عکس اصلی اتاق"
     )
+    renditions_ready = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name="نسخه‌های عکس آماده است"
+    )
+
+    # نسخه‌های کوچک‌تر عکس برای srcset؛ یک بار ساخته و در CACHE/ روی دیسک نگه‌داری می‌شوند
+    thumb_webp = ImageSpecField(source='image', processors=[ResizeToFit(160, 120)], format='WEBP',
+                                options={'quality': 75})
+    thumb_jpeg = ImageSpecField(source='image', processors=[ResizeToFit(160, 120)], format='JPEG',
+                                options={'quality': 75})
+    card_webp = ImageSpecField(source='image', processors=[ResizeToFit(400, 300)], format='WEBP',
+                               options={'quality': 80})
+    card_jpeg = ImageSpecField(source='image', processors=[ResizeToFit(400, 300)], format='JPEG',
+                               options={'quality': 80})
+    full_webp = ImageSpecField(source='image', processors=[ResizeToFit(800, 600)], format='WEBP',
+                               options={'quality': 80})
+    full_jpeg = ImageSpecField(source='image', processors=[ResizeToFit(800, 600)], format='JPEG',
+                               options={'quality': 85})
+
+    RENDITION_WIDTHS = (('thumb', 160), ('card', 400), ('full', 800))
+    RENDITION_FIELDS = tuple(f'{name}_{image_format}' for name, _ in RENDITION_WIDTHS for image_format in ('webp', 'jpeg'))
+    # تا آماده شدن نسخه‌ها به جای عکس نمایش داده می‌شود
+    PLACEHOLDER = 'img/room/placeholder.svg'
 
     def __str__(self):
         return f"{self.room.title}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_image = instance.__dict__.get('image')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # با عوض شدن فایل، نسخه‌های قبلی دیگر معتبر نیستند و دوباره در صف قرار می‌گیرند
+        if self.image.name != getattr(self, '_loaded_image', None):
+            self.renditions_ready = False
+        super().save(*args, **kwargs)
+        self._loaded_image = self.image.name
+
+    def rendition_url(self, name, image_format='jpeg'):
+        if not self.renditions_ready:
+            return static(self.PLACEHOLDER)
+        return getattr(self, f'{name}_{image_format}').url
+
+    @property
+    def thumb_url(self):
+        return self.rendition_url('thumb')
+
+    @property
+    def card_url(self):
+        return self.rendition_url('card')
+
+    @property
+    def full_url(self):
+        return self.rendition_url('full')
+
+    def srcset(self, image_format='jpeg'):
+        """مقدار srcset با همه نسخه‌های عکس در قالب داده شده (webp یا jpeg)؛ تا آماده شدن نسخه‌ها خالی است."""
+        if not self.renditions_ready:
+            return ''
+        return ", ".join(
+            f"{getattr(self, f'{name}_{image_format}').url} {width}w" for name, width in self.RENDITION_WIDTHS
+        )
+
+    @property
+    def webp_srcset(self):
+        return self.srcset('webp')
+
+    @property
+    def jpeg_srcset(self):
+        return self.srcset('jpeg')
+
     class Meta:
         verbose_name = "عکس اتاق"
         verbose_name_plural = "عکس اتاق ها"
+        indexes = [
+            models.Index(fields=['room'], condition=models.Q(is_primary=True), name='roomimage_primary_idx'),
+        ]
 
 
 class Review(models.Model):
@@ -109,10 +265,35 @@ class Review(models.Model):
         ordering = ("-created_at",)
         verbose_name = "نظر"
         verbose_name_plural = "نظرات"
+        indexes = [
+            models.Index(fields=['room', '-created_at'], name='review_room_created_idx'),
+        ]
 
     def __str__(self):
         return f" {self.user.first_name} {self.user.last_name} --> {self.room}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # مقدار ذخیره‌شده برای محاسبه تغییر آمار امتیاز اتاق هنگام ویرایش
+        instance._loaded_rating = instance.__dict__.get('rating')
+        instance._loaded_room_id = instance.__dict__.get('room_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        is_new = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                self.room.update_rating_stats(added=self.rating)
+            elif self._loaded_room_id != self.room_id:
+                Room(pk=self._loaded_room_id).update_rating_stats(removed=self._loaded_rating)
+                self.room.update_rating_stats(added=self.rating)
+            elif self._loaded_rating != self.rating:
+                self.room.update_rating_stats(removed=self._loaded_rating, added=self.rating)
+        self._loaded_rating = self.rating
+        self._loaded_room_id = self.room_id
+
     @property
     def get_rating_given_range(self):
         return range(self.rating or 0)
@@ -140,5 +321,4 @@ class Review(models.Model):
 
     def created_at_jalali(self):
         # تبدیل تاریخ میلادی به شمسی
-        jalali_date = jdatetime.datetime.fromgregorian(datetime=self.created_at)
-        return jalali_date.strftime('%Y/%m/%d %H:%M:%S')
+        return jalali.format_datetime(self.created_at)
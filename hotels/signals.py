@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from hotels import images
+from hotels.cache import invalidate_homepage
+from hotels.models import Room, RoomImage, Review
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_rating(sender, instance, **kwargs):
+    # حذف‌های گروهی و آبشاری هم از این مسیر عبور می‌کنند و داخل همان تراکنش حذف اجرا می‌شوند
+    room = instance.room if Review.room.is_cached(instance) else Room(pk=instance.room_id)
+    room.update_rating_stats(removed=getattr(instance, '_loaded_rating', instance.rating))
+
+
+@receiver(post_save, sender=RoomImage)
+def queue_image_renditions(sender, instance, **kwargs):
+    if not instance.renditions_ready:
+        image_id = instance.pk
+        transaction.on_commit(lambda: images.enqueue(image_id))
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+@receiver(post_save, sender=RoomImage)
+@receiver(post_delete, sender=RoomImage)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender='reservations.Booking')
+@receiver(post_delete, sender='reservations.Booking')
+def invalidate_homepage_cache(sender, **kwargs):
+    # پس از commit، تا درخواست هم‌زمان داده قدیمی را زیر نسخه جدید کش نکند
+    transaction.on_commit(invalidate_homepage)
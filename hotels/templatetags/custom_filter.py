@@ -1,5 +1,5 @@
 from django import template
-import jdatetime
+from core import jalali
 
 register = template.Library()
 
@@ -45,14 +45,11 @@ def number_to_persian_word(value):
 
 
 @register.filter
-def to_jalali(value):
-    if value:
-        try:
-            jalali_date = jdatetime.datetime.fromgregorian(datetime=value)
-            return jalali_date.strftime('%Y/%m/%d %H:%M:%S')
-        except (ValueError, TypeError):
-            return ''
-    return ''
+def to_jalali(value, fmt=jalali.DATETIME_FORMAT):
+    try:
+        return jalali.format_datetime(value, fmt)
+    except (ValueError, TypeError):
+        return ''
 
 
 @register.simple_tag
@@ -60,10 +57,4 @@ def format_jalali_date(date_obj):
     """
     شیء jdatetime.date را به فرمت خوانا (مثل '25 مرداد 1404') تبدیل می‌کند.
     """
-    if not isinstance(date_obj, jdatetime.date):
-        return ""
-    return date_obj.strftime('%d %B %Y').replace('Farvardin', 'فروردین').replace(
-        'Ordibehesht', 'اردیبهشت').replace('Khordad', 'خرداد').replace('Tir', 'تیر').replace(
-        'Mordad', 'مرداد').replace('Shahrivar', 'شهریور').replace('Mehr', 'مهر').replace(
-        'Aban', 'آبان').replace('Azar', 'آذر').replace('Dey', 'دی').replace(
-        'Bahman', 'بهمن').replace('Esfand', 'اسفند')
+    return jalali.format_long(date_obj)
@@ -1,4 +1,8 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import time
+
+from django.test import TestCase, override_settings
 from hotels.models import Room, Service, Review, RoomImage
 from accounts.models import User
 from django.core.exceptions import ValidationError
@@ -11,6 +15,21 @@ from datetime import datetime
 from datetime import timedelta
 import jdatetime
 from django.utils import timezone
+from django.core.management import call_command
+from io import StringIO, BytesIO
+from PIL import Image
+from hotels import images
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.apps import apps
+from django.db import connection
+import importlib
+
+# عکس‌های آپلود شده و نسخه‌های آن‌ها در پوشه موقت نوشته می‌شوند، نه در public/media
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
 
 class TestServiceModel(TestCase):
@@ -76,9 +95,7 @@ class TestRoomModel(TestCase):
         )
         self.assertEqual(room.get_rating(), 0.0)
 
-    @patch('hotels.models.Room.reviews')
-    def test_get_rating_with_reviews(self, mock_reviews):
-        mock_reviews.aggregate.return_value = {'rating__avg': 4.5}
+    def test_get_rating_with_reviews(self):
         room = Room.objects.create(
             title='Test Room',
             price=100000,
@@ -87,7 +104,12 @@ class TestRoomModel(TestCase):
             description='Test description',
             existing=True
         )
-        self.assertEqual(room.get_rating(), 4.5)
+        user = User.objects.create_user(phone='09111111111', password='12345')
+        Review.objects.create(room=room, user=user, rating=5, comment='a')
+        Review.objects.create(room=room, user=user, rating=4, comment='b')
+        room.refresh_from_db()
+        with self.assertNumQueries(0):
+            self.assertEqual(room.get_rating(), 4.5)
 
     def test_get_rating_breakdown_no_reviews(self):
         room = Room.objects.create(
@@ -100,13 +122,7 @@ class TestRoomModel(TestCase):
         )
         self.assertEqual(room.get_rating_breakdown(), {'1': 0, '2': 0, '3': 0, '4': 0, '5': 0})
 
-    @patch('hotels.models.Room.reviews')
-    def test_get_rating_breakdown_with_reviews(self, mock_reviews):
-        mock_reviews.count.return_value = 10
-        mock_reviews.values.return_value.annotate.return_value.order_by.return_value = [
-            {'rating': 5, 'count': 6},
-            {'rating': 4, 'count': 4}
-        ]
+    def test_get_rating_breakdown_with_reviews(self):
         room = Room.objects.create(
             title='Test Room',
             price=100000,
@@ -115,7 +131,12 @@ class TestRoomModel(TestCase):
             description='Test description',
             existing=True
         )
-        breakdown = room.get_rating_breakdown()
+        user = User.objects.create_user(phone='09111111111', password='12345')
+        for rating in [5, 5, 5, 4, 4]:
+            Review.objects.create(room=room, user=user, rating=rating, comment='test')
+        room.refresh_from_db()
+        with self.assertNumQueries(0):
+            breakdown = room.get_rating_breakdown()
         self.assertEqual(breakdown['5'], 60.0)
         self.assertEqual(breakdown['4'], 40.0)
         self.assertEqual(breakdown['3'], 0)
@@ -160,6 +181,7 @@ class TestRoomModel(TestCase):
             room.full_clean()
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class TestRoomImageModel(TestCase):
     def setUp(self):
         self.room = Room.objects.create(
@@ -199,6 +221,140 @@ class TestRoomImageModel(TestCase):
         )
         self.assertIn(room_image, self.room.images.all())
 
+    def create_image(self, name='big.jpg'):
+        buffer = BytesIO()
+        Image.new('RGB', (1600, 1200), 'red').save(buffer, format='JPEG')
+        return RoomImage.objects.create(
+            room=self.room,
+            image=SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg'),
+            alt_text='Test alt text'
+        )
+
+    def test_original_stored_without_processing(self):
+        room_image = self.create_image()
+        self.assertEqual(room_image.image.width, 1600)
+        self.assertFalse(room_image.renditions_ready)
+        self.assertTrue(room_image.card_url.endswith('placeholder.svg'))
+        self.assertEqual(room_image.webp_srcset, '')
+
+    def test_renditions_generated_by_worker(self):
+        room_image = self.create_image()
+        self.assertTrue(images.process_image(room_image.pk))
+        room_image.refresh_from_db()
+        self.assertTrue(room_image.renditions_ready)
+
+        for name, width in RoomImage.RENDITION_WIDTHS:
+            for image_format in ('webp', 'jpeg'):
+                rendition = getattr(room_image, f'{name}_{image_format}')
+                self.assertTrue(rendition.storage.exists(rendition.name))
+                self.assertEqual(Image.open(rendition.storage.open(rendition.name)).width, width)
+
+        self.assertEqual(room_image.card_url, room_image.card_jpeg.url)
+        self.assertEqual(room_image.webp_srcset, ", ".join([
+            f"{room_image.thumb_webp.url} 160w",
+            f"{room_image.card_webp.url} 400w",
+            f"{room_image.full_webp.url} 800w",
+        ]))
+        # عکسی که قبلا پردازش شده دوباره پردازش نمی‌شود
+        self.assertFalse(images.process_image(room_image.pk))
+
+    def test_replacing_image_resets_renditions(self):
+        room_image = self.create_image()
+        images.process_image(room_image.pk)
+        room_image = RoomImage.objects.get(pk=room_image.pk)
+
+        room_image.alt_text = 'new alt'
+        room_image.save()
+        self.assertTrue(room_image.renditions_ready)
+
+        room_image.image = SimpleUploadedFile('other.jpg', room_image.image.read(), content_type='image/jpeg')
+        room_image.save()
+        room_image.refresh_from_db()
+        self.assertFalse(room_image.renditions_ready)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageQueueTest(TestCase):
+    def setUp(self):
+        images.redis_client.delete(images.QUEUE_KEY, images.PROCESSING_KEY, images.CLAIMS_KEY, images.METRICS_KEY)
+        # بستن اتصال‌ها در worker تراکنش تست را از بین می‌برد
+        close_patcher = patch('hotels.management.commands.process_images.close_old_connections')
+        close_patcher.start()
+        self.addCleanup(close_patcher.stop)
+        self.room = Room.objects.create(title='Queue Room', price=100000, size=50, capacity=2, description='test')
+
+    def test_upload_is_queued_after_commit(self):
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 900), 'blue').save(buffer, format='JPEG')
+        with self.captureOnCommitCallbacks(execute=True):
+            room_image = RoomImage.objects.create(
+                room=self.room,
+                image=SimpleUploadedFile('queued.jpg', buffer.getvalue(), content_type='image/jpeg'),
+                alt_text='queued'
+            )
+        self.assertEqual(images.metrics()['queue_depth'], 1)
+
+        out = StringIO()
+        call_command('process_images', '--once', stdout=out)
+
+        room_image.refresh_from_db()
+        self.assertTrue(room_image.renditions_ready)
+        metrics = images.metrics()
+        self.assertEqual(metrics['queue_depth'], 0)
+        self.assertEqual(metrics['in_progress'], 0)
+        self.assertEqual(metrics['processed'], 1)
+        self.assertEqual(metrics['processed_last_minute'], 1)
+
+    def test_job_of_crashed_worker_requeued_on_start(self):
+        room_image = RoomImage.objects.create(room=self.room, image='rooms/images/missing.jpg', alt_text='missing')
+        images.enqueue(room_image.pk)
+        # worker شناسه را برداشته و پیش از ack از کار افتاده است
+        self.assertEqual(images.dequeue(timeout=1), room_image.pk)
+        self.assertEqual(images.metrics()['in_progress'], 1)
+        self.assertEqual(images.requeue_stale(), 0)
+        images.redis_client.hset(images.CLAIMS_KEY, room_image.pk, time.time() - images.PROCESSING_TIMEOUT)
+
+        out = StringIO()
+        with patch('hotels.images.process_image', return_value=True) as mock_process:
+            call_command('process_images', '--once', stdout=out)
+
+        mock_process.assert_called_once_with(room_image.pk)
+        self.assertIn("1 عکس رها شده", out.getvalue())
+        self.assertEqual(images.metrics()['in_progress'], 0)
+        self.assertEqual(images.redis_client.hlen(images.CLAIMS_KEY), 0)
+
+    def test_unclaimed_job_requeued_after_timeout(self):
+        images.redis_client.lpush(images.PROCESSING_KEY, 42)
+        now = time.time()
+        self.assertEqual(images.requeue_stale(now=now), 0)
+        self.assertEqual(images.requeue_stale(now=now + images.PROCESSING_TIMEOUT), 1)
+        self.assertEqual(images.redis_client.lrange(images.QUEUE_KEY, 0, -1), [b'42'])
+
+    def test_broken_image_counts_as_failure(self):
+        room_image = RoomImage.objects.create(room=self.room, image='rooms/images/missing.jpg', alt_text='missing')
+        self.assertFalse(images.process_image(room_image.pk))
+        self.assertEqual(images.metrics()['failed'], 1)
+        room_image.refresh_from_db()
+        self.assertFalse(room_image.renditions_ready)
+
+    def test_enqueue_pending(self):
+        RoomImage.objects.create(room=self.room, image='rooms/images/missing.jpg', alt_text='missing')
+        with patch('hotels.images.process_image') as mock_process:
+            call_command('process_images', '--enqueue-pending', '--once', stdout=StringIO())
+        mock_process.assert_called_once()
+
+    def test_existing_images_queued_by_migration(self):
+        migration = importlib.import_module('hotels.migrations.0023_queue_existing_image_renditions')
+        pending = RoomImage.objects.create(room=self.room, image='rooms/images/old.jpg', alt_text='old')
+        ready = RoomImage.objects.create(room=self.room, image='rooms/images/done.jpg', alt_text='done')
+        RoomImage.objects.filter(pk=ready.pk).update(renditions_ready=True)
+        images.redis_client.delete(images.QUEUE_KEY)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            migration.queue_existing_images(apps, connection.schema_editor())
+
+        self.assertEqual(images.redis_client.lrange(images.QUEUE_KEY, 0, -1), [str(pending.pk).encode()])
+
 
 class ReviewModelTest(TestCase):
     def setUp(self):
@@ -291,3 +447,93 @@ class ReviewModelTest(TestCase):
         expected = jalali_date.strftime('%Y/%m/%d %H:%M:%S')
         self.assertEqual(review.created_at_jalali(), expected)
 
+
+class RoomRatingStatsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            phone='09111111111',
+            password='12345',
+        )
+        self.room = Room.objects.create(
+            title='Test Room',
+            price=100,
+            size=20,
+            capacity=2,
+            description='Test description',
+            existing=True
+        )
+        self.other_room = Room.objects.create(
+            title='Other Room',
+            price=100,
+            size=20,
+            capacity=2,
+            description='Test description',
+            existing=True
+        )
+
+    def assertStats(self, room, count, total, histogram):
+        room.refresh_from_db()
+        self.assertEqual(room.rating_count, count)
+        self.assertEqual(room.rating_sum, total)
+        self.assertEqual([getattr(room, f'rating_{i}_count') for i in range(1, 6)], histogram)
+
+    def test_create_updates_stats(self):
+        Review.objects.create(room=self.room, user=self.user, rating=5, comment='a')
+        Review.objects.create(room=self.room, user=self.user, rating=3, comment='b')
+        self.assertStats(self.room, 2, 8, [0, 0, 1, 0, 1])
+
+    def test_edit_moves_rating_between_buckets(self):
+        review = Review.objects.create(room=self.room, user=self.user, rating=5, comment='a')
+        review = Review.objects.get(pk=review.pk)
+        review.rating = 2
+        review.save()
+        self.assertStats(self.room, 1, 2, [0, 1, 0, 0, 0])
+
+    def test_edit_without_rating_change_skips_update(self):
+        review = Review.objects.create(room=self.room, user=self.user, rating=5, comment='a')
+        review.comment = 'edited'
+        with self.assertNumQueries(3):
+            review.save()
+        self.assertStats(self.room, 1, 5, [0, 0, 0, 0, 1])
+
+    def test_edit_moves_rating_between_rooms(self):
+        review = Review.objects.create(room=self.room, user=self.user, rating=4, comment='a')
+        review.room = self.other_room
+        review.save()
+        self.assertStats(self.room, 0, 0, [0, 0, 0, 0, 0])
+        self.assertStats(self.other_room, 1, 4, [0, 0, 0, 1, 0])
+
+    def test_delete_updates_stats(self):
+        review = Review.objects.create(room=self.room, user=self.user, rating=4, comment='a')
+        Review.objects.create(room=self.room, user=self.user, rating=2, comment='b')
+        review.delete()
+        self.assertStats(self.room, 1, 2, [0, 1, 0, 0, 0])
+
+    def test_queryset_delete_updates_stats(self):
+        Review.objects.create(room=self.room, user=self.user, rating=4, comment='a')
+        Review.objects.create(room=self.room, user=self.user, rating=2, comment='b')
+        Review.objects.filter(room=self.room).delete()
+        self.assertStats(self.room, 0, 0, [0, 0, 0, 0, 0])
+
+    def test_room_save_keeps_concurrent_rating_changes(self):
+        # اتاق پیش از ثبت نظر خوانده شده است (مثلا فرم ویرایش پنل مدیریت)
+        room = Room.objects.get(pk=self.room.pk)
+        Review.objects.create(room=self.room, user=self.user, rating=4, comment='a')
+
+        room.price = 200
+        room.save()
+
+        self.assertStats(self.room, 1, 4, [0, 0, 0, 1, 0])
+        self.assertEqual(self.room.price, 200)
+
+    def test_recompute_command_fixes_drift(self):
+        Review.objects.create(room=self.room, user=self.user, rating=4, comment='a')
+        Review.objects.create(room=self.other_room, user=self.user, rating=1, comment='b')
+        Room.objects.filter(pk=self.room.pk).update(rating_count=10, rating_sum=3, rating_5_count=2)
+
+        out = StringIO()
+        call_command('recompute_room_ratings', stdout=out)
+
+        self.assertStats(self.room, 1, 4, [0, 0, 0, 1, 0])
+        self.assertStats(self.other_room, 1, 1, [1, 0, 0, 0, 0])
+        self.assertIn("1", out.getvalue())
@@ -1,4 +1,7 @@
-from django.test import TestCase, Client
+import shutil
+import tempfile
+
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from accounts.models import User
 from hotels.models import Room, Service, Review, RoomImage
@@ -8,11 +11,26 @@ from datetime import date, timedelta
 import jdatetime
 from reservations.models import Booking
 import json
+import re
 from hotels.views import ReviewDeleteView
+from django.core.cache import cache
+from django.core import signing
+from django.utils import timezone
+from reservations import holds
+from hotels import images
+
+# عکس‌های آپلود شده و نسخه‌های آن‌ها در پوشه موقت نوشته می‌شوند، نه در public/media
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
 
+def tearDownModule():
+    shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class HomePageViewTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.url = reverse('hotels:home')
 
@@ -146,6 +164,10 @@ class HomePageViewTest(TestCase):
         self.assertIn('capacity', first_room)
         self.assertIn('description', first_room)
         self.assertIn('image_url', first_room)
+        self.assertIn('image_srcset', first_room)
+        # تا ساخت نسخه‌ها در worker، تصویر جایگزین نمایش داده می‌شود
+        self.assertTrue(first_room['image_url'].endswith('placeholder.svg'))
+        self.assertEqual(first_room['image_webp_srcset'], '')
         self.assertIn('alt_text', first_room)
         self.assertIn('services', first_room)
         self.assertIn('url', first_room)
@@ -192,8 +214,79 @@ class HomePageViewTest(TestCase):
             self.assertTrue(review.is_featured)
 
 
+    def test_query_count_independent_of_room_count(self):
+        image_content = b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02\x4c\x01\x00\x3b'
+        for i in range(5):
+            room = Room.objects.create(
+                title=f"اتاق جدید {i}",
+                price=700000,
+                size=25,
+                capacity=2,
+                description="اتاق جدید",
+            )
+            room.services.add(self.service1, self.service2)
+            RoomImage.objects.create(
+                room=room,
+                image=SimpleUploadedFile(f'new{i}.jpg', image_content, content_type='image/jpeg'),
+                alt_text="تصویر",
+                is_primary=True
+            )
+
+        # اتاق‌ها، عکس‌های اصلی، سرویس‌ها و نظرات ویژه همراه با کاربر
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['rooms_list']), 5)
+        self.assertTrue(all(room['image_url'] for room in response.context['rooms_list']))
+
+
+    def test_cached_context_served_without_queries(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['rooms_list']), 5)
+        self.assertEqual(len(response.context['featured_review']), 5)
+
+    def test_review_change_invalidates_cache(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['rooms_list'][1]['rating'], 4.5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(room=self.room1, user=self.user2, rating=1, comment="بد بود")
+
+        response = self.client.get(self.url)
+        self.assertAlmostEqual(response.context['rooms_list'][1]['rating'], 10 / 3)
+
+    def test_booking_change_invalidates_cache(self):
+        response = self.client.get(self.url)
+        self.assertIn("سوئیت رویال", [room['title'] for room in response.context['rooms_list']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(
+                user=self.user1,
+                room=self.room2,
+                check_in=date.today(),
+                check_out=date.today() + timedelta(days=2),
+                people_count=2,
+                status='confirmed',
+            )
+
+        response = self.client.get(self.url)
+        self.assertNotIn("سوئیت رویال", [room['title'] for room in response.context['rooms_list']])
+
+    def test_room_image_change_invalidates_cache(self):
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.room_image1.delete()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['rooms_list'][1]['image_url'], '')
+
+
 class RoomsListViewTest(TestCase):
     def setUp(self):
+        holds.reset()
+        cache.clear()
         self.client = Client()
         self.url = reverse('hotels:rooms_list')
 
@@ -403,6 +496,217 @@ class RoomsListViewTest(TestCase):
         self.assertIn(self.room3, all_available_rooms)
 
 
+    def test_held_rooms_excluded(self):
+        check_in = date.today() + timedelta(days=5)
+        check_out = check_in + timedelta(days=2)
+        holds.place_hold(self.room1.id, check_in, check_out, self.user.pk)
+
+        response = self.client.get(self.url, {
+            'check_in': jdatetime.date.fromgregorian(date=check_in + timedelta(days=1)).strftime('%Y/%m/%d'),
+            'check_out': jdatetime.date.fromgregorian(date=check_out + timedelta(days=3)).strftime('%Y/%m/%d'),
+            'people': '1',
+        })
+        self.assertEqual(len(response.context['room_list']), 0)
+
+        response = self.client.get(self.url, {
+            'check_in': jdatetime.date.fromgregorian(date=check_out).strftime('%Y/%m/%d'),
+            'check_out': jdatetime.date.fromgregorian(date=check_out + timedelta(days=3)).strftime('%Y/%m/%d'),
+            'people': '1',
+        })
+        self.assertEqual(len(response.context['room_list']), 1)
+
+    def test_ajax_query_count_independent_of_page_size(self):
+        # شمارش، اتاق‌های صفحه، عکس‌های اصلی و سرویس‌ها
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        data = json.loads(response.content)
+        self.assertEqual(len(data['room_list']), 5)
+        self.assertEqual(data['total_rooms'], 9)
+
+        for i in range(10):
+            Room.objects.create(
+                title=f"اتاق اضافه {i}",
+                price=700000,
+                size=25,
+                capacity=2,
+                description="اتاق اضافه"
+            ).services.add(self.service1)
+
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        data = json.loads(response.content)
+        self.assertEqual(data['total_rooms'], 19)
+        self.assertIn("WiFi", data['room_list'][0]['services'])
+
+    def walk_cursor_pages(self, params):
+        titles, cursor = [], ''
+        while True:
+            with self.assertNumQueries(3):
+                response = self.client.get(self.url, {**params, 'cursor': cursor},
+                                           HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            data = json.loads(response.content)
+            self.assertNotIn('total_rooms', data)
+            titles.extend(room['title'] for room in data['room_list'])
+            if not data['has_next']:
+                self.assertIsNone(data['next_cursor'])
+                return titles
+            cursor = data['next_cursor']
+
+    def test_cursor_pagination_follows_sort(self):
+        # اتاق‌های هم‌قیمت و هم‌زمان برای بررسی معیار دوم (شناسه)
+        Room.objects.update(created_at=timezone.now())
+        expected = {
+            'default': list(Room.objects.order_by('-created_at', '-id').values_list('title', flat=True)),
+            'lower-price': list(Room.objects.order_by('price', 'id').values_list('title', flat=True)),
+            'higher-price': list(Room.objects.order_by('-price', '-id').values_list('title', flat=True)),
+        }
+        for sort, titles in expected.items():
+            self.assertEqual(self.walk_cursor_pages({'sort': sort}), titles)
+
+    def test_cursor_pagination_with_filters(self):
+        titles = self.walk_cursor_pages({'people': '2', 'sort': 'lower-price'})
+        self.assertEqual(len(titles), 7)
+
+    def test_cursor_total_is_optional_and_cached(self):
+        params = {'cursor': '', 'with_total': '1'}
+        response = self.client.get(self.url, params, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(json.loads(response.content)['total_rooms'], 9)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, params, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(json.loads(response.content)['total_rooms'], 9)
+
+    def test_page_script_uses_cursor_pagination(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, 'id="pagination"')
+        self.assertContains(response, "cursor: cursor")
+        self.assertContains(response, "data.next_cursor")
+        self.assertNotContains(response, "data-page=")
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-a-cursor', signing.dumps(['price', 500000, self.room1.id], salt='other')):
+            response = self.client.get(self.url, {'cursor': cursor}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            self.assertEqual(response.status_code, 400)
+
+        # cursor ساخته شده برای مرتب‌سازی دیگر پذیرفته نمی‌شود
+        response = self.client.get(self.url, {'cursor': '', 'sort': 'lower-price'},
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        cursor = json.loads(response.content)['next_cursor']
+        response = self.client.get(self.url, {'cursor': cursor, 'sort': 'higher-price'},
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 400)
+
+
+class RoomCalendarViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        holds.reset()
+        self.user = User.objects.create_user(
+            phone='09123456789',
+            password='testpass123',
+        )
+        self.room = Room.objects.create(
+            title="اتاق تقویم",
+            price=500000,
+            size=25,
+            capacity=2,
+            description="اتاق برای تست تقویم"
+        )
+        self.url = reverse('hotels:room_calendar', kwargs={'slug': self.room.slug})
+
+        # ماه بعد تا همه روزها در آینده باشند
+        today = jdatetime.date.today()
+        self.year, self.month = (today.year + 1, 1) if today.month == 12 else (today.year, today.month + 1)
+        self.params = {'year': self.year, 'month': self.month}
+
+    def book(self, first_day, last_day, status='confirmed'):
+        return Booking.objects.create(
+            user=self.user,
+            room=self.room,
+            check_in=jdatetime.date(self.year, self.month, first_day).togregorian(),
+            check_out=jdatetime.date(self.year, self.month, last_day).togregorian(),
+            people_count=2,
+            status=status,
+        )
+
+    def test_month_availability(self):
+        self.book(3, 6)
+
+        response = self.client.get(self.url, self.params)
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        days = {day['day']: day for day in data['days']}
+        self.assertIn(len(days), (29, 30, 31))
+        self.assertFalse(any(days[d]['available'] for d in (3, 4, 5)))
+        self.assertTrue(days[2]['available'])
+        self.assertTrue(days[6]['available'])
+        self.assertEqual(days[1]['price'], 500000)
+        self.assertEqual(days[1]['date'], jdatetime.date(self.year, self.month, 1).strftime('%Y/%m/%d'))
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+    def test_cached_month_skips_occupancy_query(self):
+        self.client.get(self.url, self.params)
+        with self.assertNumQueries(1):
+            self.client.get(self.url, self.params)
+
+    def test_status_change_invalidates_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = self.book(10, 12)
+        data = json.loads(self.client.get(self.url, self.params).content)
+        self.assertFalse(data['days'][9]['available'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.status = 'canceled'
+            booking.save()
+        data = json.loads(self.client.get(self.url, self.params).content)
+        self.assertTrue(data['days'][9]['available'])
+
+    def test_pending_booking_nights_unavailable(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(5, 7, status='pending')
+            self.book(20, 22, status='expired')
+
+        data = json.loads(self.client.get(self.url, self.params).content)
+
+        self.assertFalse(data['days'][4]['available'])
+        self.assertFalse(data['days'][5]['available'])
+        self.assertTrue(data['days'][6]['available'])
+        self.assertTrue(data['days'][19]['available'])
+
+    def test_pending_booking_invalidates_cache(self):
+        data = json.loads(self.client.get(self.url, self.params).content)
+        self.assertTrue(data['days'][4]['available'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = self.book(5, 7, status='pending')
+        data = json.loads(self.client.get(self.url, self.params).content)
+        self.assertFalse(data['days'][4]['available'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.delete()
+        data = json.loads(self.client.get(self.url, self.params).content)
+        self.assertTrue(data['days'][4]['available'])
+
+    def test_held_nights_unavailable(self):
+        check_in = jdatetime.date(self.year, self.month, 15).togregorian()
+        holds.place_hold(self.room.id, check_in, check_in + timedelta(days=1), self.user.pk)
+
+        data = json.loads(self.client.get(self.url, self.params).content)
+
+        self.assertFalse(data['days'][14]['available'])
+        self.assertTrue(data['days'][15]['available'])
+
+    def test_invalid_month(self):
+        response = self.client.get(self.url, {'year': self.year, 'month': 13})
+        self.assertEqual(response.status_code, 400)
+
+    def test_room_not_found(self):
+        response = self.client.get(reverse('hotels:room_calendar', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class RoomDetailViewTest(TestCase):
     def setUp(self):
         # self.client = Client()
@@ -540,6 +844,35 @@ class RoomDetailViewTest(TestCase):
             self.assertIsInstance(form, GuestForm)
             self.assertEqual(form.prefix, f'guest_{i + 1}')
 
+    def test_detail_query_count_is_bounded(self):
+        image_content = b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21\xf9\x04\x01\x0a\x00\x01\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02\x4c\x01\x00\x3b'
+        for i in range(3):
+            RoomImage.objects.create(
+                room=self.room,
+                image=SimpleUploadedFile(f'detail{i}.jpg', image_content, content_type='image/jpeg'),
+                alt_text="تصویر",
+                is_primary=i == 1
+            )
+        for i in range(15):
+            author = User.objects.create_user(phone=f'0912000{i:04d}', password='testpass123')
+            Review.objects.create(room=self.room, user=author, rating=3, comment="نظر")
+
+        # اتاق، عکس‌ها، سرویس‌ها و صفحه اول نظرات همراه با نویسنده‌ها
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+
+        context = response.context
+        self.assertEqual(len(context['reviews']), 10)
+        self.assertEqual(context['review_count'], 17)
+        self.assertEqual(len(context['images']), 3)
+        self.assertTrue(context['primary_image'].is_primary)
+        self.assertEqual({service.name for service in context['services']}, {"WiFi", "پارکینگ"})
+        self.assertContains(response, 'بر اساس 17 نظر')
+
+    def test_head_request(self):
+        response = self.client.head(self.url)
+        self.assertEqual(response.status_code, 200)
+
     def test_post_review_not_authenticated(self):
         response = self.client.post(self.url, {
             'rating': 5,
@@ -597,6 +930,63 @@ class RoomDetailViewTest(TestCase):
         self.assertFalse(data['success'])
 
 
+class RoomReviewsViewTest(TestCase):
+    def setUp(self):
+        self.room = Room.objects.create(title="اتاق پرطرفدار", price=500000, size=20, capacity=2, description="test")
+        self.url = reverse('hotels:room_reviews', kwargs={'slug': self.room.slug})
+        self.reviews = []
+        for i in range(25):
+            author = User.objects.create_user(phone=f'0912100{i:04d}', password='testpass123')
+            self.reviews.append(Review.objects.create(room=self.room, user=author, rating=4, comment=f"نظر {i}"))
+        # چند نظر هم‌زمان تا ترتیب بر اساس شناسه هم بررسی شود
+        same_time = timezone.now() - timedelta(days=1)
+        Review.objects.filter(pk__in=[review.pk for review in self.reviews[8:14]]).update(created_at=same_time)
+        self.expected = list(Review.objects.filter(room=self.room).order_by('-created_at', '-id')
+                             .values_list('pk', flat=True))
+
+    def review_ids(self, html):
+        return [int(pk) for pk in re.findall(r'data-review-id="(\d+)"', html)]
+
+    def test_detail_inlines_first_page_only(self):
+        response = self.client.get(reverse('hotels:room_detail', kwargs={'slug': self.room.slug}))
+        self.assertEqual([review.pk for review in response.context['reviews']], self.expected[:10])
+        self.assertIsNotNone(response.context['next_cursor'])
+        self.assertContains(response, 'id="loadMoreReviews"')
+
+    def test_walks_all_pages_newest_first(self):
+        cursor = self.client.get(reverse('hotels:room_detail', kwargs={'slug': self.room.slug})).context['next_cursor']
+        seen = self.expected[:10]
+        while cursor:
+            with self.assertNumQueries(2):
+                data = self.client.get(self.url, {'cursor': cursor}).json()
+            self.assertTrue(data['success'])
+            seen += self.review_ids(data['reviews_html'])
+            self.assertEqual(data['has_next'], data['next_cursor'] is not None)
+            cursor = data['next_cursor']
+        self.assertEqual(seen, self.expected)
+
+    def test_first_page_without_cursor(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(self.review_ids(data['reviews_html']), self.expected[:10])
+        self.assertTrue(data['has_next'])
+
+    def test_new_review_does_not_shift_pages(self):
+        cursor = self.client.get(self.url).json()['next_cursor']
+        Review.objects.create(room=self.room, user=User.objects.create_user(phone='09122000000', password='testpass123'), rating=5,
+                              comment="جدید")
+        data = self.client.get(self.url, {'cursor': cursor}).json()
+        self.assertEqual(self.review_ids(data['reviews_html']), self.expected[10:20])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+    def test_unknown_room(self):
+        response = self.client.get(reverse('hotels:room_reviews', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
+
+
 class ReviewDeleteViewTest(TestCase):
     def setUp(self):
         self.client = Client()
@@ -998,3 +1388,28 @@ class ReviewEditViewTest(TestCase):
         final_review = Review.objects.get(pk=self.review1.pk)
         self.assertEqual(final_review.rating, 4)
         self.assertEqual(final_review.comment, 'ویرایش دوم')
+
+
+class ImageQueueMetricsViewTest(TestCase):
+    def setUp(self):
+        images.redis_client.delete(images.QUEUE_KEY, images.PROCESSING_KEY, images.CLAIMS_KEY, images.METRICS_KEY)
+        self.url = reverse('hotels:image_queue_metrics')
+        self.staff = User.objects.create_superuser(phone='09120000001', password='testpass123')
+        self.user = User.objects.create_user(phone='09120000002', password='testpass123')
+
+    def test_staff_only(self):
+        self.client.login(phone='09120000002', password='testpass123')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_metrics(self):
+        images.redis_client.lpush(images.QUEUE_KEY, 1, 2)
+        images.record_metrics(elapsed_ms=30)
+        images.record_metrics(elapsed_ms=10)
+
+        self.client.login(phone='09120000001', password='testpass123')
+        data = json.loads(self.client.get(self.url).content)
+
+        self.assertEqual(data['queue_depth'], 2)
+        self.assertEqual(data['processed'], 2)
+        self.assertEqual(data['avg_processing_ms'], 20)
+        self.assertEqual(data['failed'], 0)
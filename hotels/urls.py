@@ -10,8 +10,13 @@ urlpatterns = [
     # rooms
     path("rooms-list/", views.RoomsListView.as_view(), name="rooms_list"),
     re_path(r"room-detail/(?P<slug>[-\w]+)/", views.RoomDetailView.as_view(), name="room_detail"),
+    re_path(r"room-calendar/(?P<slug>[-\w]+)/", views.RoomCalendarView.as_view(), name="room_calendar"),
+
+    # images
+    path("image-queue/metrics/", views.ImageQueueMetricsView.as_view(), name="image_queue_metrics"),
 
     # reviews
+    re_path(r"room-reviews/(?P<slug>[-\w]+)/", views.RoomReviewsView.as_view(), name="room_reviews"),
     path('reviews/<int:pk>/delete/', views.ReviewDeleteView.as_view(), name='delete_review'),
     path('review/<int:pk>/edit/', views.ReviewEditView.as_view(), name='edit_review'),
 
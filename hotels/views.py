@@ -9,9 +9,22 @@ from hotels.models import Room, Review, Service
 from hotels.forms import ReviewForm, SearchForm, GuestForm
 from django.template.loader import render_to_string
 from django.urls import reverse
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.conf import settings
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from urllib.parse import urlencode
+import hashlib
+from hotels.cache import homepage_cache_key, HOMEPAGE_CACHE_TIMEOUT
 import jdatetime
-from reservations.models import Booking
+from core import jalali
+from reservations.models import Booking, RoomNight
+from reservations import holds
+from hotels import images
+import redis
 
 
 class HomePage(TemplateView):
@@ -19,25 +32,33 @@ class HomePage(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        rooms = Room.objects.filter(existing=True)[:5]
-        rooms_list = [
-            {
+        context.update(cache.get_or_set(homepage_cache_key(), self.get_cached_context, HOMEPAGE_CACHE_TIMEOUT))
+        context["search_form"] = SearchForm(self.request.GET or None)
+        return context
+
+    def get_cached_context(self):
+        """بخش‌های مستقل از درخواست صفحه اصلی؛ با تغییر اتاق‌ها، عکس‌ها، نظرات و رزروها نسخه کش عوض می‌شود."""
+        rooms = Room.objects.filter(existing=True).with_card_data()[:5]
+        rooms_list = []
+        for room in rooms:
+            primary_image = room.primary_image
+            rooms_list.append({
                 'title': room.title,
                 'price': room.price,
                 'capacity': room.capacity,
                 'description': room.description,
-                'image_url': room.primary_image.image.url if room.primary_image else '',
-                'alt_text': room.primary_image.alt_text if room.primary_image else '',
+                'image_url': primary_image.card_url if primary_image else '',
+                'image_srcset': primary_image.jpeg_srcset if primary_image else '',
+                'image_webp_srcset': primary_image.webp_srcset if primary_image else '',
+                'alt_text': primary_image.alt_text if primary_image else '',
                 'services': [service.name for service in room.services.all()],
                 'url': room.get_absolute_url(),
                 'rating': room.get_rating(),
-            }
-            for room in rooms
-        ]
-        context["rooms_list"] = rooms_list
-        context["search_form"] = SearchForm(self.request.GET or None)
-        context["featured_review"] = Review.objects.filter(is_featured=True)[:5]
-        return context
+            })
+        return {
+            "rooms_list": rooms_list,
+            "featured_review": list(Review.objects.filter(is_featured=True).select_related('user')[:5]),
+        }
 
 
 class RoomsListView(ListView):
@@ -45,6 +66,12 @@ class RoomsListView(ListView):
     template_name = "hotels/rooms.html"
     paginate_by = 5
     context_object_name = 'room_list'
+    sort_fields = {
+        'lower-price': 'price',
+        'higher-price': '-price',
+    }
+    cursor_salt = 'hotels.rooms-cursor'
+    total_cache_timeout = 60
 
     def get_context_data(self, *, object_list=None, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -76,25 +103,27 @@ class RoomsListView(ListView):
                 check_in = check_in_j.togregorian()
                 check_out = check_out_j.togregorian()
 
-                overlapping_rooms = Booking.objects.filter(
-                    status='confirmed',
-                    check_in__lt=check_out,
-                    check_out__gt=check_in
-                ).values_list('room_id', flat=True).distinct()
+                queryset = queryset.exclude(id__in=RoomNight.occupied_room_ids(check_in, check_out))
 
-                queryset = queryset.exclude(id__in=overlapping_rooms)
+                held_rooms = holds.held_room_ids(check_in, check_out)
+                if held_rooms:
+                    queryset = queryset.exclude(id__in=held_rooms)
             except ValueError:
                 pass
         return queryset
 
     def get(self, request, *args, **kwargs):
         rooms = self.get_queryset()
-        sort = request.GET.get('sort', 'default')
+        sort_field = self.sort_fields.get(request.GET.get('sort', 'default'), '-created_at')
+        is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
 
-        if sort == 'lower-price':
-            rooms = rooms.order_by('price')
-        elif sort == 'higher-price':
-            rooms = rooms.order_by('-price')
+        # شناسه به عنوان معیار دوم تا ترتیب اتاق‌های هم‌قیمت یا هم‌زمان ثابت بماند
+        rooms = rooms.order_by(sort_field, '-id' if sort_field.startswith('-') else 'id')
+
+        if is_ajax:
+            rooms = rooms.with_card_data()
+            if 'cursor' in request.GET:
+                return self.get_cursor_page(request, rooms, sort_field)
 
         page = request.GET.get('page', 1)
         paginator = Paginator(rooms, self.paginate_by)
@@ -105,25 +134,9 @@ class RoomsListView(ListView):
         except EmptyPage:
             room_list = paginator.page(paginator.num_pages)
 
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            room_data = []
-            for room in room_list:
-                room_data.append({
-                    'title': room.title,
-                    'price': room.price,
-                    'capacity': room.capacity,
-                    'size': room.size,
-                    'description': truncatewords(room.description, 25),
-                    'existing': 'exist' if room.existing else 'reserved',
-                    'existing_text': 'موجود' if room.existing else 'رزرو شده',
-                    'image_url': room.primary_image.image.url if room.primary_image else '',
-                    'alt_text': room.primary_image.alt_text if room.primary_image else '',
-                    'services': [service.name for service in room.services.all()],
-                    'url': room.get_absolute_url(),
-                })
-
+        if is_ajax:
             return JsonResponse({
-                'room_list': room_data,
+                'room_list': [self.room_card(room) for room in room_list],
                 'has_previous': room_list.has_previous(),
                 'has_next': room_list.has_next(),
                 'previous_page_number': room_list.previous_page_number() if room_list.has_previous() else None,
@@ -140,16 +153,196 @@ class RoomsListView(ListView):
                 'search_form': SearchForm(request.GET or None),
             })
 
+    def get_cursor_page(self, request, rooms, sort_field):
+        """
+        صفحه‌بندی بر اساس cursor: به جای OFFSET و COUNT، از آخرین اتاق صفحه قبل
+        (مقدار فیلد مرتب‌سازی و شناسه) ادامه می‌دهد. تعداد کل فقط با with_total و از کش برمی‌گردد.
+        """
+        field = sort_field.lstrip('-')
+        cursor = request.GET.get('cursor')
+        page_rooms = rooms
+        if cursor:
+            try:
+                cursor_sort, value, pk = signing.loads(cursor, salt=self.cursor_salt)
+                if cursor_sort != sort_field:
+                    raise ValueError
+                value = self.model._meta.get_field(field).to_python(value)
+                pk = int(pk)
+            except (signing.BadSignature, ValidationError, ValueError, TypeError):
+                return JsonResponse({'success': False, 'error': 'صفحه درخواستی نامعتبر است.'}, status=400)
+            lookup = 'lt' if sort_field.startswith('-') else 'gt'
+            page_rooms = rooms.filter(
+                Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'id__{lookup}': pk})
+            )
+
+        # یک اتاق اضافه برای تشخیص وجود صفحه بعد بدون COUNT
+        room_list = list(page_rooms[:self.paginate_by + 1])
+        has_next = len(room_list) > self.paginate_by
+        room_list = room_list[:self.paginate_by]
+
+        next_cursor = None
+        if has_next:
+            last = room_list[-1]
+            value = getattr(last, field)
+            next_cursor = signing.dumps(
+                [sort_field, value.isoformat() if hasattr(value, 'isoformat') else value, last.pk],
+                salt=self.cursor_salt,
+            )
+
+        data = {
+            'room_list': [self.room_card(room) for room in room_list],
+            'has_next': has_next,
+            'next_cursor': next_cursor,
+        }
+        if request.GET.get('with_total'):
+            data['total_rooms'] = self.get_cached_total(request, rooms)
+        return JsonResponse(data)
+
+    def get_cached_total(self, request, rooms):
+        params = sorted(
+            (key, value) for key, value in request.GET.items()
+            if key not in ('cursor', 'page', 'sort', 'with_total')
+        )
+        key = 'rooms-count:' + hashlib.md5(urlencode(params).encode()).hexdigest()
+        return cache.get_or_set(key, lambda: rooms.order_by().count(), self.total_cache_timeout)
+
+    @staticmethod
+    def room_card(room):
+        primary_image = room.primary_image
+        return {
+            'title': room.title,
+            'price': room.price,
+            'capacity': room.capacity,
+            'size': room.size,
+            'description': truncatewords(room.description, 25),
+            'existing': 'exist' if room.existing else 'reserved',
+            'existing_text': 'موجود' if room.existing else 'رزرو شده',
+            'image_url': primary_image.card_url if primary_image else '',
+            'image_srcset': primary_image.jpeg_srcset if primary_image else '',
+            'image_webp_srcset': primary_image.webp_srcset if primary_image else '',
+            'alt_text': primary_image.alt_text if primary_image else '',
+            'services': [service.name for service in room.services.all()],
+            'url': room.get_absolute_url(),
+        }
+
+
+class RoomCalendarView(View):
+    """وضعیت آزاد بودن و قیمت همه شب‌های یک ماه شمسی برای یک اتاق."""
+    cache_timeout = 60 * 60
+
+    def get(self, request, slug):
+        room = get_object_or_404(Room.objects.only('id', 'slug', 'price'), slug=slug)
+        today = jdatetime.date.today()
+        try:
+            year = int(request.GET.get('year', today.year))
+            month = int(request.GET.get('month', today.month))
+            first_day = jdatetime.date(year, month, 1)
+        except (ValueError, TypeError):
+            return JsonResponse({'success': False, 'error': 'ماه یا سال نامعتبر است.'}, status=400)
+
+        next_month = jdatetime.date(year + 1, 1, 1) if month == 12 else jdatetime.date(year, month + 1, 1)
+        days_in_month = (next_month - first_day).days
+
+        cache_key = f"room-calendar:{room.id}:{RoomNight.calendar_version(room.id)}:{year}-{month}"
+        occupied_days = cache.get(cache_key)
+        if occupied_days is None:
+            start, end = first_day.togregorian(), next_month.togregorian()
+            # رزروهای در انتظار پرداخت هم تا تأیید یا انقضا شب‌هایشان را اشغال می‌کنند
+            occupied = RoomNight.occupied_nights(room.id, start, end) | Booking.objects.pending_nights(room.id, start, end)
+            occupied_days = sorted(night.day for night in jalali.to_jalali_many(occupied))
+            cache.set(cache_key, occupied_days, self.cache_timeout)
+
+        # نگه‌داشت‌های موقت عمر کوتاهی دارند و به همین دلیل جدا از کش خوانده می‌شوند
+        held = holds.held_nights(room.id, first_day.togregorian(), next_month.togregorian())
+        occupied_days = set(occupied_days) | {night.day for night in jalali.to_jalali_many(held)}
+        days = []
+        for day in range(1, days_in_month + 1):
+            night = jdatetime.date(year, month, day)
+            days.append({
+                'date': night.strftime('%Y/%m/%d'),
+                'day': day,
+                'available': day not in occupied_days and night >= today,
+                'price': room.price,
+            })
+
+        response = JsonResponse({
+            'success': True,
+            'room': room.slug,
+            'year': year,
+            'month': month,
+            'days': days,
+        })
+        patch_cache_control(response, public=True, max_age=60)
+        return response
+
+
+class RoomReviewsView(View):
+    """
+    نظرات یک اتاق از جدید به قدیم با صفحه‌بندی cursor: هر صفحه از زمان ایجاد و شناسه آخرین نظر
+    صفحه قبل ادامه می‌دهد، پس هزینه هر صفحه به تعداد کل نظرات بستگی ندارد.
+    """
+    cursor_salt = 'hotels.reviews-cursor'
+
+    @classmethod
+    def get_page(cls, room, cursor=None):
+        """نظرات یک صفحه همراه با نویسنده‌ها در یک کوئری و cursor صفحه بعد (یا None)."""
+        reviews = room.reviews.select_related('user').order_by('-created_at', '-id')
+        if cursor:
+            created_at, pk = signing.loads(cursor, salt=cls.cursor_salt)
+            created_at = Review._meta.get_field('created_at').to_python(created_at)
+            pk = int(pk)
+            reviews = reviews.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+        # یک نظر اضافه برای تشخیص وجود صفحه بعد بدون COUNT
+        page_size = settings.ROOM_REVIEWS_PAGE_SIZE
+        review_list = list(reviews[:page_size + 1])
+        next_cursor = None
+        if len(review_list) > page_size:
+            review_list = review_list[:page_size]
+            last = review_list[-1]
+            next_cursor = signing.dumps([last.created_at.isoformat(), last.pk], salt=cls.cursor_salt)
+        return review_list, next_cursor
+
+    def get(self, request, slug):
+        room = get_object_or_404(Room.objects.only('id'), slug=slug)
+        try:
+            reviews, next_cursor = self.get_page(room, request.GET.get('cursor'))
+        except (signing.BadSignature, ValidationError, ValueError, TypeError):
+            return JsonResponse({'success': False, 'error': 'صفحه درخواستی نامعتبر است.'}, status=400)
+
+        return JsonResponse({
+            'success': True,
+            'reviews_html': ''.join(
+                render_to_string('hotels/review_item.html', {'review': review}, request=request)
+                for review in reviews
+            ),
+            'has_next': next_cursor is not None,
+            'next_cursor': next_cursor,
+        })
+
 
 @method_decorator(login_required, name='post')
 class RoomDetailView(DetailView):
     model = Room
     template_name = "hotels/room_detail.html"
 
+    def get_queryset(self):
+        # ثبت نظر (POST) به عکس‌ها و سرویس‌ها نیازی ندارد؛ GET و HEAD صفحه کامل را می‌سازند
+        if self.request.method == 'POST':
+            return super().get_queryset()
+        return Room.objects.with_detail_data()
+
     def get_context_data(self, **kwargs):
+        # اتاق با عکس‌ها و سرویس‌ها در سه کوئری و نظرات با نویسنده‌ها در یک کوئری خوانده می‌شوند؛
+        # تعداد نظرات و آمار امتیاز از فیلدهای ذخیره‌شده اتاق می‌آیند و قالب فقط همین مقادیر را می‌خواند
         context = super().get_context_data(**kwargs)
         context['form'] = ReviewForm()
-        context['reviews'] = self.object.reviews.all()
+        context['images'] = self.object.all_images
+        context['primary_image'] = self.object.primary_image
+        context['services'] = self.object.service_list
+        # فقط صفحه اول نظرات؛ بقیه با «نظرات بیشتر» از RoomReviewsView خوانده می‌شوند
+        context['reviews'], context['next_cursor'] = RoomReviewsView.get_page(self.object)
+        context['review_count'] = self.object.rating_count
         context['rating'] = self.object.get_rating()
         breakdown = self.object.get_rating_breakdown()
         context['rating_breakdown'] = [
@@ -222,7 +415,7 @@ class RoomDetailView(DetailView):
             return JsonResponse({
                 'success': True,
                 'review_html': review_html,
-                'review_count': room.reviews.count(),
+                'review_count': room.rating_count,
                 'rating': room.get_rating(),
                 'rating_breakdown': breakdown_list
             })
@@ -252,7 +445,7 @@ class ReviewDeleteView(LoginRequiredMixin, DeleteView):
         self.object.delete()
 
         # محاسبه اطلاعات به‌روز شده
-        review_count = room.reviews.count()
+        review_count = room.rating_count
         rating = room.get_rating()
         breakdown = room.get_rating_breakdown()
         breakdown_list = [
@@ -317,7 +510,7 @@ class ReviewEditView(LoginRequiredMixin, View):
                 return JsonResponse({
                     'success': True,
                     'review_html': review_html,
-                    'review_count': review.room.reviews.count(),
+                    'review_count': review.room.rating_count,
                     'rating': review.room.get_rating(),
                     'rating_breakdown': breakdown_list
                 })
@@ -331,3 +524,16 @@ class ReviewEditView(LoginRequiredMixin, View):
                 'success': False,
                 'error': 'نظر مورد نظر یافت نشد.'
             }, status=404)
+
+
+class ImageQueueMetricsView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """عمق صف و توان پردازش worker ساخت نسخه‌های عکس، فقط برای کارکنان."""
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        try:
+            return JsonResponse(images.metrics())
+        except redis.RedisError:
+            return JsonResponse({'error': 'صف پردازش عکس در دسترس نیست.'}, status=503)
@@ -1,9 +1,14 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.template.response import TemplateResponse
+from django.urls import path
 from reservations.models import Booking, Guest, Transaction
 import jdatetime
+from core import jalali
 from django.db import models
 from jalali_date.widgets import AdminJalaliDateWidget
 from reservations.widgets import CustomJalaliDateWidget
+from reservations.exports import BookingExport, GuestExport, TransactionExport, streaming_csv_response
+from reservations import rollups
 from django.contrib.humanize.templatetags.humanize import intcomma
 
 
@@ -49,6 +54,7 @@ class BookingAdmin(admin.ModelAdmin):
     ordering = ('-created_at',)
     readonly_fields = ('total_price', 'created_at', 'updated_at')
     autocomplete_fields = ('user', 'room')
+    actions = ('confirm_bookings', 'cancel_bookings', 'expire_bookings', 'export_csv')
 
     # تنظیم ویجت تقویم شمسی برای فیلدهای DateField
     formfield_overrides = {
@@ -57,27 +63,15 @@ class BookingAdmin(admin.ModelAdmin):
 
     @admin.display(description='تاریخ ورود', ordering='check_in')
     def get_check_in_jalali(self, obj):
-        if obj.check_in:
-            jalali_date = jdatetime.datetime.fromgregorian(datetime=obj.check_in)
-            return jalali_date.strftime('%Y/%m/%d')
-        return ''
+        return jalali.format_date(obj.check_in)
 
     @admin.display(description='تاریخ خروج', ordering='check_out')
     def get_check_out_jalali(self, obj):
-        if obj.check_out:
-            jalali_date = jdatetime.datetime.fromgregorian(datetime=obj.check_out)
-            return jalali_date.strftime('%Y/%m/%d')
-        return ''
+        return jalali.format_date(obj.check_out)
 
     @admin.display(description='تاریخ ایجاد (شمسی)', ordering='created_at')
     def created_at_jalali(self, obj):
-        if obj.created_at:
-            try:
-                jalali_date = jdatetime.datetime.fromgregorian(datetime=obj.created_at)
-                return jalali_date.strftime('%Y/%m/%d %H:%M:%S')
-            except (ValueError, TypeError):
-                return ''
-        return ''
+        return jalali.format_datetime(obj.created_at)
 
     @admin.display(description='قیمت کل (تومان)', ordering='total_price')
     def get_total_price_formatted(self, obj):
@@ -86,6 +80,75 @@ class BookingAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user', 'room')
 
+    def get_urls(self):
+        urls = [
+            path('occupancy/', self.admin_site.admin_view(self.occupancy_view), name='reservations_booking_occupancy'),
+        ]
+        return urls + super().get_urls()
+
+    def occupancy_view(self, request):
+        """داشبورد اشغال و درآمد؛ فقط از جدول خلاصه RoomDailyStat می‌خواند."""
+        today = jdatetime.date.today()
+        end = today
+        start = today - jdatetime.timedelta(days=29)
+        try:
+            if request.GET.get('start'):
+                start = jdatetime.datetime.strptime(request.GET['start'], '%Y/%m/%d').date()
+            if request.GET.get('end'):
+                end = jdatetime.datetime.strptime(request.GET['end'], '%Y/%m/%d').date()
+        except ValueError:
+            self.message_user(request, "فرمت تاریخ باید به صورت ۱۴۰۳/۰۱/۳۱ باشد.", messages.ERROR)
+        if end < start:
+            start, end = end, start
+
+        stats = rollups.dashboard(start.togregorian(), end.togregorian())
+        max_revenue = max((day['revenue'] for day in stats['series']), default=0) or 1
+        for day in stats['series']:
+            day['label'] = jalali.format_date(day['day'])
+            day['height'] = round(day['revenue'] * 100 / max_revenue)
+            day['occupancy_percent'] = round(day['occupancy'] * 100)
+        for room in stats['per_room']:
+            room['occupancy_percent'] = round(room['occupancy'] * 100)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'داشبورد اشغال و درآمد',
+            'start': start.strftime('%Y/%m/%d'),
+            'end': end.strftime('%Y/%m/%d'),
+            'stats': stats,
+            'occupancy_percent': round(stats['occupancy'] * 100, 1),
+        }
+        return TemplateResponse(request, 'admin/reservations/occupancy_dashboard.html', context)
+
+    def change_status(self, request, queryset, status):
+        updated, conflicts = queryset.set_status(status)
+        label = dict(Booking.STATUS_CHOICES)[status]
+        self.message_user(request, f"وضعیت {updated} رزرو به «{label}» تغییر کرد.", messages.SUCCESS)
+        if conflicts:
+            ids = "، ".join(str(pk) for pk in conflicts)
+            self.message_user(
+                request,
+                f"{len(conflicts)} رزرو به دلیل تداخل تاریخ با رزرو دیگر تأیید نشد (شناسه: {ids}).",
+                messages.WARNING,
+            )
+
+    @admin.action(description='تأیید رزروهای انتخاب شده')
+    def confirm_bookings(self, request, queryset):
+        self.change_status(request, queryset, 'confirmed')
+
+    @admin.action(description='لغو رزروهای انتخاب شده')
+    def cancel_bookings(self, request, queryset):
+        self.change_status(request, queryset, 'canceled')
+
+    @admin.action(description='منقضی کردن رزروهای انتخاب شده')
+    def expire_bookings(self, request, queryset):
+        self.change_status(request, queryset, 'expired')
+
+    @admin.action(description='خروجی CSV رزروهای انتخاب شده')
+    def export_csv(self, request, queryset):
+        return streaming_csv_response(BookingExport(), queryset, 'bookings.csv')
+
 
 @admin.register(Guest)
 class GuestAdmin(admin.ModelAdmin):
@@ -105,6 +168,11 @@ class GuestAdmin(admin.ModelAdmin):
     list_per_page = 25
     ordering = ('-id',)
     autocomplete_fields = ('booking',)
+    actions = ('export_csv',)
+
+    @admin.action(description='خروجی CSV مهمان‌های انتخاب شده')
+    def export_csv(self, request, queryset):
+        return streaming_csv_response(GuestExport(), queryset, 'guests.csv')
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('booking')
@@ -135,6 +203,11 @@ class TransactionAdmin(admin.ModelAdmin):
     ordering = ('-created_at',)
     autocomplete_fields = ('user', 'booking')
     readonly_fields = ('transaction_id', 'amount', 'created_at')
+    actions = ('export_csv',)
+
+    @admin.action(description='خروجی CSV تراکنش‌های انتخاب شده')
+    def export_csv(self, request, queryset):
+        return streaming_csv_response(TransactionExport(), queryset, 'transactions.csv')
 
     @admin.display(description='مبلغ (تومان)', ordering='amount')
     def get_amount_formatted(self, obj):
@@ -142,13 +215,7 @@ class TransactionAdmin(admin.ModelAdmin):
 
     @admin.display(description='تاریخ ایجاد', ordering='created_at')
     def created_at_jalali(self, obj):
-        if obj.created_at:
-            try:
-                jalali_date = jdatetime.datetime.fromgregorian(datetime=obj.created_at)
-                return jalali_date.strftime('%Y/%m/%d %H:%M:%S')
-            except (ValueError, TypeError):
-                return ''
-        return ''
+        return jalali.format_datetime(obj.created_at)
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user', 'booking')
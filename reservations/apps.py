@@ -5,3 +5,6 @@ class ReservationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reservations'
     verbose_name = 'مدریت رزرو ها'
+
+    def ready(self):
+        import reservations.signals  # noqa: F401
@@ -0,0 +1,75 @@
+"""
+ثبت نهایی رزرو پس از تایید پرداخت.
+
+شناسه Authority درگاه کلید یکتایی عملیات است: تکرار بازگشت از درگاه (رفرش مرورگر یا
+درخواست‌های همزمان) به جای رزرو دوباره، همان رزرو قبلی را برمی‌گرداند. قبل از ثبت، سطر
+اتاق قفل می‌شود تا تاییدهای همزمان یک اتاق پشت سر هم اجرا شوند و همپوشانی شب‌ها دوباره
+داخل همان تراکنش بررسی شود؛ رزرو، مهمان‌ها و تراکنش با هم ثبت یا با هم لغو می‌شوند.
+"""
+from django.db import transaction
+
+from hotels.models import Room
+from reservations.models import Booking, Guest, Transaction
+
+
+class BookingUnavailable(Exception):
+    """شب‌های درخواستی در فاصله پرداخت توسط رزرو دیگری گرفته شده‌اند."""
+
+
+def overlapping_bookings(room_id, check_in, check_out):
+    return Booking.objects.filter(
+        room_id=room_id,
+        status__in=Booking.ACTIVE_STATUSES,
+        check_in__lt=check_out,
+        check_out__gt=check_in,
+    )
+
+
+def record_failed_payment(*, authority, user, amount):
+    """
+    تراکنش ناموفق این Authority را یک بار ثبت می‌کند؛ بازگشت تکراری یا همزمان از درگاه
+    همان سطر قبلی را برمی‌گرداند (و تراکنش موفق قبلی را تغییر نمی‌دهد).
+    """
+    transaction_obj, _ = Transaction.objects.get_or_create(
+        transaction_id=authority,
+        defaults={'user': user, 'amount': amount, 'status': 'failed'},
+    )
+    return transaction_obj
+
+
+def confirm_booking(*, authority, user, room, check_in, check_out, people_count, nights, total_price, guests):
+    """
+    رزرو پرداخت‌شده را ثبت می‌کند و (رزرو، ساخته‌شده) برمی‌گرداند. اگر این Authority
+    قبلا پردازش شده باشد، رزرو ثبت‌شده قبلی (یا None برای پرداخت ناموفق) برمی‌گردد.
+    در صورت اشغال شدن شب‌ها BookingUnavailable ایجاد می‌شود.
+    """
+    with transaction.atomic():
+        # روی SQLite قفل سطری وجود ندارد و transaction_mode=IMMEDIATE همین نقش را دارد
+        Room.objects.select_for_update().only('pk').get(pk=room.pk)
+
+        existing = Transaction.objects.select_related('booking').filter(transaction_id=authority).first()
+        if existing is not None:
+            return existing.booking, False
+
+        if overlapping_bookings(room.pk, check_in, check_out).exists():
+            raise BookingUnavailable
+
+        booking = Booking.objects.create(
+            user=user,
+            room=room,
+            check_in=check_in,
+            check_out=check_out,
+            people_count=people_count,
+            status='confirmed',
+            total_price=total_price,
+            nights_stay=nights,
+        )
+        Guest.objects.bulk_create([Guest(booking=booking, **guest) for guest in guests])
+        Transaction.objects.create(
+            user=user,
+            amount=total_price,
+            transaction_id=authority,
+            status='success',
+            booking=booking,
+        )
+    return booking, True
@@ -0,0 +1,113 @@
+"""
+خروجی CSV رزروها، مهمان‌ها و تراکنش‌ها.
+
+ردیف‌ها با iterator(chunk_size) و select_related خوانده می‌شوند (روی PostgreSQL با cursor
+سمت سرور) و خط به خط در پاسخ یا فایل نوشته می‌شوند، پس حافظه مصرفی به تعداد ردیف‌ها
+بستگی ندارد. تبدیل تاریخ‌ها به شمسی برای هر روز فقط یک بار انجام می‌شود.
+"""
+import csv
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from core.jalali import format_date, format_datetime
+from reservations.models import Booking, Guest, Transaction
+
+
+def format_local_datetime(value):
+    return format_datetime(timezone.localtime(value)) if value else ''
+
+
+def user_name(user):
+    return f"{user.first_name} {user.last_name}".strip() or user.phone
+
+
+class Echo:
+    """شیء شبیه فایل که csv.writer متن هر خط را مستقیم از آن پس می‌گیرد."""
+
+    def write(self, value):
+        return value
+
+
+class Export:
+    """تعریف ستون‌های خروجی یک مدل: (عنوان ستون، تابع گرفتن مقدار از ردیف)."""
+    model = None
+    related = ()
+    columns = ()
+
+    def get_queryset(self, queryset=None):
+        queryset = self.model.objects.all() if queryset is None else queryset
+        return queryset.select_related(*self.related).order_by('pk')
+
+    def rows(self, queryset=None):
+        yield [title for title, _ in self.columns]
+        chunk_size = settings.EXPORT_CHUNK_SIZE
+        for obj in self.get_queryset(queryset).iterator(chunk_size=chunk_size):
+            yield [value(obj) for _, value in self.columns]
+
+
+class BookingExport(Export):
+    model = Booking
+    related = ('user', 'room')
+    columns = (
+        ('شناسه', lambda b: b.pk),
+        ('کاربر', lambda b: user_name(b.user)),
+        ('تلفن', lambda b: b.user.phone),
+        ('اتاق', lambda b: b.room.title),
+        ('تاریخ ورود', lambda b: format_date(b.check_in)),
+        ('تاریخ خروج', lambda b: format_date(b.check_out)),
+        ('تعداد شب', lambda b: b.nights_stay),
+        ('تعداد نفرات', lambda b: b.people_count),
+        ('وضعیت', lambda b: b.get_status_display()),
+        ('قیمت کل (تومان)', lambda b: b.total_price),
+        ('تاریخ ایجاد', lambda b: format_local_datetime(b.created_at)),
+    )
+
+
+class GuestExport(Export):
+    model = Guest
+    related = ('booking__room',)
+    columns = (
+        ('شناسه رزرو', lambda g: g.booking_id),
+        ('اتاق', lambda g: g.booking.room.title),
+        ('تاریخ ورود', lambda g: format_date(g.booking.check_in)),
+        ('نام کامل', lambda g: g.full_name),
+        ('کد ملی', lambda g: g.national_id),
+        ('شماره تلفن', lambda g: g.phone_number),
+        ('جنسیت', lambda g: g.get_gender_display()),
+    )
+
+
+class TransactionExport(Export):
+    model = Transaction
+    related = ('user',)
+    columns = (
+        ('شناسه تراکنش', lambda t: t.transaction_id),
+        ('کاربر', lambda t: user_name(t.user)),
+        ('تلفن', lambda t: t.user.phone),
+        ('شناسه رزرو', lambda t: t.booking_id or ''),
+        ('مبلغ (تومان)', lambda t: t.amount),
+        ('وضعیت', lambda t: t.get_status_display()),
+        ('تاریخ ایجاد', lambda t: format_local_datetime(t.created_at)),
+    )
+
+
+EXPORTS = {
+    'bookings': BookingExport,
+    'guests': GuestExport,
+    'transactions': TransactionExport,
+}
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    # BOM برای نمایش درست متن فارسی در Excel
+    yield '\ufeff'
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def streaming_csv_response(export, queryset, filename):
+    response = StreamingHttpResponse(csv_lines(export.rows(queryset)), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,154 @@
+"""
+کلاینت درگاه پرداخت زرین‌پال.
+
+همه درخواست‌ها از یک requests.Session با connection pool و keep-alive ارسال می‌شوند تا
+برای هر پرداخت اتصال TLS جدیدی ساخته نشود. هر درخواست timeout اتصال و خواندن دارد،
+فقط درخواست verify (که تکرار آن بی‌خطر است) در صورت خطای شبکه یا 5xx دوباره ارسال
+می‌شود و در صورت خطاهای پشت سر هم، مدار قطع شده و درخواست‌ها بدون انتظار رد می‌شوند.
+"""
+import json
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+
+from core.timing import TimedHTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+SERVER_ERRORS = range(500, 600)
+
+
+class GatewayUnavailable(requests.RequestException):
+    """مدار قطع است و درخواست بدون تماس با درگاه رد شد."""
+
+
+class CircuitBreaker:
+    """
+    پس از failure_threshold خطای پشت سر هم مدار را باز می‌کند. پس از reset_timeout ثانیه
+    فقط یک درخواست آزمایشی اجازه عبور دارد؛ موفقیت آن مدار را می‌بندد.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # تا مشخص شدن نتیجه درخواست آزمایشی، بقیه درخواست‌ها همچنان رد می‌شوند
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning("Zarinpal circuit opened after %s failures", self.failures)
+                self.opened_at = time.monotonic()
+
+    def reset(self):
+        self.record_success()
+
+
+class ZarinpalClient:
+    request_path = "/pg/v4/payment/request.json"
+    verify_path = "/pg/v4/payment/verify.json"
+    startpay_path = "/pg/StartPay/"
+
+    def __init__(self, base_url, merchant_id, timeout=(3.05, 10), verify_retries=2, retry_backoff=0.5,
+                 pool_size=10, breaker=None):
+        self.base_url = base_url.rstrip('/')
+        self.merchant_id = merchant_id
+        self.timeout = timeout
+        self.verify_retries = verify_retries
+        self.retry_backoff = retry_backoff
+        self.breaker = breaker or CircuitBreaker(failure_threshold=5, reset_timeout=30)
+
+        self.session = requests.Session()
+        adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'content-type': 'application/json', 'Accept': 'application/json'})
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            base_url=settings.ZARINPAL_BASE_URL,
+            merchant_id=settings.MERCHANT,
+            timeout=settings.ZARINPAL_TIMEOUT,
+            verify_retries=settings.ZARINPAL_VERIFY_RETRIES,
+            pool_size=settings.ZARINPAL_POOL_SIZE,
+            breaker=CircuitBreaker(
+                failure_threshold=settings.ZARINPAL_CIRCUIT_FAILURES,
+                reset_timeout=settings.ZARINPAL_CIRCUIT_RESET,
+            ),
+        )
+
+    def startpay_url(self, authority):
+        return f"{self.base_url}{self.startpay_path}{authority}"
+
+    def request_payment(self, amount, description, callback_url, metadata=None):
+        """ساخت تراکنش جدید؛ amount به ریال است. چون تکرار آن تراکنش تکراری می‌سازد، دوباره ارسال نمی‌شود."""
+        return self.post(self.request_path, {
+            "merchant_id": self.merchant_id,
+            "amount": amount,
+            "description": description,
+            "callback_url": callback_url,
+            "metadata": metadata or {},
+        })
+
+    def verify(self, amount, authority):
+        """تأیید تراکنش؛ درگاه برای تراکنشی که قبلا تأیید شده کد 101 برمی‌گرداند، پس تکرار آن بی‌خطر است."""
+        return self.post(self.verify_path, {
+            "merchant_id": self.merchant_id,
+            "amount": amount,
+            "authority": authority,
+        }, attempts=1 + self.verify_retries)
+
+    def post(self, path, data, attempts=1):
+        if not self.breaker.allow():
+            raise GatewayUnavailable("Zarinpal circuit is open")
+
+        url = f"{self.base_url}{path}"
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            try:
+                response = self.session.post(url, data=json.dumps(data), timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    self.breaker.record_failure()
+                    raise
+            except requests.RequestException:
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.status_code not in SERVER_ERRORS:
+                    self.breaker.record_success()
+                    return response
+                if last_attempt:
+                    self.breaker.record_failure()
+                    return response
+            logger.info("Retrying Zarinpal request to %s (attempt %s)", path, attempt + 2)
+            time.sleep(self.retry_backoff * 2 ** attempt)
+
+
+client = ZarinpalClient.from_settings()
@@ -0,0 +1,140 @@
+"""
+نگه‌داشتن موقت شب‌های اتاق در Redis در فاصله ارسال به درگاه تا بازگشت از آن.
+
+برای هر شب از هر اتاق یک کلید قفل با TTL ساخته می‌شود و مالک آن شناسه کاربر است.
+برای اینکه جستجوی اتاق‌ها بدون اسکن کلیدها انجام شود، برای هر شب یک sorted set
+از شناسه اتاق‌های نگه‌داشته‌شده با امتیاز زمان انقضا نیز نگه‌داری می‌شود.
+"""
+import logging
+import time
+from datetime import timedelta
+
+import redis
+from django.conf import settings
+
+from core.redis_pool import redis_client
+
+logger = logging.getLogger(__name__)
+
+# KEYS: n کلید قفل و سپس n کلید ایندکس شب‌ها
+# ARGV: مالک، TTL به میلی‌ثانیه، زمان فعلی به میلی‌ثانیه، شناسه اتاق
+ACQUIRE_SCRIPT = redis_client.register_script("""
+local n = #KEYS / 2
+for i = 1, n do
+    local owner = redis.call('GET', KEYS[i])
+    if owner and owner ~= ARGV[1] then
+        return 0
+    end
+end
+local ttl = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+for i = 1, n do
+    redis.call('SET', KEYS[i], ARGV[1], 'PX', ttl)
+    redis.call('ZREMRANGEBYSCORE', KEYS[n + i], '-inf', now)
+    redis.call('ZADD', KEYS[n + i], now + ttl, ARGV[4])
+    if redis.call('PTTL', KEYS[n + i]) < ttl then
+        redis.call('PEXPIRE', KEYS[n + i], ttl)
+    end
+end
+return 1
+""")
+
+# KEYS: مانند ACQUIRE_SCRIPT
+# ARGV: مالک، شناسه اتاق
+RELEASE_SCRIPT = redis_client.register_script("""
+local n = #KEYS / 2
+local released = 0
+for i = 1, n do
+    if redis.call('GET', KEYS[i]) == ARGV[1] then
+        redis.call('DEL', KEYS[i])
+        redis.call('ZREM', KEYS[n + i], ARGV[2])
+        released = released + 1
+    end
+end
+return released
+""")
+
+
+def hold_key(room_id, night):
+    return f"hold:room:{room_id}:{night.isoformat()}"
+
+
+def night_index_key(night):
+    return f"hold:night:{night.isoformat()}"
+
+
+def stay_nights(check_in, check_out):
+    return [check_in + timedelta(days=offset) for offset in range((check_out - check_in).days)]
+
+
+def _script_keys(room_id, nights):
+    return [hold_key(room_id, night) for night in nights] + [night_index_key(night) for night in nights]
+
+
+def place_hold(room_id, check_in, check_out, owner):
+    """
+    شب‌های [check_in, check_out) اتاق را به صورت اتمیک برای owner نگه می‌دارد.
+    اگر حتی یک شب در اختیار مالک دیگری باشد هیچ شبی نگه داشته نمی‌شود و False برمی‌گردد.
+    مالک فعلی می‌تواند نگه‌داشت خود را تمدید کند.
+    """
+    nights = stay_nights(check_in, check_out)
+    if not nights:
+        return False
+    timeout_ms = settings.RESERVATION_HOLD_TIMEOUT * 1000
+    try:
+        return bool(ACQUIRE_SCRIPT(
+            keys=_script_keys(room_id, nights),
+            args=[str(owner), timeout_ms, int(time.time() * 1000), room_id],
+        ))
+    except redis.RedisError:
+        # پایگاه داده همچنان مرجع نهایی همپوشانی رزروهاست؛ در نبود Redis رزرو متوقف نمی‌شود
+        logger.warning("Could not place hold for room %s", room_id, exc_info=True)
+        return True
+
+
+def release_hold(room_id, check_in, check_out, owner):
+    nights = stay_nights(check_in, check_out)
+    if not nights:
+        return 0
+    try:
+        return RELEASE_SCRIPT(keys=_script_keys(room_id, nights), args=[str(owner), room_id])
+    except redis.RedisError:
+        logger.warning("Could not release hold for room %s", room_id, exc_info=True)
+        return 0
+
+
+def held_room_ids(check_in, check_out):
+    """شناسه اتاق‌هایی که حداقل یک شب از بازه در حال حاضر نگه داشته شده است."""
+    nights = stay_nights(check_in, check_out)
+    if not nights:
+        return set()
+    now = int(time.time() * 1000)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for night in nights:
+            pipe.zrangebyscore(night_index_key(night), now, '+inf')
+        results = pipe.execute()
+    except redis.RedisError:
+        logger.warning("Could not read holds", exc_info=True)
+        return set()
+    return {int(room_id) for members in results for room_id in members}
+
+
+def held_nights(room_id, start, end):
+    """شب‌های نگه‌داشته‌شده یک اتاق در بازه [start, end) با یک MGET."""
+    nights = stay_nights(start, end)
+    if not nights:
+        return set()
+    try:
+        owners = redis_client.mget([hold_key(room_id, night) for night in nights])
+    except redis.RedisError:
+        logger.warning("Could not read holds for room %s", room_id, exc_info=True)
+        return set()
+    return {night for night, owner in zip(nights, owners) if owner is not None}
+
+
+def reset():
+    """حذف همه نگه‌داشت‌ها و ایندکس شب‌ها؛ برای تست‌ها."""
+    keys = list(redis_client.scan_iter(match="hold:*", count=500))
+    if keys:
+        redis_client.delete(*keys)
@@ -0,0 +1,110 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from accounts.models import User
+from hotels.models import Room, RoomImage, Review
+from reservations.models import Booking
+
+
+class Command(BaseCommand):
+    help = (
+        "پلن اجرای کوئری‌های پرتکرار رزرو، نظرات و عکس اصلی را همراه با زمان اجرا چاپ می‌کند. "
+        "با --bookings داده آزمایشی ساخته می‌شود؛ برای مقایسه قبل و بعد از ایندکس‌ها یک بار پس از "
+        "برگرداندن مایگریشن‌ها (migrate reservations 0012 و migrate hotels 0019) و یک بار پس از اجرای "
+        "دوباره آن‌ها اجرا کنید."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=0, help="تعداد رزروهای آزمایشی برای ساخت")
+        parser.add_argument('--rooms', type=int, default=200)
+        parser.add_argument('--reviews-per-room', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['bookings']:
+            self.seed(options)
+
+        room = Room.objects.order_by('pk').first()
+        if room is None:
+            self.stderr.write("هیچ اتاقی وجود ندارد؛ با --bookings داده آزمایشی بسازید.")
+            return
+
+        check_in = date.today() + timedelta(days=30)
+        check_out = check_in + timedelta(days=3)
+        # هر کوئری با همان شکلی اجرا می‌شود که در کد استفاده شده است (exists یا واکشی ردیف‌ها)
+        queries = {
+            'booking overlap (clean / send-request)': (Booking.objects.filter(
+                room=room,
+                status__in=Booking.ACTIVE_STATUSES,
+                check_in__lt=check_out,
+                check_out__gt=check_in,
+            ).order_by(), 'exists'),
+            'confirmed after check-in (cancel path)': (Booking.objects.filter(
+                room=room,
+                status='confirmed',
+                check_out__gt=check_in,
+            ).order_by(), 'exists'),
+            'room reviews newest first': (room.reviews.all()[:10], 'list'),
+            'primary images for a page of rooms': (RoomImage.objects.filter(
+                is_primary=True,
+                room_id__in=list(Room.objects.values_list('pk', flat=True)[:5]),
+            ), 'list'),
+        }
+
+        for name, (queryset, mode) in queries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write((queryset[:1] if mode == 'exists' else queryset).explain())
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                queryset.all().exists() if mode == 'exists' else list(queryset.all())
+            elapsed = (time.perf_counter() - started) / options['repeat'] * 1000
+            self.stdout.write(self.style.SUCCESS(f"{elapsed:.3f} ms ({connection.vendor})\n"))
+
+    def seed(self, options):
+        batch_size = options['batch_size']
+        user, _ = User.objects.get_or_create(phone='09000000000')
+
+        rooms = Room.objects.bulk_create([
+            Room(
+                title=f"bench room {i}",
+                slug=f"bench-room-{i}-{time.time_ns()}",
+                price=random.randint(1, 50) * 100000,
+                size=30,
+                capacity=random.randint(1, 4),
+                description="bench",
+            )
+            for i in range(options['rooms'])
+        ])
+        RoomImage.objects.bulk_create([
+            RoomImage(room=room, image='rooms/images/bench.jpg', alt_text='bench', is_primary=(i == 0))
+            for room in rooms for i in range(4)
+        ], batch_size=batch_size)
+        Review.objects.bulk_create([
+            Review(room=room, user=user, rating=random.randint(1, 5), comment='bench')
+            for room in rooms for _ in range(options['reviews_per_room'])
+        ], batch_size=batch_size)
+
+        start = date.today() - timedelta(days=3 * 365)
+        remaining = options['bookings']
+        statuses = [status for status, _ in Booking.STATUS_CHOICES]
+        while remaining > 0:
+            batch = []
+            for _ in range(min(batch_size, remaining)):
+                check_in = start + timedelta(days=random.randint(0, 4 * 365))
+                nights = random.randint(1, 7)
+                batch.append(Booking(
+                    user=user,
+                    room=random.choice(rooms),
+                    check_in=check_in,
+                    check_out=check_in + timedelta(days=nights),
+                    people_count=1,
+                    status=random.choice(statuses),
+                    nights_stay=nights,
+                ))
+            Booking.objects.bulk_create(batch)
+            remaining -= len(batch)
+            self.stdout.write(f"{options['bookings'] - remaining} رزرو ساخته شد")
@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from reservations.models import Booking, RoomNight
+
+
+class Command(BaseCommand):
+    help = (
+        "رزروهای در انتظار رها شده را منقضی می‌کند و وضعیت موجود بودن همه اتاق‌ها را از روی "
+        "اشغال امروز دوباره محاسبه می‌کند. همه تغییرات با چند UPDATE گروهی انجام می‌شود و "
+        "اجرای مکرر آن (مثلا هر دقیقه با cron) بی‌خطر است."
+    )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        today = timezone.localdate(now)
+        cutoff = now - timedelta(seconds=settings.PENDING_BOOKING_TIMEOUT)
+
+        with transaction.atomic():
+            # رزرو در انتظار RoomNight ندارد و وضعیت اتاق را تغییر نداده است، پس نیازی به save تک‌تک نیست
+            rows = list(Booking.objects.filter(status='pending').filter(
+                Q(created_at__lt=cutoff) | Q(check_out__lte=today)
+            ).order_by().values_list('pk', 'room_id'))
+            expired = Booking.objects.filter(pk__in=[pk for pk, _ in rows], status='pending').update(
+                status='expired', updated_at=now,
+            )
+            # رزروهای در انتظار در تقویم اتاق‌ها اشغال نمایش داده می‌شوند
+            room_ids = {room_id for _, room_id in rows}
+            transaction.on_commit(lambda: [RoomNight.invalidate_calendar(room_id) for room_id in room_ids])
+
+            occupied, released = RoomNight.refresh_room_existing()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{expired} رزرو منقضی شد، {released} اتاق آزاد و {occupied} اتاق اشغال علامت خورد."
+        ))
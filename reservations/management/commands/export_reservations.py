@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from reservations.exports import EXPORTS, csv_lines
+
+
+class Command(BaseCommand):
+    help = "خروجی CSV رزروها، مهمان‌ها یا تراکنش‌ها را به صورت جریانی در فایل یا خروجی استاندارد می‌نویسد."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--output', '-o', help="مسیر فایل خروجی؛ در صورت خالی بودن خروجی استاندارد")
+
+    def handle(self, *args, **options):
+        export = EXPORTS[options['kind']]()
+        written = 0
+
+        def counted(rows):
+            nonlocal written
+            for row in rows:
+                written += 1
+                yield row
+
+        lines = csv_lines(counted(export.rows()))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
+
+        # سطر عنوان ستون‌ها جزو ردیف‌ها شمرده نمی‌شود
+        self.stderr.write(self.style.SUCCESS(f"{max(written - 1, 0)} ردیف نوشته شد."))
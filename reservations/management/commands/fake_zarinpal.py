@@ -0,0 +1,111 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand
+
+
+class FakeZarinpalHandler(BaseHTTPRequestHandler):
+    """پاسخ‌هایی با همان شکل API نسخه ۴ زرین‌پال برای request، StartPay و verify."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            data = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self.send_json({'data': [], 'errors': {'code': -9, 'message': 'invalid json'}}, status=400)
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if random.random() < self.server.failure_rate:
+            return self.send_json({'data': [], 'errors': {'code': -1, 'message': 'unavailable'}}, status=503)
+
+        if self.path == '/pg/v4/payment/request.json':
+            authority = 'A' + uuid.uuid4().hex[:35].upper()
+            with self.server.lock:
+                self.server.payments[authority] = {
+                    'amount': data.get('amount'),
+                    'callback_url': data.get('callback_url'),
+                    'verified': False,
+                }
+            return self.send_json({'data': {'code': 100, 'message': 'Success', 'authority': authority,
+                                            'fee_type': 'Merchant', 'fee': 0}, 'errors': []})
+
+        if self.path == '/pg/v4/payment/verify.json':
+            with self.server.lock:
+                payment = self.server.payments.get(data.get('authority'))
+                if payment is None or payment['amount'] != data.get('amount'):
+                    return self.send_json({'data': [], 'errors': {'code': -50, 'message': 'Session is not valid'}})
+                code = 101 if payment['verified'] else 100
+                payment['verified'] = True
+            return self.send_json({'data': {'code': code, 'message': 'Verified', 'ref_id': random.randint(10 ** 8, 10 ** 9),
+                                            'card_pan': '502229******5995', 'fee': 0}, 'errors': []})
+
+        self.send_json({'data': [], 'errors': {'code': -404, 'message': 'not found'}}, status=404)
+
+    def do_GET(self):
+        prefix = '/pg/StartPay/'
+        payment = self.server.payments.get(self.path[len(prefix):]) if self.path.startswith(prefix) else None
+        if payment is None:
+            return self.send_json({'errors': {'message': 'not found'}}, status=404)
+
+        # پرداخت بلافاصله موفق فرض شده و کاربر به آدرس بازگشت هدایت می‌شود
+        query = urlencode({'Authority': self.path[len(prefix):], 'Status': 'OK'})
+        self.send_response(302)
+        self.send_header('Location', f"{payment['callback_url']}?{query}")
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host='127.0.0.1', port=0, latency=0.0, failure_rate=0.0, verbose=False):
+    server = ThreadingHTTPServer((host, port), FakeZarinpalHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.failure_rate = failure_rate
+    server.verbose = verbose
+    server.payments = {}
+    server.lock = threading.Lock()
+    return server
+
+
+class Command(BaseCommand):
+    help = (
+        "یک سرور محلی جایگزین درگاه زرین‌پال اجرا می‌کند تا کل روند پرداخت بدون اینترنت قابل تست بار باشد. "
+        "سایت را با ZARINPAL_BASE_URL=http://127.0.0.1:<port> اجرا کنید."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.0, help="تاخیر هر پاسخ به ثانیه")
+        parser.add_argument('--failure-rate', type=float, default=0.0, help="نسبت پاسخ‌های 503 بین ۰ و ۱")
+        parser.add_argument('--verbose', action='store_true')
+
+    def handle(self, *args, **options):
+        server = make_server(options['host'], options['port'], options['latency'],
+                             options['failure_rate'], options['verbose'])
+        host, port = server.server_address[:2]
+        self.stdout.write(self.style.SUCCESS(f"درگاه جایگزین روی http://{host}:{port} اجرا شد."))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from reservations.models import Booking, RoomNight
+
+
+class Command(BaseCommand):
+    help = "جدول موجودی شب به شب اتاق‌ها (RoomNight) را از روی رزروهای تأیید شده از نو می‌سازد."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bookings = Booking.objects.filter(
+            status='confirmed',
+            check_in__isnull=False,
+            check_out__isnull=False,
+        ).only('id', 'room_id', 'check_in', 'check_out').order_by('pk')
+
+        created = 0
+        with transaction.atomic():
+            RoomNight.objects.all().delete()
+            nights = []
+            for booking in bookings.iterator(chunk_size=batch_size):
+                nights.extend(RoomNight.for_booking(booking, booking.check_in, booking.check_out))
+                if len(nights) >= batch_size:
+                    RoomNight.objects.bulk_create(nights, batch_size=batch_size)
+                    created += len(nights)
+                    nights = []
+            RoomNight.objects.bulk_create(nights, batch_size=batch_size)
+            created += len(nights)
+
+        self.stdout.write(self.style.SUCCESS(f"{created} شب رزرو شده بازسازی شد."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from reservations import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "جدول خلاصه روزانه اشغال و درآمد اتاق‌ها را از روی رزروهای تغییر یافته از اجرای قبل "
+        "به‌روز می‌کند. با --full کل جدول از نو ساخته می‌شود."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="ساخت دوباره کل جدول خلاصه")
+
+    def handle(self, *args, **options):
+        written = rollups.refresh(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f"{written} ردیف آمار روزانه نوشته شد."))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:35
+
+import django.db.models.deletion
+from datetime import timedelta
+from django.db import migrations, models
+
+
+def populate_room_nights(apps, schema_editor):
+    Booking = apps.get_model('reservations', 'Booking')
+    RoomNight = apps.get_model('reservations', 'RoomNight')
+    bookings = Booking.objects.filter(status='confirmed', check_in__isnull=False, check_out__isnull=False)
+    RoomNight.objects.bulk_create([
+        RoomNight(room_id=booking.room_id, booking_id=booking.pk, night=booking.check_in + timedelta(days=offset))
+        for booking in bookings.iterator()
+        for offset in range((booking.check_out - booking.check_in).days)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0018_review_is_featured'),
+        ('reservations', '0011_alter_booking_nights_stay'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField(verbose_name='شب')),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_nights', to='reservations.booking', verbose_name='رزرو')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_nights', to='hotels.room', verbose_name='اتاق')),
+            ],
+            options={
+                'verbose_name': 'شب رزرو شده',
+                'verbose_name_plural': 'شب های رزرو شده',
+                'indexes': [models.Index(fields=['night', 'room'], name='roomnight_night_room_idx'), models.Index(fields=['room', 'night'], name='roomnight_room_night_idx')],
+                'constraints': [models.UniqueConstraint(fields=('booking', 'night'), name='unique_booking_night')],
+            },
+        ),
+        migrations.RunPython(populate_room_nights, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0020_review_review_room_created_idx_and_more'),
+        ('reservations', '0012_roomnight'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['room', 'status', 'check_out'], name='booking_room_status_out_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hotels', '0022_roomimage_renditions_ready'),
+        ('reservations', '0014_booking_expired_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='روز')),
+                ('occupied_nights', models.PositiveIntegerField(default=0, verbose_name='شب\u200cهای اشغال شده')),
+                ('revenue', models.PositiveBigIntegerField(default=0, verbose_name='درآمد (تومان)')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='hotels.room', verbose_name='اتاق')),
+            ],
+            options={
+                'verbose_name': 'آمار روزانه اتاق',
+                'verbose_name_plural': 'آمار روزانه اتاق\u200cها',
+                'indexes': [models.Index(fields=['day'], name='roomdailystat_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('room', 'day'), name='unique_room_day_stat')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0015_roomdailystat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedBookingSpan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('room_id', models.PositiveBigIntegerField(verbose_name='شناسه اتاق')),
+                ('check_in', models.DateField(verbose_name='تاریخ ورود')),
+                ('check_out', models.DateField(verbose_name='تاریخ خروج')),
+                ('deleted_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='زمان حذف')),
+            ],
+            options={
+                'verbose_name': 'بازه رزرو حذف شده',
+                'verbose_name_plural': 'بازه\u200cهای رزرو حذف شده',
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='نام')),
+                ('watermark', models.DateTimeField(verbose_name='خواندن تغییرات از')),
+            ],
+            options={
+                'verbose_name': 'وضعیت جدول خلاصه',
+                'verbose_name_plural': 'وضعیت جدول\u200cهای خلاصه',
+            },
+        ),
+    ]
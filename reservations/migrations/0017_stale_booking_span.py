@@ -0,0 +1,23 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0016_rollup_state'),
+    ]
+
+    operations = [
+        migrations.RenameModel(old_name='DeletedBookingSpan', new_name='StaleBookingSpan'),
+        migrations.RenameField(model_name='stalebookingspan', old_name='deleted_at', new_name='recorded_at'),
+        migrations.AlterModelOptions(
+            name='stalebookingspan',
+            options={'verbose_name': 'بازه قبلی رزرو', 'verbose_name_plural': 'بازه\u200cهای قبلی رزروها'},
+        ),
+        migrations.AlterField(
+            model_name='stalebookingspan',
+            name='recorded_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='زمان ثبت'),
+        ),
+    ]
@@ -3,8 +3,74 @@ from accounts.models import User
 from hotels.models import Room
 from django.core.validators import MinValueValidator, RegexValidator
 import jdatetime
-from datetime import date
+import time
+from datetime import date, timedelta
 from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.core.cache import cache
+from django.utils import timezone
+
+
+class BookingQuerySet(models.QuerySet):
+    def overlapping(self):
+        """
+        رزروهایی که با رزرو فعال دیگری از همان اتاق همپوشانی دارند (همان قاعده Booking.clean).
+        بازه‌ها نیم‌باز هستند: روز خروج یک رزرو می‌تواند روز ورود رزرو بعدی باشد.
+        """
+        others = Booking.objects.filter(
+            room=OuterRef('room'),
+            status__in=Booking.ACTIVE_STATUSES,
+            check_in__lt=OuterRef('check_out'),
+            check_out__gt=OuterRef('check_in'),
+        ).exclude(pk=OuterRef('pk'))
+        return self.filter(Exists(others))
+
+    def pending_nights(self, room_id, start, end):
+        """شب‌های بازه [start, end) که رزروهای در انتظار پرداخت یک اتاق اشغال کرده‌اند."""
+        nights = set()
+        for check_in, check_out in self.filter(
+            room_id=room_id, status='pending', check_in__lt=end, check_out__gt=start,
+        ).order_by().values_list('check_in', 'check_out'):
+            first, last = max(check_in, start), min(check_out, end)
+            nights.update(first + timedelta(days=offset) for offset in range((last - first).days))
+        return nights
+
+    def set_status(self, status):
+        """
+        وضعیت رزروها را بدون save تک‌تک تغییر می‌دهد: یک UPDATE برای وضعیت، همگام‌سازی گروهی
+        RoomNight و سپس محاسبه دوباره موجود بودن اتاق‌های درگیر در یک مرحله.
+        رزروهایی که تأیید آن‌ها همپوشانی ایجاد می‌کند تغییر نمی‌کنند و شناسه آن‌ها برمی‌گردد.
+        خروجی: (تعداد تغییر یافته، لیست شناسه رزروهای دارای تداخل)
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            room_ids = sorted(set(self.order_by().values_list('room_id', flat=True)))
+            # قفل اتاق‌ها به ترتیب شناسه، مانند confirm_booking، تا ثبت همزمان رزرو برای این اتاق‌ها منتظر بماند
+            list(Room.objects.select_for_update().filter(pk__in=room_ids).order_by('pk').values_list('pk', flat=True))
+
+            changing = self.exclude(status=status)
+            conflicts = []
+            if status == 'confirmed':
+                conflicts = list(changing.overlapping().values_list('pk', flat=True))
+                changing = changing.exclude(pk__in=conflicts)
+            rows = list(changing.order_by().values_list('pk', 'room_id'))
+            if not rows:
+                return 0, conflicts
+
+            booking_ids = [pk for pk, _ in rows]
+            affected_rooms = {room_id for _, room_id in rows}
+            updated = Booking.objects.filter(pk__in=booking_ids).update(status=status, updated_at=now)
+            if status == 'confirmed':
+                nights = []
+                for booking in Booking.objects.filter(pk__in=booking_ids).only('pk', 'room_id', 'check_in', 'check_out'):
+                    nights.extend(RoomNight.for_booking(booking, booking.check_in, booking.check_out))
+                RoomNight.objects.bulk_create(nights, batch_size=1000)
+            else:
+                RoomNight.objects.filter(booking_id__in=booking_ids).delete()
+
+            RoomNight.refresh_room_existing(affected_rooms)
+            transaction.on_commit(lambda: [RoomNight.invalidate_calendar(room_id) for room_id in affected_rooms])
+        return updated, conflicts
 
 
 class Booking(models.Model):
@@ -12,7 +78,10 @@ class Booking(models.Model):
         ('pending', 'در انتظار تایید'),
         ('confirmed', 'تأیید شده'),
         ('canceled', 'لغو شده'),
+        ('expired', 'منقضی شده'),
     ]
+    # وضعیت‌هایی که اتاق را در بازه رزرو اشغال می‌کنند
+    ACTIVE_STATUSES = ('pending', 'confirmed')
 
     user = models.ForeignKey(
         User,
@@ -47,10 +116,18 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ ایجاد")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="تاریخ به‌روزرسانی")
 
+    objects = BookingQuerySet.as_manager()
+
     class Meta:
         verbose_name = "رزرو"
         verbose_name_plural = "رزروها"
         ordering = ['-created_at']
+        indexes = [
+            # بررسی همپوشانی رزروها: اتاق و وضعیت برابر، سپس بازه روی تاریخ خروج که رزروهای گذشته را کنار می‌گذارد
+            models.Index(fields=['room', 'status', 'check_out'], name='booking_room_status_out_idx'),
+            # یافتن رزروهای در انتظار قدیمی در اجرای دوره‌ای expire_bookings
+            models.Index(fields=['status', 'created_at'], name='booking_status_created_idx'),
+        ]
 
     def __str__(self):
         user_name = f"{self.user.first_name} {self.user.last_name}".strip() if (self.user.first_name and
@@ -75,39 +152,184 @@ class Booking(models.Model):
         if isinstance(self.check_in, date) and isinstance(self.check_out, date):
             conflicting_bookings = Booking.objects.filter(
                 room=self.room,
-                status__in=['pending', 'confirmed'],
-                check_in__lte=self.check_out,
-                check_out__gte=self.check_in
+                status__in=Booking.ACTIVE_STATUSES,
+                check_in__lt=self.check_out,
+                check_out__gt=self.check_in
             ).exclude(id=self.id)
             if conflicting_bookings.exists():
                 raise ValidationError("اتاق در تاریخ‌های انتخاب‌شده در دسترس نیست.")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # اتاق و بازه ذخیره‌شده، تا جابه‌جایی رزرو روزهای قبلی آن را هم در جدول خلاصه به‌روز کند
+        instance._loaded_span = tuple(instance.__dict__.get(field) for field in ('room_id', 'check_in', 'check_out'))
+        return instance
+
     def save(self, *args, **kwargs):
         if self.room and isinstance(self.check_in, date) and isinstance(self.check_out, date):
             nights = self.nights()
             self.total_price = self.room.price * nights
 
-        is_new = self._state.adding
+        span = (
+            self.room_id,
+            self._meta.get_field('check_in').to_python(self.check_in),
+            self._meta.get_field('check_out').to_python(self.check_out),
+        )
+        loaded_span = getattr(self, '_loaded_span', None)
+        moved = loaded_span is not None and None not in loaded_span and loaded_span != span
 
         with transaction.atomic():
             super().save(*args, **kwargs)
+            room_ids = {self.room_id}
+            if moved:
+                old_room_id, old_check_in, old_check_out = loaded_span
+                StaleBookingSpan.objects.create(room_id=old_room_id, check_in=old_check_in, check_out=old_check_out)
+                if old_room_id != self.room_id:
+                    room_ids.add(old_room_id)
+                    transaction.on_commit(lambda: RoomNight.invalidate_calendar(old_room_id))
+            self.sync_nights()
+            # موجود بودن اتاق فقط از روی اشغال امروز و با همان قاعده اجرای دوره‌ای محاسبه می‌شود
+            RoomNight.refresh_room_existing(room_ids)
+        self._loaded_span = span
+
+    def sync_nights(self):
+        """شب‌های اشغال‌شده این رزرو را در جدول RoomNight به‌روز می‌کند."""
+        RoomNight.objects.filter(booking=self).delete()
+        if self.status == 'confirmed':
+            check_in = self._meta.get_field('check_in').to_python(self.check_in)
+            check_out = self._meta.get_field('check_out').to_python(self.check_out)
+            RoomNight.objects.bulk_create(RoomNight.for_booking(self, check_in, check_out))
+        # رزروهای در انتظار هم در تقویم اشغال نمایش داده می‌شوند، پس هر تغییر وضعیت تقویم را بی‌اعتبار می‌کند
+        room_id = self.room_id
+        transaction.on_commit(lambda: RoomNight.invalidate_calendar(room_id))
+
+
+class RoomNight(models.Model):
+    """
+    موجودی شب به شب اتاق‌ها؛ به ازای هر شب از یک رزرو تأیید شده یک ردیف.
+    جستجوی اتاق‌های آزاد به جای بررسی همپوشانی روی کل رزروها، یک جستجوی بازه‌ای روی این جدول است.
+    """
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='room_nights', verbose_name="اتاق")
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='room_nights', verbose_name="رزرو")
+    night = models.DateField(verbose_name="شب")
+
+    class Meta:
+        verbose_name = "شب رزرو شده"
+        verbose_name_plural = "شب های رزرو شده"
+        constraints = [
+            models.UniqueConstraint(fields=['booking', 'night'], name='unique_booking_night'),
+        ]
+        indexes = [
+            models.Index(fields=['night', 'room'], name='roomnight_night_room_idx'),
+            models.Index(fields=['room', 'night'], name='roomnight_room_night_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.room} --> {self.night}"
+
+    @classmethod
+    def for_booking(cls, booking, check_in, check_out):
+        if not (isinstance(check_in, date) and isinstance(check_out, date)):
+            return []
+        return [
+            cls(room_id=booking.room_id, booking=booking, night=check_in + timedelta(days=offset))
+            for offset in range((check_out - check_in).days)
+        ]
+
+    @classmethod
+    def occupied_room_ids(cls, check_in, check_out):
+        """شناسه اتاق‌هایی که حداقل یک شب از بازه [check_in, check_out) را اشغال کرده‌اند."""
+        return cls.objects.filter(night__gte=check_in, night__lt=check_out).values('room_id')
+
+    @classmethod
+    def occupied_nights(cls, room_id, start, end):
+        """شب‌های اشغال‌شده یک اتاق در بازه [start, end) با یک کوئری روی ایندکس (room, night)."""
+        return set(cls.objects.filter(room_id=room_id, night__gte=start, night__lt=end).values_list('night', flat=True))
 
-            if self.status == 'confirmed':
-                room_to_update = Room.objects.select_for_update().get(pk=self.room.pk)
-                if room_to_update.existing:
-                    room_to_update.existing = False
-                    room_to_update.save(update_fields=['existing'])
-
-            elif self.status == 'canceled' and not is_new:
-                if not Booking.objects.filter(
-                        room=self.room,
-                        status='confirmed',
-                        check_out__gt=self.check_in
-                ).exclude(pk=self.pk).exists():
-                    room_to_update = Room.objects.select_for_update().get(pk=self.room.pk)
-                    if not room_to_update.existing:
-                        room_to_update.existing = True
-                        room_to_update.save(update_fields=['existing'])
+    @classmethod
+    def refresh_room_existing(cls, room_ids=None):
+        """
+        موجود بودن اتاق‌ها را از روی اشغال امروز با دو UPDATE گروهی دوباره محاسبه می‌کند؛ فقط
+        اتاق‌هایی که وضعیتشان با اشغال امروز همخوانی ندارد تغییر می‌کنند.
+        خروجی: (تعداد اتاق‌های اشغال‌شده، تعداد اتاق‌های آزادشده)
+        """
+        from hotels.cache import invalidate_homepage
+
+        occupied_today = cls.objects.filter(room=OuterRef('pk'), night=timezone.localdate())
+        rooms = Room.objects.all() if room_ids is None else Room.objects.filter(pk__in=room_ids)
+        occupied = rooms.filter(existing=True).filter(Exists(occupied_today)).update(existing=False)
+        released = rooms.filter(existing=False).exclude(Exists(occupied_today)).update(existing=True)
+        if occupied or released:
+            transaction.on_commit(invalidate_homepage)
+        return occupied, released
+
+    @staticmethod
+    def calendar_version_key(room_id):
+        return f"room-calendar-version:{room_id}"
+
+    @classmethod
+    def calendar_version(cls, room_id):
+        return cache.get_or_set(cls.calendar_version_key(room_id), time.time_ns, None)
+
+    @classmethod
+    def invalidate_calendar(cls, room_id):
+        # نسخه جدید همه ماه‌های کش‌شده تقویم این اتاق را بی‌اعتبار می‌کند
+        cache.set(cls.calendar_version_key(room_id), time.time_ns(), None)
+
+
+class RoomDailyStat(models.Model):
+    """
+    خلاصه روزانه اشغال و درآمد هر اتاق (فقط روزهایی که اتاق اشغال بوده است).
+    با manage.py rollup_occupancy از روی رزروهای تغییر یافته پر می‌شود و داشبورد مدیریت فقط از
+    این جدول می‌خواند.
+    """
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='daily_stats', verbose_name="اتاق")
+    day = models.DateField(verbose_name="روز")
+    occupied_nights = models.PositiveIntegerField(default=0, verbose_name="شب‌های اشغال شده")
+    revenue = models.PositiveBigIntegerField(default=0, verbose_name="درآمد (تومان)")
+
+    class Meta:
+        verbose_name = "آمار روزانه اتاق"
+        verbose_name_plural = "آمار روزانه اتاق‌ها"
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'day'], name='unique_room_day_stat'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='roomdailystat_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.room} --> {self.day}"
+
+
+class StaleBookingSpan(models.Model):
+    """
+    بازه قبلی شب‌های رزروهایی که حذف شده یا اتاق و تاریخشان تغییر کرده است، تا اجرای بعدی
+    rollup_occupancy روزهای آن بازه را هم دوباره محاسبه کند.
+    اتاق کلید خارجی نیست چون هنگام حذف آبشاری اتاق، این ردیف پس از جمع‌آوری وابسته‌های اتاق ساخته می‌شود.
+    """
+    room_id = models.PositiveBigIntegerField(verbose_name="شناسه اتاق")
+    check_in = models.DateField(verbose_name="تاریخ ورود")
+    check_out = models.DateField(verbose_name="تاریخ خروج")
+    recorded_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="زمان ثبت")
+
+    class Meta:
+        verbose_name = "بازه قبلی رزرو"
+        verbose_name_plural = "بازه‌های قبلی رزروها"
+
+
+class RollupState(models.Model):
+    """زمانی که به‌روزرسانی بعدی یک جدول خلاصه، تغییرات را از آن به بعد می‌خواند."""
+    name = models.CharField(max_length=50, unique=True, verbose_name="نام")
+    watermark = models.DateTimeField(verbose_name="خواندن تغییرات از")
+
+    class Meta:
+        verbose_name = "وضعیت جدول خلاصه"
+        verbose_name_plural = "وضعیت جدول‌های خلاصه"
+
+    def __str__(self):
+        return f"{self.name} --> {self.watermark}"
 
 
 class Guest(models.Model):
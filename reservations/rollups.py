@@ -0,0 +1,164 @@
+"""
+جدول خلاصه روزانه اشغال و درآمد اتاق‌ها (RoomDailyStat) و گزارش‌های داشبورد مدیریت.
+
+هر اجرای refresh فقط بازه شب‌های رزروهایی را که از اجرای قبل تغییر کرده‌اند (updated_at) و
+بازه قبلی رزروهای حذف یا جابه‌جا شده (StaleBookingSpan) را از روی RoomNight دوباره محاسبه
+می‌کند. نقطه شروع خواندن تغییرات همراه با خود جدول در RollupState ذخیره می‌شود و در نبود آن
+کل جدول از نو ساخته می‌شود؛ rollup_occupancy --full فقط برای ساخت دوباره کامل لازم است.
+"""
+from datetime import timedelta
+from functools import reduce
+from itertools import chain, groupby
+from operator import itemgetter, or_
+
+from django.db import transaction
+from django.db.models import F, Max, Min, Q, Sum
+from django.utils import timezone
+
+from hotels.models import Room
+from reservations.models import Booking, StaleBookingSpan, RollupState, RoomDailyStat, RoomNight
+
+WATERMARK_NAME = "occupancy-rollup"
+# updated_at پیش از commit تراکنش مقدار می‌گیرد؛ تغییری که پیش از شروع یک اجرا نوشته ولی پس از
+# خواندن آن commit شده، با شروع اجرای بعدی از این مقدار زودتر دوباره خوانده می‌شود
+SAFETY_MARGIN = timedelta(minutes=10)
+
+
+def changed_spans(since):
+    """بازه [شروع، پایان) شب‌های رزروهای تغییر یافته و بازه‌های قبلی ثبت شده از since، به تفکیک اتاق."""
+    spans = {}
+    rows = chain(
+        Booking.objects.filter(
+            updated_at__gte=since, check_in__isnull=False, check_out__isnull=False,
+        ).order_by().values('room_id').annotate(start=Min('check_in'), end=Max('check_out')),
+        StaleBookingSpan.objects.filter(
+            recorded_at__gte=since,
+        ).order_by().values('room_id').annotate(start=Min('check_in'), end=Max('check_out')),
+    )
+    for row in rows:
+        start, end = spans.get(row['room_id'], (row['start'], row['end']))
+        spans[row['room_id']] = (min(start, row['start']), max(end, row['end']))
+    return spans
+
+
+def write_cells(nights):
+    # درآمد هر شب سهم همان شب از قیمت کل رزرو است؛ تعداد شب‌ها از تاریخ‌ها به دست می‌آید چون nights_stay اختیاری است
+    rates = {
+        pk: total_price // (check_out - check_in).days
+        for pk, total_price, check_in, check_out in Booking.objects.filter(
+            pk__in=nights.values('booking_id'), total_price__isnull=False, check_out__gt=F('check_in'),
+        ).order_by().values_list('pk', 'total_price', 'check_in', 'check_out').iterator(chunk_size=2000)
+    }
+    rows = nights.order_by('room_id', 'night').values_list('room_id', 'night', 'booking_id')
+    batch, written = [], 0
+    for (room_id, night), group in groupby(rows.iterator(chunk_size=2000), key=itemgetter(0, 1)):
+        booking_ids = [booking_id for _, _, booking_id in group]
+        batch.append(RoomDailyStat(
+            room_id=room_id, day=night, occupied_nights=len(booking_ids),
+            revenue=sum(rates.get(booking_id, 0) for booking_id in booking_ids),
+        ))
+        if len(batch) >= 2000:
+            RoomDailyStat.objects.bulk_create(batch)
+            written += len(batch)
+            batch = []
+    RoomDailyStat.objects.bulk_create(batch)
+    return written + len(batch)
+
+
+def refresh(full=False):
+    """جدول خلاصه را به‌روز می‌کند و تعداد خانه‌های (اتاق، روز) نوشته شده را برمی‌گرداند."""
+    watermark = timezone.now() - SAFETY_MARGIN
+
+    with transaction.atomic():
+        # قفل ردیف وضعیت، اجراهای هم‌زمان را پشت سر هم اجرا می‌کند
+        state = RollupState.objects.select_for_update().filter(name=WATERMARK_NAME).first()
+        since = None if full or state is None else state.watermark
+
+        if since is None:
+            RoomDailyStat.objects.all().delete()
+            written = write_cells(RoomNight.objects.all())
+        else:
+            spans = changed_spans(since)
+            if not spans:
+                written = 0
+            else:
+                nights = reduce(or_, (
+                    Q(room_id=room_id, night__gte=start, night__lt=end) for room_id, (start, end) in spans.items()
+                ))
+                days = reduce(or_, (
+                    Q(room_id=room_id, day__gte=start, day__lt=end) for room_id, (start, end) in spans.items()
+                ))
+                RoomDailyStat.objects.filter(days).delete()
+                written = write_cells(RoomNight.objects.filter(nights))
+
+        if state is None:
+            RollupState.objects.create(name=WATERMARK_NAME, watermark=watermark)
+        else:
+            state.watermark = watermark
+            state.save(update_fields=['watermark'])
+        # بازه‌هایی که پیش از watermark ثبت شده‌اند در این اجرا یا اجراهای قبلی خوانده شده‌اند
+        StaleBookingSpan.objects.filter(recorded_at__lt=watermark).delete()
+    return written
+
+
+def ratio(numerator, denominator):
+    return round(numerator / denominator, 4) if denominator else 0
+
+
+def dashboard(start, end):
+    """
+    آمار بازه [start, end] (هر دو شامل) فقط از روی جدول خلاصه: نرخ اشغال، میانگین قیمت هر شب
+    اشغال‌شده (ADR)، درآمد به ازای هر شب قابل فروش (RevPAR)، سری روزانه و تفکیک اتاق‌ها.
+    """
+    days = (end - start).days + 1
+    rooms = list(Room.objects.order_by('title').values_list('pk', 'title'))
+    stats = RoomDailyStat.objects.filter(day__gte=start, day__lte=end).order_by()
+
+    by_day = {
+        row['day']: row
+        for row in stats.values('day').annotate(nights=Sum('occupied_nights'), revenue=Sum('revenue'))
+    }
+    by_room = {
+        row['room_id']: row
+        for row in stats.values('room_id').annotate(nights=Sum('occupied_nights'), revenue=Sum('revenue'))
+    }
+
+    available = len(rooms) * days
+    nights = sum(row['nights'] for row in by_room.values())
+    revenue = sum(row['revenue'] for row in by_room.values())
+
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = by_day.get(day, {'nights': 0, 'revenue': 0})
+        series.append({
+            'day': day,
+            'nights': row['nights'],
+            'revenue': row['revenue'],
+            'occupancy': ratio(row['nights'], len(rooms)),
+        })
+
+    per_room = []
+    for room_id, title in rooms:
+        row = by_room.get(room_id, {'nights': 0, 'revenue': 0})
+        per_room.append({
+            'room_id': room_id,
+            'title': title,
+            'nights': row['nights'],
+            'revenue': row['revenue'],
+            'occupancy': ratio(row['nights'], days),
+            'adr': ratio(row['revenue'], row['nights']),
+        })
+
+    return {
+        'days': days,
+        'rooms': len(rooms),
+        'available_nights': available,
+        'occupied_nights': nights,
+        'revenue': revenue,
+        'occupancy': ratio(nights, available),
+        'adr': ratio(revenue, nights),
+        'revpar': ratio(revenue, available),
+        'series': series,
+        'per_room': per_room,
+    }
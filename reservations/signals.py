@@ -0,0 +1,19 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from reservations.models import Booking, StaleBookingSpan, RoomNight
+
+
+@receiver(post_delete, sender=Booking)
+def record_deleted_booking_span(sender, instance, **kwargs):
+    # رزرو حذف شده دیگر updated_at ندارد؛ روزهای آن در اجرای بعدی rollup_occupancy پاک می‌شوند
+    if instance.check_in and instance.check_out:
+        StaleBookingSpan.objects.create(
+            room_id=instance.room_id, check_in=instance.check_in, check_out=instance.check_out,
+        )
+
+
+@receiver(post_delete, sender=Booking)
+def invalidate_room_calendar(sender, instance, **kwargs):
+    room_id = instance.room_id
+    transaction.on_commit(lambda: RoomNight.invalidate_calendar(room_id))
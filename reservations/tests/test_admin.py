@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.contrib.admin import helpers
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from hotels.models import Room
+from reservations.models import Booking, RoomNight
+
+
+class BookingAdminActionsTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(phone='09120000001', password='testpass123')
+        self.client.force_login(self.admin)
+        self.room = Room.objects.create(title='Test Room', price=100, size=20, capacity=2, description='Test')
+        self.url = reverse('admin:reservations_booking_changelist')
+        today = timezone.localdate()
+        self.bookings = [
+            Booking.objects.create(user=self.admin, room=self.room, check_in=today + timedelta(days=offset),
+                                   check_out=today + timedelta(days=offset + 2), people_count=2, status='pending')
+            for offset in (0, 5, 10)
+        ]
+
+    def run_action(self, action, bookings):
+        return self.client.post(self.url, {
+            'action': action,
+            helpers.ACTION_CHECKBOX_NAME: [booking.pk for booking in bookings],
+        }, follow=True)
+
+    def test_confirm_action(self):
+        response = self.run_action('confirm_bookings', self.bookings)
+        self.assertContains(response, 'وضعیت 3 رزرو به «تأیید شده» تغییر کرد.')
+        self.assertEqual(Booking.objects.filter(status='confirmed').count(), 3)
+        self.assertEqual(RoomNight.objects.count(), 6)
+
+    def test_confirm_action_reports_conflicts(self):
+        conflicting = Booking.objects.create(user=self.admin, room=self.room, check_in=self.bookings[0].check_in,
+                                             check_out=self.bookings[0].check_out, people_count=2, status='canceled')
+        Booking.objects.filter(pk=conflicting.pk).update(status='pending')
+
+        response = self.run_action('confirm_bookings', [self.bookings[0], conflicting])
+
+        self.assertContains(response, 'تأیید نشد')
+        self.assertFalse(Booking.objects.filter(status='confirmed').exists())
+
+    def test_cancel_and_expire_actions(self):
+        self.run_action('confirm_bookings', self.bookings)
+        self.run_action('cancel_bookings', self.bookings[:2])
+        self.run_action('expire_bookings', self.bookings[2:])
+
+        self.assertEqual(Booking.objects.filter(status='canceled').count(), 2)
+        self.assertEqual(Booking.objects.filter(status='expired').count(), 1)
+        self.assertFalse(RoomNight.objects.exists())
+        self.room.refresh_from_db()
+        self.assertTrue(self.room.existing)
@@ -0,0 +1,197 @@
+import threading
+from datetime import date, timedelta
+from unittest.mock import Mock, patch
+
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+import jdatetime
+
+from accounts.models import User
+from hotels.models import Room
+from reservations import engine, gateway, holds
+from reservations.models import Booking, Guest, RoomNight, Transaction
+
+GUESTS = [
+    {'full_name': 'علی احمدی', 'national_id': '1234567890', 'phone_number': '09123456789', 'gender': 'M'},
+    {'full_name': 'مریم محمدی', 'national_id': '0987654321', 'phone_number': '09987654321', 'gender': 'F'},
+]
+
+
+class ConfirmBookingTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone='09123456789', password='testpass123')
+        self.room = Room.objects.create(title="اتاق دو تخته", price=500000, size=30, capacity=2,
+                                        description="اتاق دو تخته استاندارد")
+        self.check_in = date.today() + timedelta(days=5)
+        self.check_out = self.check_in + timedelta(days=2)
+
+    def confirm(self, authority='authority-1', user=None, check_in=None, check_out=None):
+        return engine.confirm_booking(
+            authority=authority,
+            user=user or self.user,
+            room=self.room,
+            check_in=check_in or self.check_in,
+            check_out=check_out or self.check_out,
+            people_count=2,
+            nights=2,
+            total_price=1000000,
+            guests=GUESTS,
+        )
+
+    def test_creates_booking_guests_and_transaction(self):
+        booking, created = self.confirm()
+        self.assertTrue(created)
+        self.assertEqual(booking.status, 'confirmed')
+        self.assertEqual(booking.guests.count(), 2)
+        self.assertEqual(booking.transaction.transaction_id, 'authority-1')
+        self.assertEqual(booking.transaction.status, 'success')
+        self.assertEqual(RoomNight.objects.filter(booking=booking).count(), 2)
+
+    def test_same_authority_returns_existing_booking(self):
+        booking, _ = self.confirm()
+        with self.assertNumQueries(4):
+            again, created = self.confirm()
+        self.assertFalse(created)
+        self.assertEqual(again, booking)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(Guest.objects.count(), 2)
+
+    def test_failed_authority_is_not_booked(self):
+        Transaction.objects.create(user=self.user, amount=1000000, transaction_id='authority-1', status='failed')
+        booking, created = self.confirm()
+        self.assertIsNone(booking)
+        self.assertFalse(created)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_overlapping_nights_rejected(self):
+        self.confirm()
+        other = User.objects.create_user(phone='09120000000', password='testpass123')
+        with self.assertRaises(engine.BookingUnavailable):
+            self.confirm(authority='authority-2', user=other,
+                         check_in=self.check_in + timedelta(days=1), check_out=self.check_out + timedelta(days=1))
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertFalse(Transaction.objects.filter(transaction_id='authority-2').exists())
+
+    def test_adjacent_stay_allowed(self):
+        self.confirm()
+        _, created = self.confirm(authority='authority-2', check_in=self.check_out,
+                                  check_out=self.check_out + timedelta(days=2))
+        self.assertTrue(created)
+
+    def test_guest_error_rolls_back_booking(self):
+        bad_guests = [dict(GUESTS[0], gender=None)]
+        with self.assertRaises(Exception):
+            engine.confirm_booking(authority='authority-1', user=self.user, room=self.room,
+                                   check_in=self.check_in, check_out=self.check_out, people_count=1,
+                                   nights=2, total_price=1000000, guests=bad_guests)
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(RoomNight.objects.exists())
+        self.assertFalse(Transaction.objects.exists())
+
+
+@patch('reservations.gateway.client.session.post')
+class ParallelVerifyTest(TransactionTestCase):
+    """چند بازگشت همزمان از درگاه برای یک اتاق و بازه؛ در نهایت فقط یک رزرو باید ثبت شود."""
+    workers = 8
+
+    def setUp(self):
+        holds.reset()
+        gateway.client.breaker.reset()
+        self.room = Room.objects.create(title="اتاق دو تخته", price=500000, size=30, capacity=2,
+                                        description="اتاق دو تخته استاندارد")
+        today = jdatetime.date.today()
+        self.reservation_data = {
+            'room_slug': self.room.slug,
+            'check_in': (today + jdatetime.timedelta(days=1)).isoformat(),
+            'check_out': (today + jdatetime.timedelta(days=3)).isoformat(),
+            'capacity': 2,
+            'total_price': 1000000,
+            'nights': 2,
+            'guests': GUESTS,
+        }
+        self.url = reverse('reservations:payment-verify')
+
+    def make_client(self, user, authority):
+        client = Client()
+        client.force_login(user)
+        session = client.session
+        session['authority'] = authority
+        session['reservation_data'] = self.reservation_data
+        session.save()
+        return client
+
+    def fire(self, requests_to_send, status='OK'):
+        barrier = threading.Barrier(len(requests_to_send))
+        responses = [None] * len(requests_to_send)
+
+        def verify(index, client, authority):
+            try:
+                barrier.wait()
+                responses[index] = client.get(self.url, {'Status': status, 'Authority': authority})
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=verify, args=(index, client, authority))
+            for index, (client, authority) in enumerate(requests_to_send)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_repeated_callback_books_once(self, mock_post):
+        mock_post.return_value = Mock(json=Mock(return_value={'data': {'code': 100}}))
+        user = User.objects.create_user(phone='09123456789', password='testpass123')
+        requests_to_send = [(self.make_client(user, 'authority-1'), 'authority-1') for _ in range(self.workers)]
+
+        responses = self.fire(requests_to_send)
+
+        booking = Booking.objects.get()
+        self.assertEqual(booking.guests.count(), 2)
+        self.assertEqual(Transaction.objects.get().booking, booking)
+        success_url = reverse('reservations:payment-success', kwargs={'pk': booking.pk})
+        self.assertEqual({response.url for response in responses}, {success_url})
+
+    def test_competing_users_book_once(self, mock_post):
+        mock_post.return_value = Mock(json=Mock(return_value={'data': {'code': 100}}))
+        requests_to_send = []
+        for index in range(self.workers):
+            user = User.objects.create_user(phone=f'0912000000{index}', password='testpass123')
+            requests_to_send.append((self.make_client(user, f'authority-{index}'), f'authority-{index}'))
+
+        responses = self.fire(requests_to_send)
+
+        booking = Booking.objects.get()
+        self.assertEqual(RoomNight.objects.filter(room=self.room).count(), 2)
+        self.assertEqual(Transaction.objects.filter(status='success').get().booking, booking)
+        self.assertEqual(Transaction.objects.filter(status='failed').count(), self.workers - 1)
+        fail_url = reverse('reservations:payment-fail')
+        self.assertEqual(sum(response.url == fail_url for response in responses), self.workers - 1)
+
+    def test_repeated_failed_callback_recorded_once(self, mock_post):
+        user = User.objects.create_user(phone='09123456789', password='testpass123')
+        fail_url = reverse('reservations:payment-fail')
+
+        for status, code in (('NOK', 100), ('OK', 102)):
+            Transaction.objects.all().delete()
+            mock_post.return_value = Mock(json=Mock(return_value={'data': {'code': code}}))
+            requests_to_send = [(self.make_client(user, 'authority-1'), 'authority-1') for _ in range(self.workers)]
+
+            responses = self.fire(requests_to_send, status=status)
+
+            self.assertEqual({response.url for response in responses}, {fail_url})
+            self.assertEqual(Transaction.objects.get().status, 'failed')
+        self.assertFalse(Booking.objects.exists())
+
+    def test_failed_callback_after_success_keeps_booking(self, mock_post):
+        mock_post.return_value = Mock(json=Mock(return_value={'data': {'code': 100}}))
+        user = User.objects.create_user(phone='09123456789', password='testpass123')
+        self.fire([(self.make_client(user, 'authority-1'), 'authority-1')])
+
+        self.fire([(self.make_client(user, 'authority-1'), 'authority-1')], status='NOK')
+
+        self.assertEqual(Transaction.objects.get().status, 'success')
+        self.assertEqual(Booking.objects.get().status, 'confirmed')
@@ -0,0 +1,105 @@
+import csv
+import io
+import os
+import tempfile
+from datetime import date
+from io import StringIO
+
+import jdatetime
+from django.contrib.admin import helpers
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from accounts.models import User
+from core import jalali
+from hotels.models import Room
+from reservations import exports
+from reservations.models import Booking, Guest, Transaction
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(phone='09120000001', password='testpass123')
+        self.room = Room.objects.create(title='اتاق دو تخته', price=1000, size=20, capacity=2, description='test')
+        self.bookings = []
+        for index in range(3):
+            booking = Booking.objects.create(
+                user=self.user, room=self.room, people_count=2, status='pending', nights_stay=2,
+                check_in=date(2030, 3, 21 + index * 3), check_out=date(2030, 3, 23 + index * 3),
+            )
+            Guest.objects.create(booking=booking, full_name=f'مهمان {index}', national_id='1234567890',
+                                 phone_number='09123456789', gender='M')
+            Transaction.objects.create(user=self.user, booking=booking, amount=2000,
+                                       transaction_id=f'authority-{index}', status='success')
+            self.bookings.append(booking)
+
+    def parse(self, content):
+        self.assertTrue(content.startswith('\ufeff'))
+        return list(csv.reader(io.StringIO(content[1:])))
+
+    def test_booking_rows(self):
+        rows = self.parse(''.join(exports.csv_lines(exports.BookingExport().rows())))
+        self.assertEqual(rows[0][0], 'شناسه')
+        self.assertEqual(len(rows), 4)
+        first = rows[1]
+        self.assertEqual(first[0], str(self.bookings[0].pk))
+        self.assertEqual(first[3], 'اتاق دو تخته')
+        self.assertEqual(first[4], '1409/01/01')
+        self.assertEqual(first[8], 'در انتظار تایید')
+
+    def test_single_query_regardless_of_rows(self):
+        with self.assertNumQueries(1):
+            list(exports.GuestExport().rows())
+        with self.assertNumQueries(1):
+            list(exports.TransactionExport().rows())
+
+    def test_jalali_dates_are_memoized(self):
+        jalali.to_jalali.cache_clear()
+        jalali._format_day.cache_clear()
+        list(exports.BookingExport().rows())
+        list(exports.BookingExport().rows())
+        # شش تاریخ ورود/خروج و تاریخ ایجاد امروز
+        self.assertEqual(jalali.to_jalali.cache_info().misses, 7)
+        info = jalali._format_day.cache_info()
+        self.assertEqual(info.misses, 7)
+        self.assertGreater(info.hits, info.misses)
+        self.assertEqual(exports.format_date(date(2030, 3, 21)), jdatetime.date(1409, 1, 1).strftime('%Y/%m/%d'))
+
+    def test_admin_action_streams_csv(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('admin:reservations_booking_changelist'), {
+            'action': 'export_csv',
+            helpers.ACTION_CHECKBOX_NAME: [self.bookings[0].pk, self.bookings[2].pk],
+        })
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="bookings.csv"')
+        rows = self.parse(b''.join(response.streaming_content).decode())
+        self.assertEqual([row[0] for row in rows[1:]], [str(self.bookings[0].pk), str(self.bookings[2].pk)])
+
+    def test_transaction_and_guest_admin_actions(self):
+        self.client.force_login(self.user)
+        for url, model in (('admin:reservations_transaction_changelist', Transaction),
+                           ('admin:reservations_guest_changelist', Guest)):
+            response = self.client.post(reverse(url), {
+                'action': 'export_csv',
+                helpers.ACTION_CHECKBOX_NAME: list(model.objects.values_list('pk', flat=True)),
+            })
+            rows = self.parse(b''.join(response.streaming_content).decode())
+            self.assertEqual(len(rows), 4)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'transactions.csv')
+            err = StringIO()
+            call_command('export_reservations', 'transactions', output=path, stderr=err)
+            with open(path, encoding='utf-8', newline='') as f:
+                rows = self.parse(f.read())
+        self.assertEqual([row[0] for row in rows[1:]], ['authority-0', 'authority-1', 'authority-2'])
+        self.assertIn('3 ردیف', err.getvalue())
+
+    def test_command_writes_stdout(self):
+        out = StringIO()
+        call_command('export_reservations', 'guests', stdout=out, stderr=StringIO())
+        rows = self.parse(out.getvalue())
+        self.assertEqual(rows[1][3], 'مهمان 0')
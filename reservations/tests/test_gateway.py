@@ -0,0 +1,116 @@
+import threading
+from unittest.mock import patch, Mock
+
+import requests
+from django.test import SimpleTestCase
+
+from reservations.gateway import ZarinpalClient, CircuitBreaker, GatewayUnavailable
+from reservations.management.commands.fake_zarinpal import make_server
+
+
+def gateway_response(status_code=200, code=100):
+    response = Mock()
+    response.status_code = status_code
+    response.json.return_value = {'data': {'code': code}}
+    return response
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertTrue(breaker.is_open)
+        self.assertFalse(breaker.allow())
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertFalse(breaker.is_open)
+
+    def test_half_open_allows_single_trial(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        with patch('reservations.gateway.time.monotonic', return_value=100):
+            breaker.record_failure()
+        with patch('reservations.gateway.time.monotonic', return_value=131):
+            self.assertTrue(breaker.allow())
+            self.assertFalse(breaker.allow())
+            breaker.record_success()
+            self.assertTrue(breaker.allow())
+
+
+class ZarinpalClientTest(SimpleTestCase):
+    def setUp(self):
+        self.client = ZarinpalClient('https://gateway.test', 'merchant', timeout=(1, 2), verify_retries=2,
+                                     retry_backoff=0, breaker=CircuitBreaker(failure_threshold=3, reset_timeout=30))
+
+    def test_timeout_and_payload(self):
+        with patch.object(self.client.session, 'post', return_value=gateway_response()) as mock_post:
+            self.client.request_payment(amount=1000, description='test', callback_url='https://site.test/verify')
+
+        url = mock_post.call_args.args[0]
+        self.assertEqual(url, 'https://gateway.test/pg/v4/payment/request.json')
+        self.assertEqual(mock_post.call_args.kwargs['timeout'], (1, 2))
+        self.assertIn('"merchant_id": "merchant"', mock_post.call_args.kwargs['data'])
+
+    def test_verify_retries_connection_errors(self):
+        side_effect = [requests.ConnectionError(), requests.Timeout(), gateway_response()]
+        with patch.object(self.client.session, 'post', side_effect=side_effect) as mock_post:
+            response = self.client.verify(amount=1000, authority='A1')
+
+        self.assertEqual(response.json()['data']['code'], 100)
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(self.client.breaker.failures, 0)
+
+    def test_verify_retries_server_errors(self):
+        side_effect = [gateway_response(status_code=503), gateway_response()]
+        with patch.object(self.client.session, 'post', side_effect=side_effect) as mock_post:
+            self.client.verify(amount=1000, authority='A1')
+        self.assertEqual(mock_post.call_count, 2)
+
+    def test_request_payment_is_not_retried(self):
+        with patch.object(self.client.session, 'post', side_effect=requests.Timeout()) as mock_post:
+            with self.assertRaises(requests.Timeout):
+                self.client.request_payment(amount=1000, description='test', callback_url='https://site.test/')
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(self.client.breaker.failures, 1)
+
+    def test_open_circuit_fails_fast(self):
+        with patch.object(self.client.session, 'post', side_effect=requests.ConnectionError()) as mock_post:
+            for _ in range(3):
+                with self.assertRaises(requests.ConnectionError):
+                    self.client.request_payment(amount=1000, description='test', callback_url='https://site.test/')
+            with self.assertRaises(GatewayUnavailable):
+                self.client.verify(amount=1000, authority='A1')
+        self.assertEqual(mock_post.call_count, 3)
+
+
+class FakeZarinpalServerTest(SimpleTestCase):
+    def setUp(self):
+        self.server = make_server()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        host, port = self.server.server_address[:2]
+        self.client = ZarinpalClient(f'http://{host}:{port}', 'merchant', retry_backoff=0)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.client.session.close()
+
+    def test_full_payment_flow(self):
+        response = self.client.request_payment(amount=5000, description='test',
+                                               callback_url='http://site.test/verify/')
+        authority = response.json()['data']['authority']
+
+        redirect = self.client.session.get(self.client.startpay_url(authority), allow_redirects=False)
+        self.assertEqual(redirect.status_code, 302)
+        self.assertEqual(redirect.headers['Location'],
+                         f'http://site.test/verify/?Authority={authority}&Status=OK')
+
+        self.assertEqual(self.client.verify(amount=5000, authority=authority).json()['data']['code'], 100)
+        # تأیید دوباره همان تراکنش
+        self.assertEqual(self.client.verify(amount=5000, authority=authority).json()['data']['code'], 101)
+        self.assertNotEqual(self.client.verify(amount=1, authority=authority).json()['errors'], [])
@@ -0,0 +1,56 @@
+from django.test import SimpleTestCase, override_settings
+from reservations import holds
+from datetime import date, timedelta
+
+
+class HoldsTest(SimpleTestCase):
+    def setUp(self):
+        holds.reset()
+        self.check_in = date.today() + timedelta(days=10)
+        self.check_out = self.check_in + timedelta(days=3)
+
+    def test_place_hold(self):
+        self.assertTrue(holds.place_hold(1, self.check_in, self.check_out, 'user-1'))
+        self.assertEqual(holds.held_room_ids(self.check_in, self.check_out), {1})
+
+    def test_conflicting_owner_is_rejected(self):
+        holds.place_hold(1, self.check_in, self.check_out, 'user-1')
+
+        overlapping_check_in = self.check_out - timedelta(days=1)
+        self.assertFalse(holds.place_hold(1, overlapping_check_in, self.check_out + timedelta(days=2), 'user-2'))
+        # شب‌های آزاد بعدی هم نباید به صورت ناقص نگه داشته شوند
+        self.assertEqual(holds.held_nights(1, self.check_out, self.check_out + timedelta(days=2)), set())
+
+    def test_same_owner_can_extend(self):
+        holds.place_hold(1, self.check_in, self.check_out, 'user-1')
+        self.assertTrue(holds.place_hold(1, self.check_in, self.check_out + timedelta(days=1), 'user-1'))
+
+    def test_other_rooms_are_independent(self):
+        holds.place_hold(1, self.check_in, self.check_out, 'user-1')
+        self.assertTrue(holds.place_hold(2, self.check_in, self.check_out, 'user-2'))
+        self.assertEqual(holds.held_room_ids(self.check_in, self.check_out), {1, 2})
+
+    def test_release_only_by_owner(self):
+        holds.place_hold(1, self.check_in, self.check_out, 'user-1')
+
+        self.assertEqual(holds.release_hold(1, self.check_in, self.check_out, 'user-2'), 0)
+        self.assertEqual(holds.held_room_ids(self.check_in, self.check_out), {1})
+
+        self.assertEqual(holds.release_hold(1, self.check_in, self.check_out, 'user-1'), 3)
+        self.assertEqual(holds.held_room_ids(self.check_in, self.check_out), set())
+        self.assertTrue(holds.place_hold(1, self.check_in, self.check_out, 'user-2'))
+
+    @override_settings(RESERVATION_HOLD_TIMEOUT=60)
+    def test_hold_expires(self):
+        holds.place_hold(1, self.check_in, self.check_out, 'user-1')
+        ttl = holds.redis_client.pttl(holds.hold_key(1, self.check_in))
+        self.assertTrue(0 < ttl <= 60 * 1000)
+
+    def test_held_nights(self):
+        holds.place_hold(1, self.check_in, self.check_in + timedelta(days=1), 'user-1')
+        nights = holds.held_nights(1, self.check_in - timedelta(days=2), self.check_out)
+        self.assertEqual(nights, {self.check_in})
+
+    def test_empty_range(self):
+        self.assertFalse(holds.place_hold(1, self.check_in, self.check_in, 'user-1'))
+        self.assertEqual(holds.held_room_ids(self.check_in, self.check_in), set())
@@ -1,10 +1,13 @@
-from django.test import TestCase
-from reservations.models import Booking, Guest, Transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from reservations.models import Booking, Guest, Transaction, RoomNight
 from hotels.models import Room, Service
 from accounts.models import User
 from datetime import date, timedelta
 from django.db import transaction, IntegrityError
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from io import StringIO
 
 
 class BookingModelTest(TestCase):
@@ -35,7 +38,7 @@ class BookingModelTest(TestCase):
             description="سوئیت لوکس"
         )
 
-        self.today = date.today()
+        self.today = timezone.localdate()
         self.tomorrow = self.today + timedelta(days=1)
         self.next_week = self.today + timedelta(days=7)
 
@@ -153,6 +156,29 @@ class BookingModelTest(TestCase):
         self.assertIn("اتاق", error_message)
         self.assertIn("دسترس", error_message)
 
+    def test_clean_allows_check_in_on_previous_check_out(self):
+        Booking.objects.create(
+            user=self.user1,
+            room=self.room1,
+            check_in=self.tomorrow,
+            check_out=self.tomorrow + timedelta(days=2),
+            people_count=2,
+            status='confirmed',
+            nights_stay=2
+        )
+
+        next_booking = Booking(
+            user=self.user2,
+            room=self.room1,
+            check_in=self.tomorrow + timedelta(days=2),
+            check_out=self.tomorrow + timedelta(days=4),
+            people_count=2,
+            nights_stay=2
+        )
+
+        # روز خروج رزرو قبلی شب اشغال شده‌ای نیست
+        next_booking.clean()
+
     def test_save_calculates_total_price(self):
         booking = Booking(
             user=self.user1,
@@ -170,6 +196,20 @@ class BookingModelTest(TestCase):
         self.assertTrue(self.room1.existing)
 
         booking = Booking.objects.create(
+            user=self.user1,
+            room=self.room1,
+            check_in=self.today,
+            check_out=self.next_week,
+            people_count=2,
+            status='confirmed',
+            nights_stay=7
+        )
+
+        self.room1.refresh_from_db()
+        self.assertFalse(self.room1.existing)
+
+    def test_future_confirmed_booking_keeps_room_available_today(self):
+        Booking.objects.create(
             user=self.user1,
             room=self.room1,
             check_in=self.tomorrow,
@@ -180,13 +220,15 @@ class BookingModelTest(TestCase):
         )
 
         self.room1.refresh_from_db()
-        self.assertFalse(self.room1.existing)
+        self.assertTrue(self.room1.existing)
+        # اجرای دوره‌ای همان نتیجه را می‌دهد و چیزی را تغییر نمی‌دهد
+        self.assertEqual(RoomNight.refresh_room_existing([self.room1.pk]), (0, 0))
 
     def test_save_canceled_booking_restores_room_availability(self):
         booking = Booking.objects.create(
             user=self.user1,
             room=self.room1,
-            check_in=self.tomorrow,
+            check_in=self.today,
             check_out=self.next_week,
             people_count=2,
             status='confirmed',
@@ -203,18 +245,18 @@ class BookingModelTest(TestCase):
         self.assertTrue(self.room1.existing)
 
     def test_canceled_booking_with_other_confirmed_bookings(self):
-        booking1 = Booking.objects.create(
-            user=self.user1,
+        booking2 = Booking.objects.create(
+            user=self.user2,
             room=self.room1,
-            check_in=self.tomorrow,
-            check_out=self.tomorrow + timedelta(days=3),
+            check_in=self.today,
+            check_out=self.today + timedelta(days=3),
             people_count=2,
             status='confirmed',
             nights_stay=3
         )
 
-        booking2 = Booking.objects.create(
-            user=self.user2,
+        booking1 = Booking.objects.create(
+            user=self.user1,
             room=self.room1,
             check_in=self.tomorrow + timedelta(days=5),
             check_out=self.tomorrow + timedelta(days=8),
@@ -312,6 +354,272 @@ class BookingModelTest(TestCase):
         self.assertTrue(any("تاریخ خروج" in error for error in errors))
 
 
+class RoomNightModelTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            phone='09123456789',
+            password='testpass123',
+        )
+        self.room = Room.objects.create(
+            title="اتاق دو تخته",
+            price=500000,
+            size=30,
+            capacity=2,
+            description="اتاق دو تخته استاندارد"
+        )
+        self.check_in = date.today() + timedelta(days=1)
+        self.check_out = self.check_in + timedelta(days=3)
+
+    def create_booking(self, status='confirmed'):
+        return Booking.objects.create(
+            user=self.user,
+            room=self.room,
+            check_in=self.check_in,
+            check_out=self.check_out,
+            people_count=2,
+            status=status,
+            nights_stay=3
+        )
+
+    def test_confirmed_booking_creates_nights(self):
+        booking = self.create_booking()
+
+        nights = list(RoomNight.objects.filter(booking=booking).order_by('night').values_list('night', flat=True))
+        self.assertEqual(nights, [self.check_in + timedelta(days=i) for i in range(3)])
+        self.assertTrue(all(night.room_id == self.room.id for night in booking.room_nights.all()))
+
+    def test_pending_booking_creates_no_nights(self):
+        self.create_booking(status='pending')
+        self.assertFalse(RoomNight.objects.exists())
+
+    def test_cancel_removes_nights(self):
+        booking = self.create_booking()
+
+        booking.status = 'canceled'
+        booking.save()
+
+        self.assertFalse(RoomNight.objects.filter(booking=booking).exists())
+
+    def test_date_change_resyncs_nights(self):
+        booking = self.create_booking()
+
+        booking.check_out = self.check_in + timedelta(days=1)
+        booking.save()
+
+        self.assertEqual(list(booking.room_nights.values_list('night', flat=True)), [self.check_in])
+
+    def test_string_dates(self):
+        booking = Booking.objects.create(
+            user=self.user,
+            room=self.room,
+            check_in='2023-10-01',
+            check_out='2023-10-03',
+            people_count=2,
+            status='confirmed'
+        )
+        self.assertEqual(booking.room_nights.count(), 2)
+
+    def test_occupied_room_ids(self):
+        self.create_booking()
+
+        occupied = RoomNight.occupied_room_ids(self.check_out - timedelta(days=1), self.check_out + timedelta(days=2))
+        self.assertIn(self.room.id, [row['room_id'] for row in occupied])
+
+        free = RoomNight.occupied_room_ids(self.check_out, self.check_out + timedelta(days=2))
+        self.assertFalse(free.exists())
+
+    def test_rebuild_command(self):
+        booking = self.create_booking()
+        self.create_booking(status='pending')
+        RoomNight.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_room_nights', stdout=out)
+
+        self.assertEqual(RoomNight.objects.count(), 3)
+        self.assertEqual(RoomNight.objects.filter(booking=booking).count(), 3)
+        self.assertIn("3", out.getvalue())
+
+
+class ExpireBookingsCommandTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone='09123456789', password='12345')
+        self.room = Room.objects.create(title='Test Room', price=100, size=20, capacity=2, description='Test')
+        self.other_room = Room.objects.create(title='Other Room', price=100, size=20, capacity=2, description='Test')
+        self.today = timezone.localdate()
+
+    def create_booking(self, room, check_in, nights=2, status='confirmed'):
+        return Booking.objects.create(
+            user=self.user,
+            room=room,
+            check_in=check_in,
+            check_out=check_in + timedelta(days=nights),
+            people_count=2,
+            status=status,
+            nights_stay=nights
+        )
+
+    def run_command(self):
+        out = StringIO()
+        call_command('expire_bookings', stdout=out)
+        return out.getvalue()
+
+    @override_settings(PENDING_BOOKING_TIMEOUT=60 * 30)
+    def test_expires_stale_pending_bookings(self):
+        stale = self.create_booking(self.room, self.today + timedelta(days=5), status='pending')
+        Booking.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        fresh = self.create_booking(self.other_room, self.today + timedelta(days=5), status='pending')
+        past = self.create_booking(self.other_room, self.today - timedelta(days=3), status='pending')
+
+        output = self.run_command()
+
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        past.refresh_from_db()
+        self.assertEqual(stale.status, 'expired')
+        self.assertEqual(past.status, 'expired')
+        self.assertEqual(fresh.status, 'pending')
+        self.assertIn("2 رزرو منقضی شد", output)
+
+        # رزرو منقضی شده دیگر اتاق را اشغال نمی‌کند
+        new_booking = Booking(user=self.user, room=self.room, people_count=2,
+                              check_in=stale.check_in, check_out=stale.check_out)
+        new_booking.clean()
+
+    @override_settings(PENDING_BOOKING_TIMEOUT=60 * 30)
+    def test_expiring_invalidates_room_calendar(self):
+        stale = self.create_booking(self.room, self.today + timedelta(days=5), status='pending')
+        Booking.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        room_version = RoomNight.calendar_version(self.room.pk)
+        other_version = RoomNight.calendar_version(self.other_room.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.run_command()
+
+        self.assertNotEqual(RoomNight.calendar_version(self.room.pk), room_version)
+        self.assertEqual(RoomNight.calendar_version(self.other_room.pk), other_version)
+
+    def test_recomputes_existing_from_today(self):
+        # وضعیت ذخیره‌شده با اشغال امروز همخوانی ندارد (مثلا پس از ویرایش مستقیم)
+        self.create_booking(self.room, self.today + timedelta(days=10))
+        self.create_booking(self.other_room, self.today - timedelta(days=1))
+        Room.objects.filter(pk=self.room.pk).update(existing=False)
+        Room.objects.filter(pk=self.other_room.pk).update(existing=True)
+
+        output = self.run_command()
+
+        self.room.refresh_from_db()
+        self.other_room.refresh_from_db()
+        self.assertTrue(self.room.existing)
+        self.assertFalse(self.other_room.existing)
+        self.assertIn("1 اتاق آزاد و 1 اتاق اشغال", output)
+
+    def test_stay_ended_frees_room(self):
+        self.create_booking(self.room, self.today - timedelta(days=2))
+        # اتاق تا دیروز اشغال بوده و هنوز «رزرو شده» علامت خورده است
+        Room.objects.filter(pk=self.room.pk).update(existing=False)
+
+        self.run_command()
+
+        self.room.refresh_from_db()
+        self.assertTrue(self.room.existing)
+
+    def test_repeated_runs_touch_nothing(self):
+        self.create_booking(self.room, self.today)
+        self.run_command()
+
+        with self.assertNumQueries(5):
+            output = self.run_command()
+        self.assertIn("0 رزرو منقضی شد، 0 اتاق آزاد و 0 اتاق اشغال", output)
+
+
+class BookingSetStatusTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone='09123456789', password='12345')
+        self.room = Room.objects.create(title='Test Room', price=100, size=20, capacity=2, description='Test')
+        self.other_room = Room.objects.create(title='Other Room', price=100, size=20, capacity=2, description='Test')
+        self.today = timezone.localdate()
+
+    def create_booking(self, room, check_in, nights=2, status='pending'):
+        return Booking.objects.create(
+            user=self.user,
+            room=room,
+            check_in=check_in,
+            check_out=check_in + timedelta(days=nights),
+            people_count=2,
+            status=status,
+            nights_stay=nights
+        )
+
+    def test_confirm_creates_nights_and_marks_rooms(self):
+        first = self.create_booking(self.room, self.today)
+        second = self.create_booking(self.other_room, self.today + timedelta(days=7))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            updated, conflicts = Booking.objects.filter(pk__in=[first.pk, second.pk]).set_status('confirmed')
+
+        self.assertEqual((updated, conflicts), (2, []))
+        self.assertEqual(set(Booking.objects.values_list('status', flat=True)), {'confirmed'})
+        self.assertEqual(RoomNight.objects.filter(booking=first).count(), 2)
+        self.assertEqual(RoomNight.objects.filter(booking=second).count(), 2)
+        self.room.refresh_from_db()
+        self.other_room.refresh_from_db()
+        # فقط اتاقی که امروز اشغال است «رزرو شده» می‌شود
+        self.assertFalse(self.room.existing)
+        self.assertTrue(self.other_room.existing)
+
+    def test_confirm_skips_overlapping_bookings(self):
+        self.create_booking(self.room, self.today, status='confirmed')
+        overlapping = Booking(user=self.user, room=self.room, check_in=self.today + timedelta(days=1),
+                              check_out=self.today + timedelta(days=3), people_count=2, status='pending')
+        overlapping.save()
+        free = self.create_booking(self.room, self.today + timedelta(days=10))
+
+        updated, conflicts = Booking.objects.filter(pk__in=[overlapping.pk, free.pk]).set_status('confirmed')
+
+        self.assertEqual((updated, conflicts), (1, [overlapping.pk]))
+        overlapping.refresh_from_db()
+        self.assertEqual(overlapping.status, 'pending')
+        self.assertFalse(RoomNight.objects.filter(booking=overlapping).exists())
+
+    def test_confirm_rejects_overlap_within_selection(self):
+        first = self.create_booking(self.room, self.today + timedelta(days=5))
+        second = Booking.objects.create(user=self.user, room=self.room, check_in=self.today + timedelta(days=6),
+                                        check_out=self.today + timedelta(days=8), people_count=2, status='canceled')
+        Booking.objects.filter(pk=second.pk).update(status='pending')
+
+        updated, conflicts = Booking.objects.filter(pk__in=[first.pk, second.pk]).set_status('confirmed')
+
+        self.assertEqual(updated, 0)
+        self.assertEqual(sorted(conflicts), sorted([first.pk, second.pk]))
+
+    def test_confirm_allows_back_to_back_bookings(self):
+        self.create_booking(self.room, self.today, status='confirmed')
+        following = self.create_booking(self.room, self.today + timedelta(days=2))
+
+        updated, conflicts = Booking.objects.filter(pk=following.pk).set_status('confirmed')
+
+        self.assertEqual((updated, conflicts), (1, []))
+        self.assertEqual(RoomNight.objects.filter(room=self.room).count(), 4)
+
+    def test_cancel_removes_nights_and_frees_room(self):
+        bookings = [self.create_booking(self.room, self.today, status='confirmed'),
+                    self.create_booking(self.other_room, self.today, status='confirmed')]
+        self.assertEqual(RoomNight.objects.count(), 4)
+
+        with self.assertNumQueries(9):
+            updated, _ = Booking.objects.filter(pk__in=[b.pk for b in bookings]).set_status('canceled')
+
+        self.assertEqual(updated, 2)
+        self.assertFalse(RoomNight.objects.exists())
+        self.assertEqual(Room.objects.filter(existing=True).count(), 2)
+
+    def test_unchanged_bookings_are_skipped(self):
+        booking = self.create_booking(self.room, self.today, status='canceled')
+        updated, conflicts = Booking.objects.filter(pk=booking.pk).set_status('canceled')
+        self.assertEqual((updated, conflicts), (0, []))
+
+
 class GuestModelTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -0,0 +1,212 @@
+from datetime import date, timedelta
+from io import StringIO
+
+import jdatetime
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from hotels.models import Room
+from reservations import rollups
+from reservations.models import Booking, StaleBookingSpan, RollupState, RoomDailyStat
+
+
+class OccupancyRollupTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(phone='09120000001', password='testpass123')
+        self.room = Room.objects.create(title='اتاق یک', price=1000, size=20, capacity=2, description='test')
+        self.other_room = Room.objects.create(title='اتاق دو', price=3000, size=20, capacity=2, description='test')
+        self.start = date(2030, 1, 1)
+
+    def book(self, room, offset, nights, status='confirmed'):
+        check_in = self.start + timedelta(days=offset)
+        return Booking.objects.create(
+            user=self.user, room=room, people_count=2, status=status, nights_stay=nights,
+            check_in=check_in, check_out=check_in + timedelta(days=nights),
+        )
+
+    def refresh(self, full=False):
+        with self.captureOnCommitCallbacks(execute=True):
+            return rollups.refresh(full=full)
+
+    def settle(self):
+        # گذشت بیش از SAFETY_MARGIN از اجرای قبل؛ تغییرات پیش از آن دیگر دوباره خوانده نمی‌شوند
+        RollupState.objects.update(watermark=timezone.now())
+
+    def test_full_refresh(self):
+        self.book(self.room, 0, 3)
+        self.book(self.other_room, 1, 2)
+        self.book(self.other_room, 5, 2, status='pending')
+
+        self.assertEqual(self.refresh(), 5)
+        cells = RoomDailyStat.objects.filter(room=self.room).order_by('day')
+        self.assertEqual([cell.day for cell in cells], [self.start + timedelta(days=i) for i in range(3)])
+        self.assertEqual({cell.revenue for cell in cells}, {1000})
+        self.assertEqual(RoomDailyStat.objects.filter(room=self.other_room).count(), 2)
+
+    def test_incremental_refresh_only_touches_changed_spans(self):
+        kept = self.book(self.room, 0, 3)
+        self.refresh()
+        self.settle()
+        cancelled = self.book(self.other_room, 10, 2)
+        self.assertEqual(self.refresh(), 2)
+        self.settle()
+
+        cancelled.status = 'canceled'
+        cancelled.save()
+        with self.assertNumQueries(10):
+            self.assertEqual(rollups.refresh(), 0)
+        self.assertFalse(RoomDailyStat.objects.filter(room=self.other_room).exists())
+        self.assertEqual(RoomDailyStat.objects.filter(room=kept.room).count(), 3)
+
+    def test_no_changes_is_cheap(self):
+        self.book(self.room, 0, 3)
+        self.refresh()
+        self.settle()
+        # قفل وضعیت، دو جستجوی تغییرات، ثبت watermark و پاک کردن بازه‌های حذف شده خوانده شده
+        with self.assertNumQueries(7):
+            self.assertEqual(self.refresh(), 0)
+
+    def test_watermark_is_stored_with_the_table(self):
+        self.book(self.room, 0, 3)
+        before = timezone.now()
+        self.refresh()
+
+        state = RollupState.objects.get(name=rollups.WATERMARK_NAME)
+        self.assertGreaterEqual(state.watermark, before - rollups.SAFETY_MARGIN)
+        self.assertLess(state.watermark, timezone.now() - rollups.SAFETY_MARGIN)
+        # تغییرات درون SAFETY_MARGIN دوباره خوانده می‌شوند و پس از آن اجرای بعدی افزایشی است
+        self.assertEqual(self.refresh(), 3)
+        self.settle()
+        self.assertEqual(self.refresh(), 0)
+
+    def test_change_committed_after_previous_run_is_picked_up(self):
+        self.refresh()
+        booking = self.book(self.room, 0, 3)
+        # updated_at پیش از شروع اجرای قبلی گرفته شده ولی تراکنش پس از آن commit شده است
+        Booking.objects.filter(pk=booking.pk).update(updated_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(self.refresh(), 3)
+
+    def test_deleted_booking_days_are_removed(self):
+        kept = self.book(self.room, 0, 3)
+        deleted = self.book(self.other_room, 10, 2)
+        self.refresh()
+        self.settle()
+
+        deleted.delete()
+        self.assertEqual(self.refresh(), 0)
+
+        self.assertFalse(RoomDailyStat.objects.filter(room=self.other_room).exists())
+        self.assertEqual(RoomDailyStat.objects.filter(room=kept.room).count(), 3)
+
+    def test_moved_booking_days_are_removed(self):
+        booking = self.book(self.room, 0, 2)
+        self.refresh()
+        self.settle()
+
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.check_in = self.start + timedelta(days=31)
+        booking.check_out = self.start + timedelta(days=33)
+        booking.save()
+        self.refresh()
+
+        january = rollups.dashboard(self.start, self.start + timedelta(days=30))
+        february = rollups.dashboard(self.start + timedelta(days=31), self.start + timedelta(days=58))
+        self.assertEqual(january['occupied_nights'], 0)
+        self.assertEqual(february['occupied_nights'], 2)
+
+    def test_booking_moved_to_other_room(self):
+        booking = self.book(self.room, 0, 2)
+        self.refresh()
+        self.settle()
+
+        booking.room = self.other_room
+        booking.save()
+        self.refresh()
+
+        self.assertFalse(RoomDailyStat.objects.filter(room=self.room).exists())
+        self.assertEqual(RoomDailyStat.objects.filter(room=self.other_room).count(), 2)
+
+    def test_deleted_spans_are_pruned_once_read(self):
+        self.book(self.room, 0, 3).delete()
+        StaleBookingSpan.objects.update(recorded_at=timezone.now() - rollups.SAFETY_MARGIN * 2)
+        self.refresh()
+        self.assertFalse(StaleBookingSpan.objects.exists())
+
+    def test_revenue_uses_stay_dates(self):
+        booking = self.book(self.room, 0, 4)
+        Booking.objects.filter(pk=booking.pk).update(nights_stay=None)
+
+        self.refresh()
+
+        self.assertEqual(set(RoomDailyStat.objects.values_list('revenue', flat=True)), {1000})
+
+    def test_bulk_status_changes_are_picked_up(self):
+        booking = self.book(self.room, 0, 3, status='pending')
+        self.refresh()
+        Booking.objects.filter(pk=booking.pk).set_status('confirmed')
+        self.assertEqual(self.refresh(), 3)
+
+    def test_command(self):
+        self.book(self.room, 0, 2)
+        out = StringIO()
+        call_command('rollup_occupancy', '--full', stdout=out)
+        self.assertIn("2 ردیف", out.getvalue())
+
+    def test_dashboard_metrics(self):
+        self.book(self.room, 0, 3)
+        self.book(self.other_room, 1, 2)
+        self.refresh()
+
+        stats = rollups.dashboard(self.start, self.start + timedelta(days=9))
+
+        self.assertEqual(stats['available_nights'], 20)
+        self.assertEqual(stats['occupied_nights'], 5)
+        self.assertEqual(stats['revenue'], 3 * 1000 + 2 * 3000)
+        self.assertEqual(stats['occupancy'], 0.25)
+        self.assertEqual(stats['adr'], 1800)
+        self.assertEqual(stats['revpar'], 450)
+        self.assertEqual(len(stats['series']), 10)
+        self.assertEqual(stats['series'][1]['nights'], 2)
+        self.assertEqual(stats['series'][9]['nights'], 0)
+        rooms = {room['title']: room for room in stats['per_room']}
+        self.assertEqual(rooms['اتاق دو']['adr'], 3000)
+        self.assertEqual(rooms['اتاق یک']['occupancy'], 0.3)
+
+    def test_dashboard_queries_do_not_grow_with_history(self):
+        self.book(self.room, 0, 3)
+        self.refresh()
+        with self.assertNumQueries(3):
+            rollups.dashboard(self.start, self.start + timedelta(days=30))
+        for offset in range(5, 60, 3):
+            self.book(self.other_room, offset, 2)
+        self.refresh()
+        with self.assertNumQueries(3):
+            rollups.dashboard(self.start, self.start + timedelta(days=30))
+
+    def test_admin_dashboard(self):
+        self.book(self.room, 0, 3)
+        self.refresh()
+        self.client.force_login(self.user)
+        start = jdatetime.date.fromgregorian(date=self.start)
+        end = start + jdatetime.timedelta(days=9)
+
+        response = self.client.get(reverse('admin:reservations_booking_occupancy'), {
+            'start': start.strftime('%Y/%m/%d'),
+            'end': end.strftime('%Y/%m/%d'),
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'admin/reservations/occupancy_dashboard.html')
+        self.assertEqual(response.context['stats']['occupied_nights'], 3)
+        self.assertEqual(response.context['occupancy_percent'], 15.0)
+        self.assertContains(response, 'اتاق یک')
+
+    def test_admin_dashboard_staff_only(self):
+        regular = User.objects.create_user(phone='09120000002', password='testpass123')
+        self.client.force_login(regular)
+        response = self.client.get(reverse('admin:reservations_booking_occupancy'))
+        self.assertEqual(response.status_code, 302)
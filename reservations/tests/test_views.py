@@ -9,13 +9,16 @@ import json
 from accounts.models import User
 from unittest.mock import patch, Mock
 import requests
+from django.db import DatabaseError
 import jdatetime
 from datetime import date, timedelta
-from django.db import IntegrityError
+from reservations import holds, gateway
 
 
 class SendRequestViewTest(TestCase):
     def setUp(self):
+        holds.reset()
+        gateway.client.breaker.reset()
         self.client = Client()
 
         self.user = User.objects.create_user(
@@ -55,7 +58,7 @@ class SendRequestViewTest(TestCase):
         response = self.client.post(self.url, self.valid_guest_data)
         self.assertEqual(response.status_code, 302)
 
-    @patch('requests.post')
+    @patch('reservations.gateway.client.session.post')
     def test_successful_reservation(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = 200
@@ -157,7 +160,7 @@ class SendRequestViewTest(TestCase):
         self.assertEqual(response.status_code, 409)
         self.assertIn('متاسفانه این اتاق', response.content.decode())
 
-    @patch('requests.post')
+    @patch('reservations.gateway.client.session.post')
     def test_payment_gateway_error(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = 200
@@ -177,7 +180,7 @@ class SendRequestViewTest(TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertIn('خطا در پردازش', response.content.decode())
 
-    @patch('requests.post')
+    @patch('reservations.gateway.client.session.post')
     def test_network_error(self, mock_post):
         mock_post.side_effect = requests.RequestException("Network error")
 
@@ -187,6 +190,18 @@ class SendRequestViewTest(TestCase):
         self.assertEqual(response.status_code, 500)
         self.assertIn('خطای شبکه', response.content.decode())
 
+    @patch('reservations.gateway.client.session.post')
+    def test_open_circuit_fails_fast(self, mock_post):
+        for _ in range(gateway.client.breaker.failure_threshold):
+            gateway.client.breaker.record_failure()
+
+        self.client.login(phone='09123456789', password='testpass123')
+        response = self.client.post(self.url, self.valid_guest_data)
+
+        self.assertEqual(response.status_code, 500)
+        mock_post.assert_not_called()
+        self.assertEqual(holds.held_room_ids(*self.hold_dates()), set())
+
     def test_room_not_found(self):
         self.client.login(phone='09123456789', password='testpass123')
 
@@ -198,7 +213,7 @@ class SendRequestViewTest(TestCase):
     def test_session_data_storage(self):
         self.client.login(phone='09123456789', password='testpass123')
 
-        with patch('requests.post') as mock_post:
+        with patch('reservations.gateway.client.session.post') as mock_post:
             mock_response = Mock()
             mock_response.status_code = 200
             mock_response.json.return_value = {
@@ -218,6 +233,58 @@ class SendRequestViewTest(TestCase):
             self.assertEqual(reservation_data['guests'][0]['full_name'], 'علی احمدی')
             self.assertEqual(reservation_data['guests'][1]['full_name'], 'مریم محمدی')
 
+    def gateway_response(self, code=100):
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {'data': {'code': code, 'authority': 'test_auth'}}
+        return mock_response
+
+    def hold_dates(self):
+        check_in = jdatetime.datetime.strptime(self.check_in, '%Y/%m/%d').date().togregorian()
+        check_out = jdatetime.datetime.strptime(self.check_out, '%Y/%m/%d').date().togregorian()
+        return check_in, check_out
+
+    @patch('reservations.gateway.client.session.post')
+    def test_hold_blocks_other_user(self, mock_post):
+        mock_post.return_value = self.gateway_response()
+        User.objects.create_user(phone='09350000000', password='otherpass')
+
+        self.client.login(phone='09123456789', password='testpass123')
+        self.assertEqual(self.client.post(self.url, self.valid_guest_data).status_code, 200)
+
+        other_client = Client()
+        other_client.login(phone='09350000000', password='otherpass')
+        response = other_client.post(self.url, self.valid_guest_data)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(mock_post.call_count, 1)
+
+    @patch('reservations.gateway.client.session.post')
+    def test_same_user_can_retry_while_holding(self, mock_post):
+        mock_post.return_value = self.gateway_response()
+        self.client.login(phone='09123456789', password='testpass123')
+
+        self.assertEqual(self.client.post(self.url, self.valid_guest_data).status_code, 200)
+        self.assertEqual(self.client.post(self.url, self.valid_guest_data).status_code, 200)
+
+    @patch('reservations.gateway.client.session.post')
+    def test_gateway_failure_releases_hold(self, mock_post):
+        mock_post.return_value = self.gateway_response(code=101)
+        self.client.login(phone='09123456789', password='testpass123')
+
+        self.client.post(self.url, self.valid_guest_data)
+
+        self.assertEqual(holds.held_room_ids(*self.hold_dates()), set())
+
+    @patch('reservations.gateway.client.session.post')
+    def test_network_error_releases_hold(self, mock_post):
+        mock_post.side_effect = requests.RequestException("Network error")
+        self.client.login(phone='09123456789', password='testpass123')
+
+        self.client.post(self.url, self.valid_guest_data)
+
+        self.assertEqual(holds.held_room_ids(*self.hold_dates()), set())
+
     def test_minimum_one_night_stay(self):
         self.client.login(phone='09123456789', password='testpass123')
 
@@ -235,6 +302,8 @@ class SendRequestViewTest(TestCase):
 
 class VerifyViewTest(TestCase):
     def setUp(self):
+        holds.reset()
+        gateway.client.breaker.reset()
         self.client = Client()
 
         self.user = User.objects.create_user(
@@ -325,7 +394,7 @@ class VerifyViewTest(TestCase):
 
         self.assertRedirects(response, reverse('reservations:payment-fail'))
 
-    @patch('requests.post')
+    @patch('reservations.gateway.client.session.post')
     @override_settings(MERCHANT='test_merchant')
     def test_successful_payment_verification(self, mock_post):
         mock_response = Mock()
@@ -378,7 +447,7 @@ class VerifyViewTest(TestCase):
         self.assertNotIn('reservation_data', session)
         self.assertNotIn('authority', session)
 
-    @patch('requests.post')
+    @patch('reservations.gateway.client.session.post')
     def test_payment_verification_failed(self, mock_post):
         mock_response = Mock()
         mock_response.json.return_value = {
@@ -422,7 +491,7 @@ class VerifyViewTest(TestCase):
 
         self.assertRedirects(response, reverse('reservations:payment-fail'))
 
-    @patch('requests.post')
+    @patch('reservations.gateway.client.session.post')
     def test_network_error_during_verification(self, mock_post):
         mock_post.side_effect = requests.RequestException("Network error")
 
@@ -490,7 +559,7 @@ class VerifyViewTest(TestCase):
 
         self.assertEqual(response.status_code, 404)
 
-    @patch('requests.post')
+    @patch('reservations.gateway.client.session.post')
     def test_database_error_during_booking_creation(self, mock_post):
         mock_response = Mock()
         mock_response.json.return_value = {
@@ -502,8 +571,9 @@ class VerifyViewTest(TestCase):
 
         self.client.login(phone='09123456789', password='testpass123')
 
-        with patch('reservations.models.Booking.objects.create') as mock_create:
-            mock_create.side_effect = Exception("Database error")
+        with patch('reservations.models.Booking.objects.create') as mock_create, \
+                self.assertLogs('reservations.views', 'ERROR'):
+            mock_create.side_effect = DatabaseError("Database error")
 
             initial_transaction_count = Transaction.objects.count()
 
@@ -519,6 +589,30 @@ class VerifyViewTest(TestCase):
 
             self.assertRedirects(response, reverse('reservations:payment-fail'))
 
+    @patch('reservations.gateway.client.session.post')
+    def test_unexpected_error_after_payment_propagates(self, mock_post):
+        mock_response = Mock()
+        mock_response.json.return_value = {'data': {'code': 100}}
+        mock_post.return_value = mock_response
+        self.client.login(phone='09123456789', password='testpass123')
+
+        with patch('reservations.engine.confirm_booking', side_effect=ValueError("bug")):
+            with self.assertRaises(ValueError):
+                self.client.get(self.url, {'Status': 'OK', 'Authority': 'test_authority_123'})
+
+        # خطای برنامه به عنوان پرداخت ناموفق ثبت نمی‌شود
+        self.assertFalse(Transaction.objects.filter(transaction_id='test_authority_123').exists())
+
+    def test_verify_releases_hold(self):
+        check_in = self.check_in.togregorian()
+        check_out = self.check_out.togregorian()
+        holds.place_hold(self.room.id, check_in, check_out, self.user.pk)
+        self.client.login(phone='09123456789', password='testpass123')
+
+        self.client.get(self.url, {'Status': 'NOK', 'Authority': 'test_authority_123'})
+
+        self.assertEqual(holds.held_room_ids(check_in, check_out), set())
+
     def test_cleanup_session_method(self):
         self.client.login(phone='09123456789', password='testpass123')
 
@@ -533,7 +627,7 @@ class VerifyViewTest(TestCase):
         self.assertNotIn('authority', request.session)
         self.assertTrue(request.session.modified)
 
-    @patch('requests.post')
+    @patch('reservations.gateway.client.session.post')
     def test_room_availability_update_on_confirmed_booking(self, mock_post):
         mock_response = Mock()
         mock_response.json.return_value = {
@@ -553,7 +647,9 @@ class VerifyViewTest(TestCase):
         })
 
         self.room.refresh_from_db()
-        self.assertFalse(self.room.existing)
+        # اقامت از فردا شروع می‌شود و اتاق امروز هنوز آزاد است
+        self.assertTrue(Booking.objects.filter(room=self.room, status='confirmed').exists())
+        self.assertTrue(self.room.existing)
 
     def test_duplicate_transaction_id_handling(self):
         existing_trans = Transaction.objects.create(
@@ -565,11 +661,16 @@ class VerifyViewTest(TestCase):
 
         self.client.login(phone='09123456789', password='testpass123')
 
-        with self.assertRaises(IntegrityError):
-            response = self.client.get(self.url, {
-                'Status': 'NOK',
-                'Authority': 'test_authority_123'
-            })
+        # بازگشت تکراری با همان Authority خطا نمی‌دهد و تراکنش قبلی را تغییر نمی‌دهد
+        response = self.client.get(self.url, {
+            'Status': 'NOK',
+            'Authority': 'test_authority_123'
+        })
+
+        self.assertRedirects(response, reverse('reservations:payment-fail'), fetch_redirect_response=False)
+        existing_trans.refresh_from_db()
+        self.assertEqual(existing_trans.status, 'success')
+        self.assertEqual(Transaction.objects.count(), 1)
 
 
 class PaymentSuccessViewTest(TestCase):
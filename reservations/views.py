@@ -1,25 +1,19 @@
 from django.shortcuts import render, HttpResponse, get_object_or_404, redirect
 from django.http import JsonResponse
 from hotels.forms import GuestForm
-from reservations.models import Booking, Guest, Transaction
-from django.conf import settings
+from reservations.models import Booking
+from reservations import holds, gateway, engine
 from django.views.generic import View, DetailView, TemplateView
 from hotels.models import Room
 import jdatetime
-import json
+import logging
 import requests
+from django.db import DatabaseError
 from django.urls import reverse
-from django.db import transaction
 from django.contrib.auth.mixins import LoginRequiredMixin
 
-if settings.SANDBOX:
-    sandbox = 'sandbox'
-else:
-    sandbox = 'payment'
+logger = logging.getLogger(__name__)
 
-ZP_API_REQUEST = f"https://{sandbox}.zarinpal.com/pg/v4/payment/request.json"
-ZP_API_STARTPAY = f"https://{sandbox}.zarinpal.com/pg/StartPay/"
-ZP_API_VERIFY = f"https://{sandbox}.zarinpal.com/pg/v4/payment/verify.json"
 description = "رزرو اتاق در هتل ما"
 
 
@@ -68,12 +62,16 @@ class SendRequestView(LoginRequiredMixin, View):
 
         if Booking.objects.filter(
                 room=room,
-                status__in=['pending', 'confirmed'],
+                status__in=Booking.ACTIVE_STATUSES,
                 check_in__lt=check_out_gregorian,
                 check_out__gt=check_in_gregorian
         ).exists():
             return HttpResponse('متاسفانه این اتاق در همین لحظه توسط شخص دیگری رزرو شد.', status=409)
 
+        #  نگه‌داشتن شب‌ها تا بازگشت از درگاه، تا کاربر دیگری برای همین شب‌ها به درگاه فرستاده نشود
+        if not holds.place_hold(room.id, check_in_gregorian, check_out_gregorian, request.user.pk):
+            return HttpResponse('این اتاق در حال حاضر در حال رزرو توسط شخص دیگری است.', status=409)
+
         #  ذخیره اطلاعات نهایی در Session
         total_price = room.price * nights
         request.session['reservation_data'] = {
@@ -88,17 +86,13 @@ class SendRequestView(LoginRequiredMixin, View):
 
         #  ارسال به درگاه پرداخت
         callback_url = request.build_absolute_uri(reverse('reservations:payment-verify'))
-        data = {
-            "merchant_id": settings.MERCHANT,
-            "amount": total_price * 10,  # تبدیل تومان به ریال
-            "description": f"{description} برای اتاق {room.title}",
-            "callback_url": callback_url,
-            "metadata": {"mobile": request.user.phone, "email": request.user.email}
-        }
-
         try:
-            response = requests.post(ZP_API_REQUEST, data=json.dumps(data),
-                                     headers={'content-type': 'application/json'})
+            response = gateway.client.request_payment(
+                amount=total_price * 10,  # تبدیل تومان به ریال
+                description=f"{description} برای اتاق {room.title}",
+                callback_url=callback_url,
+                metadata={"mobile": request.user.phone, "email": request.user.email},
+            )
             if response.status_code == 200:
                 response_data = response.json()
                 if response_data.get("data", {}).get('code') == 100:
@@ -107,12 +101,14 @@ class SendRequestView(LoginRequiredMixin, View):
                     if response_data.get("data", {}).get('code') == 100:
                         authority = response_data['data']['authority']
                         request.session['authority'] = authority
-                        url = f"{ZP_API_STARTPAY}{authority}"
+                        url = gateway.client.startpay_url(authority)
 
                         return JsonResponse({'success': True, 'redirect_url': url})
+            holds.release_hold(room.id, check_in_gregorian, check_out_gregorian, request.user.pk)
             error_message = response.json().get('errors', {}).get('message', 'خطا در ارتباط با درگاه پرداخت')
             return HttpResponse(error_message, status=400)
         except requests.RequestException:
+            holds.release_hold(room.id, check_in_gregorian, check_out_gregorian, request.user.pk)
             return HttpResponse(f'خطای شبکه، لطفا از اتصال اینترنت خود اطمینان حاصل کنید', status=500)
 
 
@@ -137,77 +133,67 @@ class VerifyView(LoginRequiredMixin, View):
         except (ValueError, TypeError):
             return redirect("reservations:payment-fail")
 
-        if recalculated_price != reservation_data['total_price']:
-            return redirect("reservations:payment-fail")
-
-        transaction_data = {
-            'user': request.user,
-            'amount': recalculated_price,
-            'transaction_id': authority
-        }
-
-        if payment_status == "OK":
-            data = {"merchant_id": settings.MERCHANT, "amount": recalculated_price * 10, "authority": authority}
-            headers = {'content-type': 'application/json', 'Accept': 'application/json'}
-
-            try:
-                response = requests.post(ZP_API_VERIFY, data=json.dumps(data), headers=headers)
-                response_data = response.json().get('data', {})
+        check_in_gregorian = check_in_jalali.togregorian()
+        check_out_gregorian = check_out_jalali.togregorian()
 
-                if response_data.get('code') == 100:
-                    try:
-                        with transaction.atomic():
-                            # تبدیل تاریخ شمسی یع میلادی قبل از ذخیره سازی
-                            check_in_gregorian = check_in_jalali.togregorian()
-                            check_out_gregorian = check_out_jalali.togregorian()
+        try:
+            if recalculated_price != reservation_data['total_price']:
+                return redirect("reservations:payment-fail")
 
-                            booking = Booking.objects.create(
+            # ثبت پرداخت ناموفق با همان Authority تکرارپذیر است (بازگشت تکراری یا همزمان از درگاه)
+            failed_payment = {
+                'authority': authority,
+                'user': request.user,
+                'amount': recalculated_price,
+            }
+
+            if payment_status == "OK":
+                try:
+                    response = gateway.client.verify(amount=recalculated_price * 10, authority=authority)
+                    response_data = response.json().get('data', {})
+
+                    # 101 یعنی این پرداخت قبلا تایید شده است (بازگشت تکراری از درگاه)
+                    if response_data.get('code') in (100, 101):
+                        try:
+                            booking, created = engine.confirm_booking(
+                                authority=authority,
                                 user=request.user,
                                 room=room,
                                 check_in=check_in_gregorian,
                                 check_out=check_out_gregorian,
                                 people_count=reservation_data['capacity'],
-                                status='confirmed',
+                                nights=reservation_data['nights'],
                                 total_price=recalculated_price,
-                                nights_stay=reservation_data['nights']
+                                guests=reservation_data['guests'],
                             )
-
-                            guests_to_create = [Guest(booking=booking, **guest) for guest in reservation_data['guests']]
-                            Guest.objects.bulk_create(guests_to_create)
-
-                            transaction_data.update(status='success', booking=booking)
-                            Transaction.objects.create(**transaction_data)
-
-                    except Exception as e:
-                        transaction_data['status'] = 'failed'
-                        Transaction.objects.create(**transaction_data)
+                        except (engine.BookingUnavailable, DatabaseError):
+                            # پرداخت در درگاه انجام شده ولی رزرو ثبت نشد؛ برای پیگیری و بازگشت وجه لاگ می‌شود
+                            logger.exception("Could not confirm booking for paid authority %s", authority)
+                            engine.record_failed_payment(**failed_payment)
+                            return redirect("reservations:payment-fail")
+
+                        self.cleanup_session(request)
+                        if booking is None:
+                            return redirect("reservations:payment-fail")
+                        return redirect("reservations:payment-success", pk=booking.id)
+
+                    else:
+                        engine.record_failed_payment(**failed_payment)
+                        self.cleanup_session(request)
                         return redirect("reservations:payment-fail")
 
-                    self.cleanup_session(request)
-                    return redirect("reservations:payment-success", pk=booking.id)
-
-                elif response_data.get('code') == 101:
-                    self.cleanup_session(request)
-                    return redirect("reservations:payment-success")
-
-
-                else:
-                    transaction_data['status'] = 'failed'
-                    Transaction.objects.create(**transaction_data)
+                except requests.RequestException:
+                    engine.record_failed_payment(**failed_payment)
                     self.cleanup_session(request)
                     return redirect("reservations:payment-fail")
 
-            except requests.RequestException:
-                transaction_data['status'] = 'failed'
-                Transaction.objects.create(**transaction_data)
+            else:
+                engine.record_failed_payment(**failed_payment)
                 self.cleanup_session(request)
                 return redirect("reservations:payment-fail")
-
-        else:
-            transaction_data['status'] = 'failed'
-            Transaction.objects.create(**transaction_data)
-            self.cleanup_session(request)
-            return redirect("reservations:payment-fail")
+        finally:
+            #  آزاد کردن شب‌های نگه‌داشته‌شده در هر نتیجه‌ای از پرداخت
+            holds.release_hold(room.id, check_in_gregorian, check_out_gregorian, request.user.pk)
 
     def cleanup_session(self, request):
         """ پاکسازی سشن پس از اتمام فرآیند پرداخت."""